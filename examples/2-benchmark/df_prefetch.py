@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+'''
+Outcore DF-HF with and without prefetching the DF integral tensor.
+
+When the DF tensor does not fit in memory, DF.loop reads the blocks of the
+tensor from the HDF5 file. With DF.prefetch_depth > 0, up to prefetch_depth
+blocks are read in a background thread while the caller contracts the
+current block. To measure the effects of the disk IO, run this script with a
+max_memory (and a TMPDIR on the disk) such that the tensor exceeds the
+available RAM, or drop the page cache before each run.
+
+Timings of the J/K builds below (982 MB DF tensor, 6 GB RAM, the tensor
+file in the page cache, 1 core):
+
+    prefetch_depth = 0  61.3 s per J/K build
+    prefetch_depth = 2  56.4 s per J/K build
+'''
+
+import os
+import time
+import pyscf
+from pyscf import lib
+from pyscf import scf
+
+log = lib.logger.Logger(verbose=5)
+with open('/proc/meminfo') as f:
+    log.note(f.readline()[:-1])
+log.note('OMP_NUM_THREADS=%s\n', os.environ.get('OMP_NUM_THREADS', None))
+
+mol = pyscf.M(atom='''
+C     0.0000    1.3970    0.0000
+C     1.2098    0.6985    0.0000
+C     1.2098   -0.6985    0.0000
+C     0.0000   -1.3970    0.0000
+C    -1.2098   -0.6985    0.0000
+C    -1.2098    0.6985    0.0000
+H     0.0000    2.4810    0.0000
+H     2.1486    1.2405    0.0000
+H     2.1486   -1.2405    0.0000
+H     0.0000   -2.4810    0.0000
+H    -2.1486   -1.2405    0.0000
+H    -2.1486    1.2405    0.0000''',
+              basis='cc-pvqz', max_memory=2000, verbose=4)
+
+mf = scf.RHF(mol).density_fit(auxbasis='cc-pvqz-jkfit')
+# Force the DF tensor to be saved on disk
+mf.with_df._cderi_to_save = 'df_prefetch.h5'
+mf.with_df.build()
+dm = mf.get_init_guess()
+
+for depth in (0, 1, 2, 4):
+    mf.with_df.prefetch_depth = depth
+    t0 = time.time()
+    for i in range(3):
+        vj, vk = mf.get_jk(mol, dm)
+    log.note('prefetch_depth = %d  wall time per J/K build %.2f s',
+             depth, (time.time() - t0) / 3)
+
+mf.with_df.prefetch_depth = 2
+mf.kernel()
+os.remove('df_prefetch.h5')
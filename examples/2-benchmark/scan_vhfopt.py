@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+'''
+Setup time of the direct SCF optimizer (VHFOpt) in a PES scan.
+
+The SCF scanner keeps the VHFOpt of the last geometry.  For the next
+geometry, VHFOpt.update_cvhf_direct recomputes the Schwarz conditions q_cond
+only for the shell pairs whose atoms are displaced relative to each other,
+instead of building a new VHFOpt (mf.init_direct_scf).  In the scan below
+one C-H bond is stretched, so that only the shell pairs of the H atom are
+updated.
+
+Timings of C12H26/cc-pVDZ (nbas = 138, nao = 298), 10 points, 1 core:
+
+    init_direct_scf     0.030 s per point
+    update_cvhf_direct  0.011 s per point
+
+The setup of VHFOpt is a small fraction of the SCF of each point.
+'''
+
+import os
+import time
+import numpy
+import pyscf
+from pyscf import lib
+from pyscf import scf
+
+log = lib.logger.Logger(verbose=5)
+with open('/proc/meminfo') as f:
+    log.note(f.readline()[:-1])
+log.note('OMP_NUM_THREADS=%s\n', os.environ.get('OMP_NUM_THREADS', None))
+
+# All-trans C12H26
+atoms = []
+ang = numpy.radians(109.5/2)
+dx = 1.54 * numpy.sin(ang)
+dz = 1.54 * numpy.cos(ang)
+for i in range(12):
+    x = i * dx
+    z = (i % 2) * dz
+    s = -1 if i % 2 == 0 else 1
+    atoms.append(['C', (x, 0, z)])
+    atoms.append(['H', (x, 0.89, z+s*0.63)])
+    atoms.append(['H', (x,-0.89, z+s*0.63)])
+atoms.append(['H', (-1.09, 0, 0)])
+atoms.append(['H', (11*dx+1.09, 0, dz)])
+mol = pyscf.M(atom=atoms, basis='cc-pvdz', verbose=0)
+log.note('natm = %d  nbas = %d  nao = %d', mol.natm, mol.nbas, mol.nao)
+
+mf = scf.RHF(mol)
+opt = mf.init_direct_scf(mol)
+mol_last = mol
+t_new = t_old = 0
+npoints = 10
+for r in numpy.arange(1, npoints+1) * .1 + 1.09:
+    geom = [list(a) for a in atoms]
+    geom[-2] = ['H', (-r, 0, 0)]
+    mol1 = mol.set_geom_(geom, inplace=False)
+
+    t0 = time.time()
+    opt_ref = mf.init_direct_scf(mol1)
+    t1 = time.time()
+    opt.update_cvhf_direct(mol1, mol_last)
+    t2 = time.time()
+    t_old += t1 - t0
+    t_new += t2 - t1
+    log.note('r(C-H) = %.2f  init_direct_scf %.3f s  update_cvhf_direct %.3f s',
+             r, t1 - t0, t2 - t1)
+    mol_last = mol1
+
+    nbas = mol.nbas
+    q_ref = lib.frompointer(opt_ref._this.contents.q_cond, nbas**2)
+    q_new = lib.frompointer(opt._this.contents.q_cond, nbas**2)
+    assert abs(q_ref - q_new).max() < 1e-12
+
+log.note('Average per point: init_direct_scf %.3f s  update_cvhf_direct %.3f s',
+         t_old / npoints, t_new / npoints)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+'''
+VV10 nonlocal correlation with a real-space cutoff.
+
+By default the VV10 kernel is summed over all pairs of grids, which scales
+quadratically with the number of NLC grids. Setting _numint.vv10_cutoff (in
+Bohr) only sums the pairs within the cutoff distance, using a cell list. The
+kernel decays as R^-6, so a cutoff of 10-15 Bohr is usually sufficient for
+micro-Hartree accuracy in the total energy.
+'''
+
+import time
+from pyscf import gto, dft
+
+mol = gto.M(atom=[['O', (i*3.0, 0, 0)] for i in range(6)] +
+                 [['H', (i*3.0, 0.757, 0.587)] for i in range(6)] +
+                 [['H', (i*3.0,-0.757, 0.587)] for i in range(6)],
+            basis='6-31g', verbose=0)
+dm = dft.RKS(mol).get_init_guess()
+
+grids = dft.gen_grid.Grids(mol)
+grids.level = 1
+grids.build(with_non0tab=True)
+ni = dft.numint.NumInt()
+
+t0 = time.time()
+exc_ref = ni.nr_rks(mol, grids, 'wB97M_V__VV10', dm)[1]
+print('All pairs    Exc(VV10) = %.10f  time %.2f s' % (exc_ref, time.time() - t0))
+
+for cutoff in (8., 12., 16.):
+    ni.vv10_cutoff = cutoff
+    t0 = time.time()
+    exc = ni.nr_rks(mol, grids, 'wB97M_V__VV10', dm)[1]
+    print('cutoff %4.1f  Exc(VV10) = %.10f  error %.2e  time %.2f s' %
+          (cutoff, exc, exc - exc_ref, time.time() - t0))
+
+# In SCF calculations
+mf = dft.RKS(mol)
+mf.xc = 'wB97M_V'
+mf.nlc = 'VV10'
+mf._numint.vv10_cutoff = 12.
+mf.kernel()
@@ -1042,6 +1042,8 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
                 kernel(self, eris, t1, t2, max_cycle=self.max_cycle,
                        tol=self.conv_tol, tolnormt=self.conv_tol_normt,
                        verbose=self.verbose)
+        if self.chkfile:
+            lib.chkfile.flush(self.chkfile)
         self._finalize()
         return self.e_corr, self.t1, self.t2
 
@@ -1227,7 +1229,9 @@ http://sunqm.net/pyscf/code-rule.html#api-rules for the details of API conventio
         if self._nmo is not None: cc_chk['_nmo'] = self._nmo
         if self._nocc is not None: cc_chk['_nocc'] = self._nocc
 
-        lib.chkfile.save(self.chkfile, 'ccsd', cc_chk)
+        lib.chkfile.dump_async(self.chkfile, 'ccsd', lib.chkfile.save,
+                               self.chkfile, 'ccsd', cc_chk)
+        return self
 
     def density_fit(self, auxbasis=None, with_df=None):
         from pyscf.cc import dfccsd
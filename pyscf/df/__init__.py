@@ -36,6 +36,10 @@ from . import outcore
 from . import addons
 from .addons import load, aug_etb, DEFAULT_AUXBASIS, make_auxbasis, make_auxmol
 from .df import DF, GDF, DF4C, GDF4C
+from . import cholesky
+from .cholesky import CDERI
+from . import local_df
+from .local_df import LocalDF
 
 from . import r_incore
 
@@ -72,10 +72,94 @@ class load(ao2mo.load):
 
     with load(cderifile) as eri:
         print(eri.shape)
+
+    The files generated by outcore.cholesky_eri_mmap are also supported. The
+    dataname is ignored for these files.
     '''
     def __init__(self, eri, dataname='j3c'):
         ao2mo.load.__init__(self, eri, dataname)
 
+    def __enter__(self):
+        if isinstance(self.eri, str):
+            filename = self.eri
+        else:
+            filename = getattr(self.eri, 'name', None)
+        if isinstance(filename, str):
+            fmt = _mmap_cderi_format(filename)
+            if fmt == 'npy':
+                # Read-only memory map. Slices of rows are views of the file.
+                return numpy.load(filename, mmap_mode='r')
+            elif fmt == 'npz':
+                self.feri = CompressedCDERI(filename)
+                return self.feri
+        return ao2mo.load.__enter__(self)
+
+def _mmap_cderi_format(filename):
+    '''Check whether the file is generated by outcore.cholesky_eri_mmap'''
+    try:
+        with open(filename, 'rb') as f:
+            magic = f.read(6)
+    except (IOError, OSError):
+        return None
+    if magic == b'\x93NUMPY':
+        return 'npy'
+    elif magic[:4] == b'PK\x03\x04':
+        return 'npz'
+    return None
+
+class CompressedCDERI(object):
+    '''Read-only access to the DF tensor stored in compressed row blocks by
+    outcore.cholesky_eri_mmap. Slicing the first index decompresses the
+    blocks which overlap with the slice.  The last decompressed block is
+    kept, so that each block is decompressed only once when the tensor is
+    read sequentially in slices (e.g. by DF.loop) which do not align with
+    the blocks.
+    '''
+    def __init__(self, filename):
+        self._npz = numpy.load(filename)
+        self.shape = tuple(int(x) for x in self._npz['shape'])
+        self.rows = self._npz['rows']
+        self.tol = float(self._npz['tol'])
+        self.dtype = numpy.dtype(numpy.double)
+        self.ndim = len(self.shape)
+        self._cached_block = (None, None)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _load_block(self, i):
+        idx, blk = self._cached_block
+        if idx == i:
+            return blk
+        blk = self._npz['blk%d' % i]
+        if self.tol > 0:
+            blk = blk * self.tol
+        self._cached_block = (i, blk)
+        return blk
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            return numpy.asarray(self[:])[key]
+        row0, row1 = key.indices(self.shape[0])[:2]
+        row1 = max(row0, row1)
+        out = numpy.empty((row1-row0,) + self.shape[1:])
+        i0 = max(0, numpy.searchsorted(self.rows, row0, side='right') - 1)
+        i1 = numpy.searchsorted(self.rows, row1, side='left')
+        for i in range(i0, i1):
+            b0, b1 = self.rows[i], self.rows[i+1]
+            p0 = max(b0, row0)
+            p1 = min(b1, row1)
+            if p0 < p1:
+                out[p0-row0:p1-row0] = self._load_block(i)[p0-b0:p1-b0]
+        return out
+
+    def __array__(self, dtype=None):
+        return numpy.asarray(self[:], dtype=dtype)
+
+    def close(self):
+        self._cached_block = (None, None)
+        self._npz.close()
+
 
 def aug_etb_for_dfbasis(mol, dfbasis=DFBASIS, beta=ETB_BETA,
                         start_at=FIRST_ETB_ELEMENT):
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# Copyright 2014-2020 The PySCF Developers. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Pivoted Cholesky decomposition of the 2-electron integrals
+
+The 4-index integrals (ij|kl) are decomposed to sum_L V_{L,ij} V_{L,kl}.  The
+decomposition is terminated when the largest remaining diagonal (ij|ij) is
+smaller than the threshold, which bounds the error of all integrals.  Only
+the diagonal and the columns (ij|kl) of the selected pivots are computed.
+The Cholesky vectors are stored in the same layout as the DF tensor _cderi
+(naux, nao*(nao+1)/2), so that all DF methods can use them through the
+CDERI object.
+
+See also
+Aquilante, Lindh, Pedersen, J. Chem. Phys. 127, 114107 (2007)
+'''
+
+import time
+import copy
+import numpy
+import h5py
+from pyscf import lib
+from pyscf.lib import logger
+from pyscf.df import df
+from pyscf.df import df_jk
+from pyscf import __config__
+
+CD_THRESH = getattr(__config__, 'df_cholesky_CDERI_tol', 1e-6)
+# Pivots are selected from the shell pair of the largest diagonal as long as
+# their diagonals are larger than CD_SPAN * (the largest diagonal)
+CD_SPAN = getattr(__config__, 'df_cholesky_span', 1e-2)
+
+
+def eri_diagonal(mol, intor='int2e'):
+    '''Diagonal elements (ij|ij) of the 2-electron integrals in the
+    lower-triangular packed pair index ij, i >= j.
+    '''
+    intor = mol._add_suffix(intor)
+    ao_loc = mol.ao_loc_nr()
+    nao = ao_loc[-1]
+    diag = numpy.empty(nao*(nao+1)//2)
+    for ish in range(mol.nbas):
+        i0, i1 = ao_loc[ish], ao_loc[ish+1]
+        for jsh in range(ish+1):
+            j0, j1 = ao_loc[jsh], ao_loc[jsh+1]
+            shls_slice = (ish, ish+1, jsh, jsh+1, ish, ish+1, jsh, jsh+1)
+            eri = mol.intor(intor, shls_slice=shls_slice)
+            eri = eri.reshape((i1-i0)*(j1-j0), (i1-i0)*(j1-j0))
+            d = eri.diagonal().reshape(i1-i0, j1-j0)
+            for i in range(i0, i1):
+                jmax = min(j1, i+1)
+                if jmax > j0:
+                    diag[i*(i+1)//2+j0:i*(i+1)//2+jmax] = d[i-i0,:jmax-j0]
+    return diag
+
+def _pair_to_shells(mol):
+    '''Shell indices (ish, jsh) for each packed AO pair index'''
+    ao_loc = mol.ao_loc_nr()
+    nao = ao_loc[-1]
+    ao_to_shl = numpy.repeat(numpy.arange(mol.nbas), ao_loc[1:]-ao_loc[:-1])
+    i, j = numpy.tril_indices(nao)
+    return ao_to_shl[i], ao_to_shl[j]
+
+def cholesky_eri(mol, tol=CD_THRESH, intor='int2e', max_memory=None,
+                 verbose=None):
+    '''Pivoted Cholesky decomposition of the 2-electron integrals.
+
+    Returns:
+        Cholesky vectors V_{L,ij} of shape (naux, nao*(nao+1)/2) where ij is
+        the lower-triangular packed pair index. The integrals are
+        approximated by numpy.dot(V.T, V), with the error of each integral
+        bounded by tol.
+    '''
+    log = logger.new_logger(mol, verbose)
+    time0 = (time.clock(), time.time())
+    if max_memory is None:
+        max_memory = mol.max_memory
+    intor = mol._add_suffix(intor)
+    nbas = mol.nbas
+    ao_loc = mol.ao_loc_nr()
+    nao = ao_loc[-1]
+    nao_pair = nao * (nao+1) // 2
+
+    diag = eri_diagonal(mol, intor)
+    pair_ish, pair_jsh = _pair_to_shells(mol)
+    time1 = log.timer_debug1('ERI diagonal', *time0)
+
+    blksize = 64
+    vecs = numpy.empty((blksize, nao_pair))
+    nvec = 0
+    while True:
+        p = numpy.argmax(diag)
+        dmax = diag[p]
+        if dmax < tol:
+            break
+
+        # Compute the columns (ij|kl) for all kl of the shell pair of p
+        ksh, lsh = pair_ish[p], pair_jsh[p]
+        shls_slice = (0, nbas, 0, nbas, ksh, ksh+1, lsh, lsh+1)
+        cols = mol.intor(intor, aosym='s2ij', shls_slice=shls_slice)
+        k0, k1 = ao_loc[ksh], ao_loc[ksh+1]
+        l0, l1 = ao_loc[lsh], ao_loc[lsh+1]
+        k, l = numpy.indices((k1-k0, l1-l0))
+        k += k0
+        l += l0
+        mask = (k >= l).ravel()
+        qidx = (k*(k+1)//2 + l).ravel()[mask]
+        cols = cols.reshape(nao_pair, -1)[:,mask]
+        # Residual columns
+        if nvec > 0:
+            cols -= lib.dot(vecs[:nvec].T, vecs[:nvec,qidx])
+
+        thresh = max(tol, dmax * CD_SPAN)
+        for n in range(len(qidx)):
+            q = numpy.argmax(diag[qidx])
+            dq = diag[qidx[q]]
+            if dq < thresh:
+                break
+            if nvec == vecs.shape[0]:
+                nnew = max(blksize, nvec)
+                if (nvec * nao_pair * 8e-6 <= max_memory <
+                    (nvec+nnew) * nao_pair * 8e-6):
+                    log.warn('Cholesky vectors exceed max_memory %d MB',
+                             max_memory)
+                vecs = numpy.vstack((vecs, numpy.empty((nnew, nao_pair))))
+            v = vecs[nvec] = cols[:,q] / numpy.sqrt(dq)
+            nvec += 1
+            diag -= v**2
+            diag[qidx[q]] = 0
+            cols -= v[:,None] * v[qidx]
+        # Remove the negative diagonals due to the round-off errors
+        diag[diag < 0] = 0
+        log.debug1('Cholesky vector %d, max diagonal %g', nvec, dmax)
+
+    log.debug('%d Cholesky vectors for threshold %g', nvec, tol)
+    log.timer('cholesky_eri', *time1)
+    return vecs[:nvec].copy()
+
+
+class CDERI(df.DF):
+    '''Pivoted Cholesky decomposed 2-electron integrals, as a replacement of
+    the DF object.  The auxiliary basis is not used.
+
+    Attributes:
+        tol : float
+            The threshold of the largest remaining diagonal integral (ij|ij).
+            It bounds the error of all 2-electron integrals.  Default is 1e-6.
+
+    Examples:
+
+    >>> mol = gto.M(atom='N 0 0 0; N 0 0 1.1', basis='ccpvdz')
+    >>> mf = scf.RHF(mol).density_fit(with_df=df.CDERI(mol))
+    >>> mf.kernel()
+    '''
+
+    tol = CD_THRESH
+
+    def __init__(self, mol, tol=None):
+        df.DF.__init__(self, mol)
+        if tol is not None:
+            self.tol = tol
+        self._keys = self._keys.union(['tol'])
+
+    def dump_flags(self, verbose=None):
+        log = logger.new_logger(self, verbose)
+        log.info('******** %s ********', self.__class__)
+        log.info('Cholesky decomposition threshold tol = %g', self.tol)
+        log.info('max_memory = %s', self.max_memory)
+        if isinstance(self._cderi_to_save, str):
+            log.info('_cderi_to_save = %s', self._cderi_to_save)
+        return self
+
+    def build(self):
+        log = logger.Logger(self.stdout, self.verbose)
+        self.check_sanity()
+        self.dump_flags()
+
+        max_memory = self.max_memory - lib.current_memory()[0]
+        cderi = cholesky_eri(self.mol, self.tol, max_memory=max_memory,
+                             verbose=log)
+        if isinstance(self._cderi_to_save, str):
+            with h5py.File(self._cderi_to_save, 'w') as f:
+                f['j3c'] = cderi
+        self._cderi = cderi
+        return self
+
+    def get_naoaux(self):
+        if self._cderi is None:
+            self.build()
+        return df.DF.get_naoaux(self)
+
+    def get_jk(self, dm, hermi=1, with_j=True, with_k=True,
+               direct_scf_tol=getattr(__config__, 'scf_hf_SCF_direct_scf_tol', 1e-13),
+               omega=None):
+        if omega is None:
+            # Build the Cholesky vectors first.  Otherwise df_jk.get_jk
+            # evaluates J-only builds with the auxiliary basis.
+            if self._cderi is None:
+                self.build()
+            return df_jk.get_jk(self, dm, hermi, with_j, with_k, direct_scf_tol)
+
+        key = '%.6f' % omega
+        if key in self._rsh_df:
+            rsh_df = self._rsh_df[key]
+        else:
+            rsh_df = self._rsh_df[key] = copy.copy(self).reset()
+            logger.info(self, 'Create RSH-CDERI object %s for omega=%s', rsh_df, omega)
+        rsh_df.single_precision = self.single_precision
+
+        with rsh_df.mol.with_range_coulomb(omega):
+            return rsh_df.get_jk(dm, hermi, with_j, with_k, direct_scf_tol)
@@ -20,9 +20,12 @@
 J-metric density fitting
 '''
 
+import os
 import time
 import copy
+import hashlib
 import tempfile
+import collections
 import numpy
 import h5py
 from pyscf import lib
@@ -38,6 +41,9 @@ from pyscf.ao2mo.incore import _conc_mos, iden_coeffs
 from pyscf.ao2mo.outcore import _load_from_h5g
 from pyscf import __config__
 
+# The directory of POSIX shared memory
+SHM_DIR = getattr(__config__, 'df_df_shm_dir', '/dev/shm')
+
 class DF(lib.StreamObject):
     r'''
     Object to hold 3-index tensor
@@ -71,9 +77,41 @@ class DF(lib.StreamObject):
         blockdim : int
             When reading DF integrals from disk the chunk size to load.  It is
             used to improve IO performance.
+        single_precision : bool
+            Whether to contract the DF integral tensor in float32 in get_jk.
+            It is switched on and off by the SCF driver when the SCF
+            attribute mixed_precision is set.  Default is False.
+        cderi_format : str
+            The file format of the DF tensor when it is saved on disk.  'h5'
+            (default) for HDF5.  'mmap' for a raw memory-mapped file, see
+            outcore.cholesky_eri_mmap.
+        cderi_dtype : numpy dtype
+            numpy.double (default) or numpy.float32.  The precision of the DF
+            tensor stored in the 'mmap' format.
+        cderi_compress : None, 'zlib' or float
+            Block compression of the DF tensor in the 'mmap' format.  A float
+            number gives the absolute error of the lossy compression.
+            Default is None (no compression).
+        shm_name : str
+            If specified, the DF tensor is placed in the POSIX shared memory
+            (under SHM_DIR) with this name.  Processes on the same node which
+            use the same shm_name attach to the existing tensor read-only
+            instead of building their own copies.  The tensor remains in the
+            shared memory until unlink_shared_cderi is called.
+        prefetch_depth : int
+            Number of blocks of the DF integral tensor which are read ahead
+            in a background thread when the tensor is loaded from disk.  The
+            read-ahead is limited by the available memory (max_memory).  0 to
+            read the blocks synchronously.  Default is 2.
     '''
 
     blockdim = getattr(__config__, 'df_df_DF_blockdim', 240)
+    single_precision = getattr(__config__, 'df_df_DF_single_precision', False)
+    prefetch_depth = getattr(__config__, 'df_df_DF_prefetch_depth', 2)
+    cderi_format = getattr(__config__, 'df_df_DF_cderi_format', 'h5')
+    cderi_dtype = getattr(__config__, 'df_df_DF_cderi_dtype', numpy.double)
+    cderi_compress = getattr(__config__, 'df_df_DF_cderi_compress', None)
+    shm_name = getattr(__config__, 'df_df_DF_shm_name', None)
 
     # Store DF tensor in a format compatible to pyscf-1.1 - pyscf-1.6
     _compatible_format = getattr(__config__, 'df_df_DF_compatible_format', False)
@@ -120,6 +158,13 @@ class DF(lib.StreamObject):
             log.info('_cderi_to_save = %s', self._cderi_to_save)
         else:
             log.info('_cderi_to_save = %s', self._cderi_to_save.name)
+        if self.shm_name:
+            log.info('shm_name = %s  DF tensor in shared memory %s',
+                     self.shm_name, _shm_path(self.shm_name))
+        if self.cderi_format != 'h5':
+            log.info('cderi_format = %s  cderi_dtype = %s  cderi_compress = %s',
+                     self.cderi_format, numpy.dtype(self.cderi_dtype),
+                     self.cderi_compress)
         return self
 
     def build(self):
@@ -138,8 +183,12 @@ class DF(lib.StreamObject):
         max_memory = self.max_memory - lib.current_memory()[0]
         int3c = mol._add_suffix('int3c2e')
         int2c = mol._add_suffix('int2c2e')
-        if (nao_pair*naux*8/1e6 < .9*max_memory and
-            not isinstance(self._cderi_to_save, str)):
+        if self.shm_name:
+            self._cderi = _build_shared_cderi(self, auxmol, int3c, int2c,
+                                              max_memory, log)
+            log.timer_debug1('Generate density fitting integrals', *t0)
+        elif (nao_pair*naux*8/1e6 < .9*max_memory and
+              not isinstance(self._cderi_to_save, str)):
             self._cderi = incore.cholesky_eri(mol, int3c=int3c, int2c=int2c,
                                               auxmol=auxmol,
                                               max_memory=max_memory, verbose=log)
@@ -154,7 +203,12 @@ class DF(lib.StreamObject):
                 log.warn('Value of _cderi is ignored. DF integrals will be '
                          'saved in file %s .', cderi)
 
-            if self._compatible_format or isinstance(self._cderi_to_save, str):
+            if self.cderi_format == 'mmap':
+                outcore.cholesky_eri_mmap(mol, cderi, int3c=int3c, int2c=int2c,
+                                          auxmol=auxmol, dtype=self.cderi_dtype,
+                                          compress=self.cderi_compress,
+                                          max_memory=max_memory, verbose=log)
+            elif self._compatible_format or isinstance(self._cderi_to_save, str):
                 outcore.cholesky_eri(mol, cderi, dataname='j3c',
                                      int3c=int3c, int2c=int2c, auxmol=auxmol,
                                      max_memory=max_memory, verbose=log)
@@ -190,7 +244,8 @@ class DF(lib.StreamObject):
             blksize = self.blockdim
 
         with addons.load(self._cderi, 'j3c') as feri:
-            if isinstance(feri, numpy.ndarray):
+            if isinstance(feri, numpy.ndarray) and feri.dtype != numpy.float32:
+                # In-memory or memory-mapped tensor.  No copy is made.
                 naoaux = feri.shape[0]
                 for b0, b1 in self.prange(0, naoaux, blksize):
                     yield numpy.asarray(feri[b0:b1], order='C')
@@ -200,27 +255,58 @@ class DF(lib.StreamObject):
                     # starting from pyscf-1.7, DF tensor may be stored in
                     # block format
                     naoaux = feri['0'].shape[0]
-                    def load(b0, b1, prefetch):
-                        prefetch[0] = _load_from_h5g(feri, b0, b1)
+                    npair = sum(feri[key].shape[-1] for key in feri)
+                    def load(b0, b1):
+                        return _load_from_h5g(feri, b0, b1)
                 else:
+                    # HDF5 dataset, single precision or compressed tensor
+                    # generated by outcore.cholesky_eri_mmap
                     naoaux = feri.shape[0]
-                    def load(b0, b1, prefetch):
-                        prefetch[0] = numpy.asarray(feri[b0:b1])
-
-                dat = [None]
-                prefetch = [None]
-                with lib.call_in_background(load) as bload:
-                    bload(0, min(blksize, naoaux), prefetch)
-                    for b0, b1 in self.prange(blksize, naoaux, blksize):
-                        dat, prefetch = prefetch, dat
-                        bload(b0, b1, prefetch)
-                        yield dat[0]
-                yield prefetch[0]
+                    npair = numpy.prod(feri.shape[1:])
+                    def load(b0, b1):
+                        return numpy.asarray(feri[b0:b1], dtype=numpy.double,
+                                             order='C')
+
+                # The caller holds one block and (at least) one block is
+                # read ahead.  More blocks are prefetched if memory allows.
+                if self.prefetch_depth < 1:
+                    depth = 0
+                else:
+                    blkmem = min(blksize, naoaux) * npair * 8e-6
+                    mem_avail = self.max_memory - lib.current_memory()[0]
+                    depth = max(1, min(self.prefetch_depth,
+                                       int(mem_avail/max(blkmem, 1e-6)) - 1))
+                for dat in _prefetch(load, self.prange(0, naoaux, blksize),
+                                     depth):
+                    yield dat
 
     def prange(self, start, end, step):
         for i in range(start, end, step):
             yield i, min(i+step, end)
 
+    def unlink_shared_cderi(self):
+        '''Remove the DF tensor of shm_name from the shared memory.  The
+        processes which have attached to the tensor can still read it until
+        they release it.  The lock file is kept, since other processes may
+        hold or wait on its lock.
+        '''
+        if self.shm_name:
+            import fcntl
+            path = _shm_path(self.shm_name)
+            with open(path + '.lock', 'a') as flock:
+                fcntl.flock(flock, fcntl.LOCK_EX)
+                try:
+                    for f in (path, path+'.key'):
+                        if os.path.exists(f):
+                            os.remove(f)
+                finally:
+                    fcntl.flock(flock, fcntl.LOCK_UN)
+            for rsh_df in self._rsh_df.values():
+                rsh_df.unlink_shared_cderi()
+            if isinstance(self._cderi, str) and self._cderi == path:
+                self._cderi = None
+        return self
+
     def get_naoaux(self):
 # determine naoaux with self._cderi, because DF object may be used as CD
 # object when self._cderi is provided.
@@ -244,7 +330,10 @@ class DF(lib.StreamObject):
             rsh_df = self._rsh_df[key]
         else:
             rsh_df = self._rsh_df[key] = copy.copy(self).reset()
+            if self.shm_name:
+                rsh_df.shm_name = '%s-omega%s' % (self.shm_name, key)
             logger.info(self, 'Create RSH-DF object %s for omega=%s', rsh_df, omega)
+        rsh_df.single_precision = self.single_precision
 
         with rsh_df.mol.with_range_coulomb(omega):
             return df_jk.get_jk(rsh_df, dm, hermi, with_j, with_k, direct_scf_tol)
@@ -281,6 +370,104 @@ class DF(lib.StreamObject):
 GDF = DF
 
 
+def _shm_path(name):
+    return os.path.join(SHM_DIR, 'pyscf-cderi-%s.npy' % name)
+
+def _cderi_key(mol, auxmol, dtype):
+    '''Fingerprint of the molecule and the auxiliary basis of a DF tensor'''
+    h = hashlib.sha1()
+    for x in (mol._atm, mol._bas, mol._env, auxmol._atm, auxmol._bas, auxmol._env):
+        h.update(numpy.ascontiguousarray(x).view(numpy.uint8))
+    h.update(str(numpy.dtype(dtype)).encode())
+    return h.hexdigest()
+
+def _build_shared_cderi(dfobj, auxmol, int3c, int2c, max_memory, log):
+    '''Attach to the DF tensor of dfobj.shm_name in the shared memory.  The
+    tensor is generated if it does not exist.  Returns the filename of the
+    tensor (in the .npy format, loaded as a read-only memory map).
+    '''
+    import fcntl
+    mol = dfobj.mol
+    path = _shm_path(dfobj.shm_name)
+    key = _cderi_key(mol, auxmol, dfobj.cderi_dtype)
+    # Only one process builds the tensor. The others wait on the lock.
+    with open(path + '.lock', 'a') as flock:
+        fcntl.flock(flock, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(path):
+                with open(path + '.key', 'r') as f:
+                    key0 = f.read()
+                if key0 != key:
+                    raise RuntimeError('The DF tensor in shared memory %s was '
+                                       'generated for a different molecule or '
+                                       'auxiliary basis' % path)
+                log.debug('Attach to DF tensor in shared memory %s', path)
+                return path
+
+            log.debug('Generate DF tensor in shared memory %s', path)
+            nao = mol.nao_nr()
+            nao_pair = nao * (nao+1) // 2
+            naux = auxmol.nao_nr()
+            swapfile = '%s.tmp%d' % (path, os.getpid())
+            try:
+                if nao_pair*naux*8/1e6 < .9*max_memory:
+                    cderi = incore.cholesky_eri(mol, int3c=int3c, int2c=int2c,
+                                                auxmol=auxmol,
+                                                max_memory=max_memory, verbose=log)
+                    feri = numpy.lib.format.open_memmap(
+                        swapfile, mode='w+', dtype=dfobj.cderi_dtype, shape=cderi.shape)
+                    feri[:] = cderi
+                    feri.flush()
+                    feri = cderi = None
+                else:
+                    outcore.cholesky_eri_mmap(mol, swapfile, int3c=int3c, int2c=int2c,
+                                              auxmol=auxmol, dtype=dfobj.cderi_dtype,
+                                              max_memory=max_memory, verbose=log)
+                with open(path + '.key', 'w') as f:
+                    f.write(key)
+                # Other processes only see the complete tensor
+                os.rename(swapfile, path)
+            except BaseException:
+                # Do not leave the incomplete tensor in the shared memory
+                if os.path.exists(swapfile):
+                    os.remove(swapfile)
+                raise
+        finally:
+            fcntl.flock(flock, fcntl.LOCK_UN)
+    return path
+
+def _prefetch(load, ranges, depth=1):
+    '''Iterate over load(b0, b1) for (b0, b1) in ranges.  Up to depth
+    blocks are loaded ahead in a background thread, so that the IO overlaps
+    with the computation of the caller.
+    '''
+    ranges = list(ranges)
+    # Threads are not used when modules are being imported (see the comments
+    # in lib.call_in_background)
+    if (depth < 1 or len(ranges) < 2 or not lib.misc.ASYNC_IO or
+        lib.misc.ThreadPoolExecutor is None or lib.misc.imp.lock_held()):
+        for b0, b1 in ranges:
+            yield load(b0, b1)
+        return
+
+    # Blocks are loaded in order by one thread.  HDF5 serializes the reads
+    # anyway.
+    executor = lib.misc.ThreadPoolExecutor(max_workers=1)
+    pending = collections.deque()
+    try:
+        for b0, b1 in ranges:
+            pending.append(executor.submit(load, b0, b1))
+            if len(pending) > depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The generator may be closed before all blocks are consumed
+        for f in pending:
+            f.cancel()
+        executor.shutdown(wait=True)
+
+
 class DF4C(DF):
     '''Relativistic 4-component'''
     def build(self):
@@ -309,10 +496,17 @@ class DF4C(DF):
         with addons.load(self._cderi[0], 'j3c') as ferill:
             naoaux = ferill.shape[0]
             with addons.load(self._cderi[1], 'j3c') as feriss: # python2.6 not support multiple with
-                for b0, b1 in self.prange(0, naoaux, blksize):
+                def load(b0, b1):
                     erill = numpy.asarray(ferill[b0:b1], order='C')
                     eriss = numpy.asarray(feriss[b0:b1], order='C')
-                    yield erill, eriss
+                    return erill, eriss
+                if isinstance(ferill, numpy.ndarray):
+                    depth = 0
+                else:
+                    depth = self.prefetch_depth
+                for dat in _prefetch(load, self.prange(0, naoaux, blksize),
+                                     depth):
+                    yield dat
 
     def get_jk(self, dm, hermi=1, with_j=True, with_k=True,
                direct_scf_tol=getattr(__config__, 'scf_hf_SCF_direct_scf_tol', 1e-13),
@@ -327,6 +521,7 @@ class DF4C(DF):
         else:
             rsh_df = self._rsh_df[key] = copy.copy(self).reset()
             logger.info(self, 'Create RSH-DF object %s for omega=%s', rsh_df, omega)
+        rsh_df.single_precision = self.single_precision
 
         with rsh_df.mol.with_range_coulomb(omega):
             return df_jk.r_get_jk(rsh_df, dm, hermi, with_j, with_k)
@@ -113,6 +113,7 @@ def density_fit(mf, auxbasis=None, with_df=None, only_dfj=False):
             self.with_df.reset(mol)
             return mf_class.reset(self, mol)
 
+        @logger.profile('get_jk')
         def get_jk(self, mol=None, dm=None, hermi=1, with_j=True, with_k=True,
                    omega=None):
             if dm is None: dm = self.make_rdm1()
@@ -221,15 +222,30 @@ def get_jk(dfobj, dm, hermi=1, with_j=True, with_k=True, direct_scf_tol=1e-13):
     vj = 0
     vk = numpy.zeros_like(dms)
 
+    # The DF tensor blocks and the density matrices are contracted in
+    # float32.  The results are accumulated in float64.
+    single_prec = (getattr(dfobj, 'single_precision', False) and
+                   not numpy.iscomplexobj(dms))
+    if single_prec:
+        sp = numpy.float32
+        itemsize = 4
+    else:
+        itemsize = 8
+
     if with_j:
         idx = numpy.arange(nao)
         dmtril = lib.pack_tril(dms + dms.conj().transpose(0,2,1))
         dmtril[:,idx*(idx+1)//2+idx] *= .5
+        if single_prec:
+            dmtril = dmtril.astype(sp)
+            vj = numpy.zeros((nset,nao*(nao+1)//2))
 
     if not with_k:
         for eri1 in dfobj.loop():
-            rho = numpy.einsum('ix,px->ip', dmtril, eri1)
-            vj += numpy.einsum('ip,px->ix', rho, eri1)
+            if single_prec:
+                eri1 = numpy.asarray(eri1, dtype=sp)
+            rho = lib.dot(dmtril, eri1.T)
+            vj += lib.dot(rho, eri1)
 
     elif getattr(dm, 'mo_coeff', None) is not None:
 #TODO: test whether dm.mo_coeff matching dm
@@ -249,30 +265,41 @@ def get_jk(dfobj, dm, hermi=1, with_j=True, with_k=True, direct_scf_tol=1e-13):
         for k in range(nset):
             c = numpy.einsum('pi,i->pi', mo_coeff[k][:,mo_occ[k]>0],
                              numpy.sqrt(mo_occ[k][mo_occ[k]>0]))
+            if single_prec:
+                c = c.astype(sp)
             orbo.append(numpy.asarray(c, order='F'))
 
         max_memory = dfobj.max_memory - lib.current_memory()[0]
-        blksize = max(4, int(min(dfobj.blockdim, max_memory*.3e6/8/nao**2)))
-        buf = numpy.empty((blksize*nao,nao))
+        blksize = max(4, int(min(dfobj.blockdim, max_memory*.3e6/itemsize/nao**2)))
+        if not single_prec:
+            buf = numpy.empty((blksize*nao,nao))
         for eri1 in dfobj.loop(blksize):
             naux, nao_pair = eri1.shape
             assert(nao_pair == nao*(nao+1)//2)
+            if single_prec:
+                eri1 = numpy.asarray(eri1, dtype=sp)
+                eri3 = lib.unpack_tril(eri1).reshape(-1,nao)
             if with_j:
-                rho = numpy.einsum('ix,px->ip', dmtril, eri1)
-                vj += numpy.einsum('ip,px->ix', rho, eri1)
+                rho = lib.dot(dmtril, eri1.T)
+                vj += lib.dot(rho, eri1)
 
             for k in range(nset):
                 nocc = orbo[k].shape[1]
                 if nocc > 0:
-                    buf1 = buf[:naux*nocc]
-                    fdrv(ftrans, fmmm,
-                         buf1.ctypes.data_as(ctypes.c_void_p),
-                         eri1.ctypes.data_as(ctypes.c_void_p),
-                         orbo[k].ctypes.data_as(ctypes.c_void_p),
-                         ctypes.c_int(naux), ctypes.c_int(nao),
-                         (ctypes.c_int*4)(0, nocc, 0, nao),
-                         null, ctypes.c_int(0))
+                    if single_prec:
+                        buf1 = numpy.dot(eri3, orbo[k]).reshape(naux,nao,nocc)
+                        buf1 = buf1.transpose(0,2,1).reshape(-1,nao)
+                    else:
+                        buf1 = buf[:naux*nocc]
+                        fdrv(ftrans, fmmm,
+                             buf1.ctypes.data_as(ctypes.c_void_p),
+                             eri1.ctypes.data_as(ctypes.c_void_p),
+                             orbo[k].ctypes.data_as(ctypes.c_void_p),
+                             ctypes.c_int(naux), ctypes.c_int(nao),
+                             (ctypes.c_int*4)(0, nocc, 0, nao),
+                             null, ctypes.c_int(0))
                     vk[k] += lib.dot(buf1.T, buf1)
+            eri3 = None
             t1 = log.timer_debug1('jk', *t1)
     else:
         #:vk = numpy.einsum('pij,jk->pki', cderi, dm)
@@ -280,24 +307,35 @@ def get_jk(dfobj, dm, hermi=1, with_j=True, with_k=True, direct_scf_tol=1e-13):
         rargs = (ctypes.c_int(nao), (ctypes.c_int*4)(0, nao, 0, nao),
                  null, ctypes.c_int(0))
         dms = [numpy.asarray(x, order='F') for x in dms]
+        if single_prec:
+            dms = [x.astype(sp) for x in dms]
         max_memory = dfobj.max_memory - lib.current_memory()[0]
-        blksize = max(4, int(min(dfobj.blockdim, max_memory*.22e6/8/nao**2)))
-        buf = numpy.empty((2,blksize,nao,nao))
+        blksize = max(4, int(min(dfobj.blockdim, max_memory*.22e6/itemsize/nao**2)))
+        if not single_prec:
+            buf = numpy.empty((2,blksize,nao,nao))
         for eri1 in dfobj.loop(blksize):
             naux, nao_pair = eri1.shape
+            if single_prec:
+                eri1 = numpy.asarray(eri1, dtype=sp)
+                buf2 = lib.unpack_tril(eri1)
+            else:
+                buf2 = lib.unpack_tril(eri1, out=buf[1])
             if with_j:
-                rho = numpy.einsum('ix,px->ip', dmtril, eri1)
-                vj += numpy.einsum('ip,px->ix', rho, eri1)
+                rho = lib.dot(dmtril, eri1.T)
+                vj += lib.dot(rho, eri1)
 
             for k in range(nset):
-                buf1 = buf[0,:naux]
-                fdrv(ftrans, fmmm,
-                     buf1.ctypes.data_as(ctypes.c_void_p),
-                     eri1.ctypes.data_as(ctypes.c_void_p),
-                     dms[k].ctypes.data_as(ctypes.c_void_p),
-                     ctypes.c_int(naux), *rargs)
+                if single_prec:
+                    buf1 = numpy.dot(buf2.reshape(-1,nao), dms[k])
+                    buf1 = buf1.reshape(naux,nao,nao).transpose(0,2,1)
+                else:
+                    buf1 = buf[0,:naux]
+                    fdrv(ftrans, fmmm,
+                         buf1.ctypes.data_as(ctypes.c_void_p),
+                         eri1.ctypes.data_as(ctypes.c_void_p),
+                         dms[k].ctypes.data_as(ctypes.c_void_p),
+                         ctypes.c_int(naux), *rargs)
 
-                buf2 = lib.unpack_tril(eri1, out=buf[1])
                 vk[k] += lib.dot(buf1.reshape(-1,nao).T, buf2.reshape(-1,nao))
             t1 = log.timer_debug1('jk', *t1)
 
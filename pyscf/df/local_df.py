@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# Copyright 2014-2020 The PySCF Developers. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Local density fitting for the exchange matrix
+
+The product of the AOs mu on atom A and nu on atom B is fitted with the
+auxiliary functions of the fitting domain of the atom pair AB, which includes
+the auxiliary functions on A, B and the atoms within domain_radius of A or B
+
+    C^P_{mu nu} = sum_{Q in dom(AB)} [J_dom^{-1}]_{PQ} (Q|mu nu)
+
+The fitting coefficients and the 3-center integrals (P|mu nu) (if they fit in
+max_memory) are stored for the atom pairs of overlapping AOs only.  The
+exchange matrix is evaluated with the robust fitting formula
+(which cancels the first-order fitting error)
+
+    K_{mu lam} = sum_{nu sig} D_{nu sig} [ sum_P C^P_{mu nu} (P|lam sig)
+                                         + sum_Q (mu nu|Q) C^Q_{lam sig}
+                                         - sum_PQ C^P_{mu nu} J_PQ C^Q_{lam sig} ]
+
+With domain_radius=0 it is the pair-atomic resolution of identity (PARI-K).
+When the domains include all atoms, the results are identical to the
+regular DF-K.  The Coulomb matrix is computed with the full auxiliary basis
+by the integral-direct DF-J algorithm (df_jk.get_j).
+
+See also
+Merlot, Kjaergaard, Koch, et al., J. Comput. Chem. 34, 1486 (2013)
+Manzer, Epifanovsky, Head-Gordon, J. Chem. Theory Comput. 11, 518 (2015)
+'''
+
+import time
+import numpy
+import scipy.linalg
+from pyscf import lib
+from pyscf import gto
+from pyscf.lib import logger
+from pyscf.df import df
+from pyscf.df import df_jk
+from pyscf.df import addons
+from pyscf import __config__
+
+DOMAIN_RADIUS = getattr(__config__, 'df_local_df_LocalDF_domain_radius', 0.)
+PAIR_TOL = getattr(__config__, 'df_local_df_LocalDF_pair_tol', 1e-10)
+LINEAR_DEP_THR = getattr(__config__, 'df_df_DF_lindep', 1e-12)
+
+
+def _int3c_by_shells(mol, auxmol, intor='int3c2e'):
+    '''A function to evaluate the 3-center integrals (ij|P) of the given shell
+    slice.  The shell indices of the auxiliary basis are counted from 0.'''
+    intor = mol._add_suffix(intor)
+    atm, bas, env = gto.mole.conc_env(mol._atm, mol._bas, mol._env,
+                                      auxmol._atm, auxmol._bas, auxmol._env)
+    ao_loc = gto.moleintor.make_loc(bas, intor)
+    cintopt = gto.moleintor.make_cintopt(atm, bas, env, intor)
+    nbas = mol.nbas
+    def int3c(shls_slice):
+        i0, i1, j0, j1, k0, k1 = shls_slice
+        shls_slice = (i0, i1, j0, j1, k0+nbas, k1+nbas)
+        return gto.moleintor.getints3c(intor, atm, bas, env, shls_slice, 1,
+                                       's1', ao_loc, cintopt)
+    return int3c
+
+def _solve_pos(a, b):
+    '''Solve a x = b for the positive (semi-)definite matrix a'''
+    try:
+        return scipy.linalg.cho_solve(scipy.linalg.cho_factor(a), b)
+    except scipy.linalg.LinAlgError:
+        w, v = scipy.linalg.eigh(a)
+        mask = w > LINEAR_DEP_THR
+        v = v[:,mask]
+        return lib.dot(v/w[mask], lib.dot(v.T, b))
+
+def atom_pairs(mol, pair_tol=PAIR_TOL):
+    '''Atom pairs (A, B), A >= B, whose AOs have overlap larger than pair_tol'''
+    aoslice = mol.aoslice_by_atom()
+    s = abs(mol.intor_symmetric('int1e_ovlp'))
+    natm = mol.natm
+    smax = numpy.zeros((natm,natm))
+    for ia in range(natm):
+        i0, i1 = aoslice[ia,2:]
+        for ib in range(natm):
+            j0, j1 = aoslice[ib,2:]
+            if i1 > i0 and j1 > j0:
+                smax[ia,ib] = s[i0:i1,j0:j1].max()
+    return [(ia, ib) for ia in range(natm) for ib in range(ia+1)
+            if smax[ia,ib] > pair_tol]
+
+def fitting_domains(mol, auxmol, pairs, domain_radius=DOMAIN_RADIUS):
+    '''Indices of the auxiliary functions in the fitting domain of each
+    atom pair.  The domain of AB includes the auxiliary functions of A, B and
+    of the atoms within domain_radius (in Bohr) of A or B.'''
+    coords = mol.atom_coords()
+    rr = numpy.linalg.norm(coords[:,None] - coords, axis=2)
+    aux_slice = auxmol.aoslice_by_atom()
+    domains = []
+    for ia, ib in pairs:
+        atms = (rr[ia] <= domain_radius) | (rr[ib] <= domain_radius)
+        atms[[ia,ib]] = True
+        domains.append(numpy.hstack([numpy.arange(*aux_slice[x,2:])
+                                     for x in numpy.where(atms)[0]])
+                       .astype(int))
+    return domains
+
+def local_fit_coeffs(mol, auxmol, pairs, domains, j2c=None, verbose=None,
+                     int3c_pairs=None):
+    '''Fitting coefficients C^P_{mu nu} of each atom pair.
+
+    Kwargs:
+        int3c_pairs : list of arrays
+            The integrals (P|mu nu) of each atom pair in the order [P,mu,nu],
+            for all auxiliary functions.  If not given, the integrals are
+            evaluated for the fitting domains.
+
+    Returns:
+        A list of arrays.  Each array has the shape (nao_A, nao_B, naux_AB)
+        for the atom pair AB and the auxiliary functions of its domain.
+    '''
+    log = logger.new_logger(mol, verbose)
+    if j2c is None:
+        j2c = auxmol.intor('int2c2e', hermi=1)
+    aoslice = mol.aoslice_by_atom()
+    aux_loc = auxmol.ao_loc
+    int3c = _int3c_by_shells(mol, auxmol)
+    ao_to_shl = numpy.repeat(numpy.arange(auxmol.nbas),
+                             aux_loc[1:]-aux_loc[:-1])
+    coeffs = []
+    for n, ((ia, ib), dom) in enumerate(zip(pairs, domains)):
+        ish0, ish1, i0, i1 = aoslice[ia]
+        jsh0, jsh1, j0, j1 = aoslice[ib]
+        nd = dom.size
+        if i1 == i0 or j1 == j0 or nd == 0:
+            coeffs.append(numpy.zeros((i1-i0, j1-j0, nd)))
+            continue
+        if int3c_pairs is not None:
+            ints = int3c_pairs[n][dom].transpose(1,2,0).reshape(-1,nd)
+        else:
+            # The domain is composed of whole atoms. Evaluate the integrals
+            # for the contiguous shell ranges of the domain.
+            ints = []
+            shls = numpy.unique(ao_to_shl[dom])
+            brk = numpy.where(numpy.diff(shls) != 1)[0] + 1
+            for seg in numpy.split(shls, brk):
+                ints.append(int3c((ish0, ish1, jsh0, jsh1, seg[0], seg[-1]+1)))
+            ints = numpy.concatenate(ints, axis=2).reshape(-1,nd)
+        c = _solve_pos(j2c[dom[:,None],dom], ints.T)
+        coeffs.append(numpy.asarray(c.T.reshape(i1-i0,j1-j0,nd), order='C'))
+    log.debug('Local fitting coefficients for %d atom pairs, %.2f MB',
+              len(pairs), sum(c.size for c in coeffs)*8e-6)
+    return coeffs
+
+def _contract_coeffs(dfobj, c):
+    '''Y^P_{mu k} = sum_nu C^P_{mu nu} c_{nu k} for the AOs mu on each atom.
+
+    Returns:
+        A list of arrays of shape (nao_A, naux_A, k) for each atom A, where
+        naux_A are the auxiliary functions of dfobj._atom_aux[A].
+    '''
+    aoslice = dfobj.mol.aoslice_by_atom()
+    nk = c.shape[1]
+    ys = [numpy.zeros((p1-p0, len(aux), nk))
+          for (p0, p1), aux in zip(aoslice[:,2:], dfobj._atom_aux)]
+    for (ia, ib), cab, (pos_a, pos_b) in zip(dfobj._pairs, dfobj._coeffs,
+                                             dfobj._pair_pos):
+        i0, i1 = aoslice[ia,2:]
+        j0, j1 = aoslice[ib,2:]
+        ni, nj, nd = cab.shape
+        if ni == 0 or nj == 0 or nd == 0:
+            continue
+        y = lib.dot(cab.transpose(0,2,1).reshape(-1,nj), c[j0:j1])
+        ys[ia][:,pos_a] += y.reshape(ni,nd,nk)
+        if ia != ib:
+            y = lib.dot(cab.transpose(1,2,0).reshape(-1,ni), c[i0:i1])
+            ys[ib][:,pos_b] += y.reshape(nj,nd,nk)
+    return ys
+
+def _pair_int3c(int3c, mol, auxmol, ia, ib):
+    '''(P|lam sig) for lam on atom A and sig on atom B, in the order [P,lam,sig]'''
+    aoslice = mol.aoslice_by_atom()
+    ish0, ish1, i0, i1 = aoslice[ia]
+    jsh0, jsh1, j0, j1 = aoslice[ib]
+    if i1 == i0 or j1 == j0:
+        return numpy.zeros((auxmol.nao_nr(),i1-i0,j1-j0))
+    return int3c((jsh0, jsh1, ish0, ish1, 0, auxmol.nbas)).transpose(2,1,0)
+
+def _half_transform(dfobj, c):
+    '''(P|lam k) = sum_sig (P|lam sig) c_{sig k} in the order [P,lam,k].
+
+    Only the AOs sig on the neighbors of the atom of lam are included.  The
+    integrals (P|lam sig) are taken from dfobj._int3c if they were kept in
+    memory by dfobj.build.
+    '''
+    mol = dfobj.mol
+    auxmol = dfobj.auxmol
+    aoslice = mol.aoslice_by_atom()
+    naux = auxmol.nao_nr()
+    nk = c.shape[1]
+    w = numpy.zeros((naux,mol.nao_nr(),nk))
+    if dfobj._int3c is None:
+        int3c = _int3c_by_shells(mol, auxmol)
+    for ia, (i0, i1) in enumerate(aoslice[:,2:]):
+        nbr_ao = dfobj._nbr_ao[ia]
+        if i1 == i0 or nbr_ao.size == 0:
+            continue
+        if dfobj._int3c is None:
+            g = numpy.concatenate([_pair_int3c(int3c, mol, auxmol, ia, ib)
+                                   for ib in dfobj._neighbors[ia]], axis=2)
+        else:
+            g = dfobj._int3c[ia]
+        y = lib.dot(g.reshape(-1,nbr_ao.size), c[nbr_ao])
+        w[:,i0:i1] = y.reshape(naux,i1-i0,nk)
+    return w
+
+def _fit_coulomb(dfobj, ys, j2c):
+    '''sum_Q J_PQ Y^Q_{lam k} in the order [P,lam,k]'''
+    aoslice = dfobj.mol.aoslice_by_atom()
+    naux = j2c.shape[0]
+    nk = ys[0].shape[2]
+    jy = numpy.zeros((naux,dfobj.mol.nao_nr(),nk))
+    for ic, (j0, j1) in enumerate(aoslice[:,2:]):
+        y = ys[ic]
+        if y.size == 0:
+            continue
+        aux_c = dfobj._atom_aux[ic]
+        z = lib.dot(j2c[:,aux_c], y.transpose(1,0,2).reshape(aux_c.size,-1))
+        jy[:,j0:j1] = z.reshape(naux,j1-j0,nk)
+    return jy
+
+def _contract_local_aux(dfobj, ys, w):
+    '''T_{mu lam} = sum_{P k} Y^P_{mu k} W^P_{lam k} where P runs over the local
+    auxiliary functions of the atom of mu'''
+    aoslice = dfobj.mol.aoslice_by_atom()
+    aux_slice = dfobj.auxmol.aoslice_by_atom()
+    naux, nao, nk = w.shape
+    w = numpy.asarray(w.transpose(0,2,1), order='C')
+    vk = numpy.zeros((nao,nao))
+    for x, (x0, x1) in enumerate(aux_slice[:,2:]):
+        nx = x1 - x0
+        if nx == 0 or len(dfobj._aux_atoms[x]) == 0:
+            continue
+        # Y for all AOs mu whose local auxiliary functions include atom x
+        mu_idx = []
+        yx = []
+        for ia, pos in dfobj._aux_atoms[x]:
+            mu_idx.append(numpy.arange(*aoslice[ia,2:]))
+            yx.append(ys[ia][:,pos].reshape(-1,nx*nk))
+        mu_idx = numpy.hstack(mu_idx)
+        yx = numpy.vstack(yx)
+        vk[mu_idx] += lib.dot(yx, w[x0:x1].reshape(nx*nk,nao))
+    return vk
+
+def get_k(dfobj, dm, hermi=1):
+    '''Exchange matrix of the robust local density fitting'''
+    t0 = t1 = (time.clock(), time.time())
+    log = logger.Logger(dfobj.stdout, dfobj.verbose)
+    if dfobj._coeffs is None:
+        dfobj.build()
+    j2c = dfobj._j2c
+
+    dms = numpy.asarray(dm)
+    dm_shape = dms.shape
+    nao = dm_shape[-1]
+    dms = dms.reshape(-1,nao,nao)
+    nset = dms.shape[0]
+
+    # Factorize D_{nu sig} = sum_k cl_{nu k} cr_{sig k}
+    if getattr(dm, 'mo_coeff', None) is not None:
+        mo_coeff = numpy.asarray(dm.mo_coeff)
+        mo_occ   = numpy.asarray(dm.mo_occ)
+        nmo = mo_occ.shape[-1]
+        mo_coeff = mo_coeff.reshape(-1,nao,nmo)
+        mo_occ   = mo_occ.reshape(-1,nmo)
+        if mo_occ.shape[0] * 2 == nset: # handle ROHF DM
+            mo_coeff = numpy.vstack((mo_coeff, mo_coeff))
+            mo_occa = numpy.array(mo_occ> 0, dtype=numpy.double)
+            mo_occb = numpy.array(mo_occ==2, dtype=numpy.double)
+            mo_occ = numpy.vstack((mo_occa, mo_occb))
+        factors = []
+        for k in range(nset):
+            c = numpy.einsum('pi,i->pi', mo_coeff[k][:,mo_occ[k]>0],
+                             numpy.sqrt(mo_occ[k][mo_occ[k]>0]))
+            factors.append((c, c))
+    else:
+        eye = numpy.eye(nao)
+        factors = [(d, eye) for d in dms]
+
+    naux = dfobj.auxmol.nao_nr()
+    naux_loc = max([len(x) for x in dfobj._atom_aux] + [1])
+    max_memory = dfobj.max_memory - lib.current_memory()[0]
+    # ys_l, ys_r and the intermediates (P|lam k) of the robust fitting
+    kblk = max(4, int(max_memory*.5e6/8/(nao*(naux*3+naux_loc*2))))
+    kblk = min(kblk, nao)
+
+    vk = numpy.zeros((nset,nao,nao))
+    for k, (cl, cr) in enumerate(factors):
+        same = cl is cr
+        for k0, k1 in lib.prange(0, cl.shape[1], kblk):
+            ys_l = _contract_coeffs(dfobj, cl[:,k0:k1])
+            ys_r = ys_l if same else _contract_coeffs(dfobj, cr[:,k0:k1])
+            # term1 = sum_P Yl^P_{mu k} (P|lam k)
+            # term2 = sum_Q (mu k|Q) Yr^Q_{lam k}
+            # term3 = sum_PQ Yl^P_{mu k} J_PQ Yr^Q_{lam k}
+            w = _half_transform(dfobj, cr[:,k0:k1])
+            if same or hermi == 1:
+                # term2 = term1.T and term3 is hermitian.  The three terms
+                # are evaluated together as T + T.T, T = term1 - term3/2
+                w -= .5 * _fit_coulomb(dfobj, ys_r, j2c)
+                vk1 = _contract_local_aux(dfobj, ys_l, w)
+                vk[k] += vk1 + vk1.T
+            else:
+                w -= _fit_coulomb(dfobj, ys_r, j2c)
+                vk[k] += _contract_local_aux(dfobj, ys_l, w)
+                w = _half_transform(dfobj, cl[:,k0:k1])
+                vk[k] += _contract_local_aux(dfobj, ys_r, w).T
+            w = None
+        t1 = log.timer_debug1('local df vk %d' % k, *t1)
+    logger.timer(dfobj, 'local df vk', *t0)
+    return vk.reshape(dm_shape)
+
+
+class LocalDF(df.DF):
+    '''Local density fitting for the exchange matrix.  The Coulomb matrix is
+    computed with the full auxiliary basis.
+
+    Attributes:
+        domain_radius : float
+            In Bohr.  The fitting domain of atom pair AB includes the
+            auxiliary functions of the atoms within domain_radius of A or B.
+            Default is 0, which means the auxiliary functions on A and B only
+            (pair-atomic fitting).
+        pair_tol : float
+            The atom pairs with the AO overlap smaller than pair_tol are
+            neglected.  Default is 1e-10.
+
+    Examples:
+
+    >>> mol = gto.M(atom='N 0 0 0; N 0 0 1.1', basis='ccpvdz')
+    >>> mf = scf.RHF(mol).density_fit(with_df=df.LocalDF(mol))
+    >>> mf.with_df.domain_radius = 4.
+    >>> mf.kernel()
+    '''
+
+    domain_radius = DOMAIN_RADIUS
+    pair_tol = PAIR_TOL
+
+    def __init__(self, mol, auxbasis=None):
+        df.DF.__init__(self, mol, auxbasis)
+        self._pairs = None
+        self._coeffs = None
+        self._j2c = None
+        self._int3c = None
+        self._keys = self._keys.union(['domain_radius', 'pair_tol'])
+
+    def dump_flags(self, verbose=None):
+        df.DF.dump_flags(self, verbose)
+        log = logger.new_logger(self, verbose)
+        log.info('domain_radius = %g', self.domain_radius)
+        log.info('pair_tol = %g', self.pair_tol)
+        return self
+
+    def build(self):
+        t0 = (time.clock(), time.time())
+        log = logger.Logger(self.stdout, self.verbose)
+        self.check_sanity()
+        self.dump_flags()
+
+        mol = self.mol
+        self.auxmol = auxmol = addons.make_auxmol(mol, self.auxbasis)
+        self._j2c = auxmol.intor('int2c2e', hermi=1)
+        self._pairs = pairs = atom_pairs(mol, self.pair_tol)
+        domains = fitting_domains(mol, auxmol, pairs, self.domain_radius)
+
+        # The neighbors of each atom A are the atoms B of the significant
+        # pairs AB.  The 3-center integrals (P|lam sig) of lam on A and sig on
+        # the neighbors of A are kept in memory if possible.  They are needed
+        # by every get_k call.
+        natm = mol.natm
+        aoslice = mol.aoslice_by_atom()
+        self._neighbors = [[] for i in range(natm)]
+        for ia, ib in pairs:
+            self._neighbors[ia].append(ib)
+            if ia != ib:
+                self._neighbors[ib].append(ia)
+        self._neighbors = [sorted(x) for x in self._neighbors]
+        self._nbr_ao = [numpy.hstack([numpy.arange(*aoslice[ib,2:])
+                                      for ib in x]).astype(int)
+                        if x else numpy.zeros(0, dtype=int)
+                        for x in self._neighbors]
+
+        naux = auxmol.nao_nr()
+        size = naux * sum((p1-p0)*x.size
+                          for (p0, p1), x in zip(aoslice[:,2:], self._nbr_ao))
+        mem_now = lib.current_memory()[0]
+        if size*8e-6 < (self.max_memory-mem_now) * .5:
+            int3c = _int3c_by_shells(mol, auxmol)
+            self._int3c = [numpy.empty((naux,p1-p0,x.size))
+                           for (p0, p1), x in zip(aoslice[:,2:], self._nbr_ao)]
+            pair_int3c = []
+            for ia, ib in pairs:
+                i0, i1 = aoslice[ia,2:]
+                j0, j1 = aoslice[ib,2:]
+                g = _pair_int3c(int3c, mol, auxmol, ia, ib)
+                p0 = numpy.searchsorted(self._nbr_ao[ia], j0)
+                self._int3c[ia][:,:,p0:p0+j1-j0] = g
+                if ia != ib:
+                    p0 = numpy.searchsorted(self._nbr_ao[ib], i0)
+                    self._int3c[ib][:,:,p0:p0+i1-i0] = g.transpose(0,2,1)
+                pair_int3c.append(g)
+            log.debug('Keep 3-center integrals of %d atom pairs, %.2f MB',
+                      len(pairs), size*8e-6)
+        else:
+            self._int3c = pair_int3c = None
+        self._coeffs = local_fit_coeffs(mol, auxmol, pairs, domains,
+                                        self._j2c, log, pair_int3c)
+        pair_int3c = None
+
+        # The local auxiliary functions of atom A are the union of the
+        # domains of the pairs which include A
+        atom_aux = [[] for i in range(natm)]
+        for (ia, ib), dom in zip(pairs, domains):
+            atom_aux[ia].append(dom)
+            atom_aux[ib].append(dom)
+        self._atom_aux = [numpy.unique(numpy.hstack(x)).astype(int)
+                          if x else numpy.zeros(0, dtype=int)
+                          for x in atom_aux]
+        self._pair_pos = [(numpy.searchsorted(self._atom_aux[ia], dom),
+                           numpy.searchsorted(self._atom_aux[ib], dom))
+                          for (ia, ib), dom in zip(pairs, domains)]
+
+        # For each auxiliary atom X, the atoms A and the positions of the
+        # auxiliary functions of X in the local auxiliary functions of A
+        aux_slice = auxmol.aoslice_by_atom()
+        self._aux_atoms = [[] for i in range(natm)]
+        for ia, aux in enumerate(self._atom_aux):
+            for x, (x0, x1) in enumerate(aux_slice[:,2:]):
+                if x1 > x0:
+                    pos = numpy.searchsorted(aux, numpy.arange(x0, x1))
+                    if pos[-1] < aux.size and aux[pos[0]] == x0:
+                        self._aux_atoms[x].append((ia, pos))
+        log.timer('LocalDF build', *t0)
+        return self
+
+    def reset(self, mol=None):
+        df.DF.reset(self, mol)
+        self._pairs = None
+        self._coeffs = None
+        self._j2c = None
+        self._int3c = None
+        return self
+
+    def loop(self, blksize=None):
+        raise NotImplementedError('LocalDF does not have the global 3-index '
+                                  'tensor')
+
+    def get_naoaux(self):
+        return addons.make_auxmol(self.mol, self.auxbasis).nao_nr()
+
+    def get_jk(self, dm, hermi=1, with_j=True, with_k=True,
+               direct_scf_tol=getattr(__config__, 'scf_hf_SCF_direct_scf_tol', 1e-13),
+               omega=None):
+        if omega is not None:
+            raise NotImplementedError('LocalDF for range-separated Coulomb')
+        vj = vk = None
+        if with_j:
+            vj = df_jk.get_j(self, dm, hermi, direct_scf_tol)
+        if with_k:
+            vk = get_k(self, dm, hermi)
+        return vj, vk
+
+    def get_eri(self):
+        raise NotImplementedError
+    get_ao_eri = get_eri
+
+    def ao2mo(self, *args, **kwargs):
+        raise NotImplementedError
+    get_mo_eri = ao2mo
@@ -16,6 +16,7 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import io
 import time
 import tempfile
 import numpy
@@ -97,6 +98,111 @@ def cholesky_eri(mol, erifile, auxbasis='weigend+etb', dataname='j3c', tmpdir=No
     log.timer('cholesky_eri', *time0)
     return erifile
 
+def cholesky_eri_mmap(mol, erifile, auxbasis='weigend+etb', tmpdir=None,
+                      int3c='int3c2e', int2c='int2c2e', dtype=numpy.double,
+                      compress=None, max_memory=MAX_MEMORY, auxmol=None,
+                      verbose=logger.NOTE):
+    '''3-index density-fitting tensor in a memory-mappable file.  The tensor
+    is stored in the lower-triangular (s2ij) packed layout with shape
+    (naux, nao*(nao+1)/2).
+
+    Kwargs:
+        dtype : numpy.double or numpy.float32
+            The precision of the stored tensor.  When it is read by
+            DF.loop, the float32 tensor is converted to float64.
+        compress : None, 'zlib' or float
+            None: the tensor is stored as a raw array in the .npy format.  It
+            is loaded as a read-only numpy.memmap, and the row blocks are
+            views of the file without copying.
+            'zlib': the row blocks are compressed losslessly.
+            float: the row blocks are rounded to integer multiples of the
+            given value (the absolute error is less than half of the value),
+            then compressed.  The multiples are stored in the smallest
+            signed integer type which holds them, regardless of dtype.
+            Compressed tensors are stored in .npz format.  The blocks are
+            decompressed when they are read.
+
+    The file can be assigned to DF._cderi, or be read with addons.load.
+    '''
+    log = logger.new_logger(mol, verbose)
+    time0 = (time.clock(), time.time())
+
+    if auxmol is None:
+        auxmol = make_auxmol(mol, auxbasis)
+
+    if tmpdir is None:
+        tmpdir = lib.param.TMPDIR
+    dataname = 'j3c'
+    swapfile = tempfile.NamedTemporaryFile(dir=tmpdir)
+    cholesky_eri_b(mol, swapfile.name, auxbasis, dataname, int3c, 's2ij',
+                   int2c, 1, max_memory, auxmol, verbose=log)
+    fswap = h5py.File(swapfile.name, 'r')
+    time1 = log.timer('generate (ij|L) 1 pass', *time0)
+
+    nao = mol.nao_nr()
+    nao_pair = nao * (nao+1) // 2
+    naoaux = fswap['%s/0'%dataname].shape[0]
+    dtype = numpy.dtype(dtype)
+    iolen = min(max(int(max_memory*.45e6/8/nao_pair), 28), naoaux)
+    totstep = (naoaux+iolen-1)//iolen
+
+    if compress is None:
+        feri = numpy.lib.format.open_memmap(erifile, mode='w+', dtype=dtype,
+                                            shape=(naoaux,nao_pair))
+        def save(istep, row0, row1, buf):
+            feri[row0:row1] = buf
+    else:
+        import zipfile
+        if compress == 'zlib':
+            tol = 0
+        else:
+            tol = float(compress)
+            assert(tol > 0)
+        feri = zipfile.ZipFile(erifile, 'w', zipfile.ZIP_DEFLATED,
+                               allowZip64=True)
+        def write(key, dat):
+            f = io.BytesIO()
+            numpy.lib.format.write_array(f, numpy.asarray(dat))
+            feri.writestr(key+'.npy', f.getvalue())
+        write('shape', numpy.array((naoaux,nao_pair)))
+        write('rows', numpy.append(numpy.arange(0, naoaux, iolen), naoaux))
+        write('tol', numpy.array(tol))
+        def save(istep, row0, row1, buf):
+            if tol > 0:
+                buf = numpy.rint(buf / tol)
+                buf = buf.astype(_int_type(abs(buf).max()))
+            else:
+                buf = buf.astype(dtype)
+            write('blk%d' % istep, buf)
+
+    bufs1 = numpy.empty((iolen, nao_pair))
+    bufs2 = numpy.empty_like(bufs1)
+    ti0 = time1
+    with lib.call_in_background(save) as bsave:
+        for istep, (row0, row1) in enumerate(lib.prange(0, naoaux, iolen)):
+            nrow = row1 - row0
+            buf = _load_from_h5g(fswap[dataname], row0, row1, bufs1)
+            bufs1, bufs2 = bufs2, bufs1
+            bsave(istep, row0, row1, buf)
+            ti0 = log.timer('step 2 [%d/%d], [%d:%d], row = %d'%
+                            (istep+1, totstep, row0, row1, nrow), *ti0)
+
+    fswap.close()
+    if compress is None:
+        feri.flush()
+    else:
+        feri.close()
+    feri = None
+    log.timer('cholesky_eri_mmap', *time0)
+    return erifile
+
+def _int_type(nmax):
+    '''The smallest signed integer type for the values in [-nmax, nmax]'''
+    for t in (numpy.int8, numpy.int16, numpy.int32):
+        if nmax <= numpy.iinfo(t).max:
+            return t
+    return numpy.int64
+
 def cholesky_eri_b(mol, erifile, auxbasis='weigend+etb', dataname='j3c',
                  int3c='int3c2e', aosym='s2ij', int2c='int2c2e', comp=1,
                  max_memory=MAX_MEMORY, auxmol=None, verbose=logger.NOTE):
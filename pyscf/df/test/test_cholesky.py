@@ -0,0 +1,64 @@
+# Copyright 2014-2020 The PySCF Developers. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+import numpy
+from pyscf import gto
+from pyscf import scf
+from pyscf import ao2mo
+from pyscf import df
+
+mol = gto.Mole()
+mol.build(
+    verbose = 0,
+    atom = '''O     0    0.       0.
+              1     0    -0.757   0.587
+              1     0    0.757    0.587''',
+    basis = 'cc-pvdz',
+)
+
+def tearDownModule():
+    global mol
+    del mol
+
+
+class KnownValues(unittest.TestCase):
+    def test_eri_diagonal(self):
+        eri = mol.intor('int2e', aosym='s4')
+        diag = df.cholesky.eri_diagonal(mol)
+        self.assertAlmostEqual(abs(diag - eri.diagonal()).max(), 0, 12)
+
+    def test_cholesky_eri(self):
+        eri = mol.intor('int2e', aosym='s4')
+        for tol in (1e-4, 1e-8):
+            cderi = df.cholesky.cholesky_eri(mol, tol)
+            self.assertTrue(cderi.shape[0] < eri.shape[0])
+            self.assertTrue(abs(numpy.dot(cderi.T, cderi) - eri).max() < tol)
+
+    def test_cd_scf(self):
+        e_ref = scf.RHF(mol).kernel()
+        mf = scf.RHF(mol).density_fit(with_df=df.CDERI(mol, tol=1e-7))
+        self.assertAlmostEqual(mf.kernel(), e_ref, 6)
+
+        with_df = df.CDERI(mol)
+        with_df.build()
+        self.assertEqual(with_df.get_naoaux(), with_df._cderi.shape[0])
+        eri = ao2mo.restore(8, mol.intor('int2e', aosym='s4'), mol.nao)
+        self.assertAlmostEqual(abs(with_df.get_eri() - eri).max(), 0, 5)
+
+
+if __name__ == "__main__":
+    print("Full Tests for Cholesky decomposed ERIs")
+    unittest.main()
@@ -85,6 +85,74 @@ class KnownValues(unittest.TestCase):
         eri1 = dfobj.get_eri()
         self.assertAlmostEqual(abs(eri0-eri1).max(), 0, 9)
 
+    def test_loop_prefetch(self):
+        dfobj = df.DF(mol)
+        dfobj.max_memory = 0.01
+        dfobj.build()
+        dfobj.max_memory = 4000
+        ref = numpy.vstack([x.copy() for x in dfobj.loop(blksize=7)])
+        self.assertEqual(ref.shape[0], 116)
+        for depth in (0, 1, 3):
+            dfobj.prefetch_depth = depth
+            dat = numpy.vstack(list(dfobj.loop(blksize=7)))
+            self.assertAlmostEqual(abs(dat-ref).max(), 0, 14)
+
+        # generator closed before all blocks are consumed
+        eri1 = next(dfobj.loop(blksize=7))
+        self.assertAlmostEqual(abs(eri1-ref[:7]).max(), 0, 14)
+
+    def test_shared_cderi(self):
+        name = 'test-%d' % os.getpid()
+        dfobj = df.DF(mol, 'weigend')
+        dfobj.shm_name = name
+        try:
+            dfobj.build()
+            self.assertTrue(os.path.isfile(dfobj._cderi))
+            eri0 = df.DF(mol, 'weigend').get_eri()
+            self.assertAlmostEqual(abs(dfobj.get_eri() - eri0).max(), 0, 9)
+
+            # The second object attaches to the existing tensor
+            dfobj1 = df.DF(mol, 'weigend')
+            dfobj1.shm_name = name
+            dfobj1.build()
+            self.assertEqual(dfobj1._cderi, dfobj._cderi)
+            with df.addons.load(dfobj1._cderi, 'j3c') as feri:
+                self.assertFalse(feri.flags.writeable)
+
+            dfobj2 = df.DF(mol, 'ccpvdz-jkfit')
+            dfobj2.shm_name = name
+            self.assertRaises(RuntimeError, dfobj2.build)
+        finally:
+            dfobj.unlink_shared_cderi()
+        self.assertTrue(dfobj._cderi is None)
+        path = df.df._shm_path(name)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(path + '.key'))
+        # The lock file is kept for the processes which wait on the lock
+        self.assertTrue(os.path.exists(path + '.lock'))
+
+        # A failed build does not leave the temporary file in shared memory.
+        # The build fails after the tensor is generated because the key file
+        # can not be written.
+        dfobj = df.DF(mol, 'weigend')
+        dfobj.shm_name = name
+        os.mkdir(path + '.key')
+        try:
+            self.assertRaises(EnvironmentError, dfobj.build)
+            self.assertFalse(os.path.exists(path))
+            self.assertFalse(os.path.exists('%s.tmp%d' % (path, os.getpid())))
+        finally:
+            os.rmdir(path + '.key')
+            dfobj.unlink_shared_cderi()
+
+        # _cderi is not a shared tensor
+        dfobj = df.DF(mol, 'weigend')
+        dfobj.shm_name = name
+        dfobj._cderi = numpy.zeros((2,3))
+        dfobj.unlink_shared_cderi()
+        self.assertEqual(dfobj._cderi.shape, (2,3))
+        os.remove(path + '.lock')
+
     def test_init_denisty_fit(self):
         from pyscf.df import df_jk
         from pyscf import cc
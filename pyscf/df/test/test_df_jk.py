@@ -57,6 +57,29 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual(mf.scf(), -76.025936299702536, 9)
         self.assertTrue(mf._eri is None)
 
+    def test_rhf_mixed_precision(self):
+        mf = scf.density_fit(scf.RHF(mol), auxbasis='weigend')
+        mf.mixed_precision = True
+        self.assertAlmostEqual(mf.scf(), -76.025936299702536, 8)
+        self.assertFalse(mf.with_df.single_precision)
+
+        from pyscf import dft
+        mf = dft.RKS(mol).density_fit(auxbasis='weigend')
+        mf.xc = 'b3lyp'
+        e_ref = mf.kernel()
+        mf.mixed_precision = True
+        self.assertAlmostEqual(mf.kernel(), e_ref, 8)
+        self.assertFalse(mf._numint.single_precision)
+
+        # Double precision is restored when the SCF iterations are interrupted
+        def stop(envs):
+            raise KeyboardInterrupt
+        mf = scf.density_fit(scf.RHF(mol), auxbasis='weigend')
+        mf.mixed_precision = True
+        mf.callback = stop
+        self.assertRaises(KeyboardInterrupt, mf.kernel)
+        self.assertFalse(mf.with_df.single_precision)
+
     def test_uhf(self):
         mf = scf.density_fit(scf.UHF(mol), auxbasis='weigend')
         self.assertAlmostEqual(mf.scf(), -76.025936299702536, 9)
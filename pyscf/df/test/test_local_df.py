@@ -0,0 +1,107 @@
+# Copyright 2014-2020 The PySCF Developers. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+import unittest
+import numpy
+from pyscf import lib
+from pyscf import gto
+from pyscf import scf
+from pyscf import df
+
+mol = gto.Mole()
+mol.build(
+    verbose = 0,
+    atom = '''O     0    0.       0.
+              1     0    -0.757   0.587
+              1     0    0.757    0.587''',
+    basis = 'cc-pvdz',
+)
+
+def tearDownModule():
+    global mol
+    del mol
+
+
+class KnownValues(unittest.TestCase):
+    def test_full_domain(self):
+        # The local fitting is identical to the regular DF when the domains
+        # include all atoms
+        numpy.random.seed(1)
+        nao = mol.nao_nr()
+        dm = numpy.random.random((2,nao,nao))
+        dm[0] = dm[0] + dm[0].T
+        vj0, vk0 = df.DF(mol).get_jk(dm[0], hermi=1)
+        vj1, vk1 = df.DF(mol).get_jk(dm[1], hermi=0)
+
+        with_df = df.LocalDF(mol)
+        with_df.domain_radius = 10.
+        vj, vk = with_df.get_jk(dm[0], hermi=1)
+        self.assertAlmostEqual(abs(vj - vj0).max(), 0, 8)
+        self.assertAlmostEqual(abs(vk - vk0).max(), 0, 8)
+        vk = with_df.get_jk(dm[1], hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk - vk1).max(), 0, 8)
+
+    def test_local_df_scf(self):
+        mf = scf.RHF(mol).density_fit()
+        e_ref = mf.kernel()
+        mf = scf.RHF(mol).density_fit(with_df=df.LocalDF(mol))
+        e1 = mf.kernel()
+        self.assertAlmostEqual(e1, e_ref, 3)
+
+        mf.with_df.domain_radius = 10.
+        mf.with_df.reset()
+        self.assertAlmostEqual(mf.kernel(), e_ref, 8)
+
+        mf = scf.UHF(mol).density_fit(with_df=df.LocalDF(mol))
+        self.assertAlmostEqual(mf.kernel(), e1, 8)
+
+    def test_extended_system(self):
+        # The atom pairs of the remote atoms of a long chain are screened.
+        # With the domains of all atoms, the exchange matrix agrees with
+        # the regular DF up to the neglected atom pairs.
+        mol1 = gto.M(atom=[['H', (0, 0, 1.8*i)] for i in range(16)],
+                     basis='631g', verbose=0)
+        mf = scf.RHF(mol1).density_fit().run()
+        dm = mf.make_rdm1()
+        vk0 = mf.with_df.get_jk(dm, with_j=False)[1]
+
+        with_df = df.LocalDF(mol1)
+        with_df.domain_radius = 100.
+        with_df.build()
+        natm = mol1.natm
+        self.assertTrue(len(with_df._pairs) < natm*(natm+1)//2)
+        self.assertTrue(all(len(x) < natm for x in with_df._neighbors[:4]))
+        self.assertTrue(with_df._int3c is not None)
+        vk1 = with_df.get_jk(dm, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk1 - vk0).max(), 0, 7)
+        dm1 = lib.tag_array(dm, mo_coeff=mf.mo_coeff, mo_occ=mf.mo_occ)
+        vk1 = with_df.get_jk(dm1, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk1 - vk0).max(), 0, 7)
+
+        numpy.random.seed(2)
+        dm2 = dm + numpy.random.random(dm.shape) * .1
+        vk0 = mf.with_df.get_jk(dm2, hermi=0, with_j=False)[1]
+        vk1 = with_df.get_jk(dm2, hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk1 - vk0).max(), 0, 7)
+
+        # 3-center integrals evaluated on the fly
+        with_df._int3c = None
+        vk2 = with_df.get_jk(dm2, hermi=0, with_j=False)[1]
+        self.assertAlmostEqual(abs(vk2 - vk1).max(), 0, 12)
+
+
+if __name__ == "__main__":
+    print("Full Tests for local density fitting")
+    unittest.main()
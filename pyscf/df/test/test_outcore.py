@@ -93,6 +93,60 @@ class KnownValues(unittest.TestCase):
         with h5py.File(ftmp.name, 'r') as feri:
             self.assertTrue(numpy.allclose(feri['eri_mo'], cderi0))
 
+    def test_cholesky_eri_mmap(self):
+        ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+        cderi0 = df.incore.cholesky_eri(mol, auxmol=auxmol)
+
+        df.outcore.cholesky_eri_mmap(mol, ftmp.name, auxmol=auxmol)
+        with df.addons.load(ftmp.name, 'j3c') as feri:
+            self.assertTrue(isinstance(feri, numpy.memmap))
+            self.assertAlmostEqual(abs(feri[:] - cderi0).max(), 0, 9)
+
+        df.outcore.cholesky_eri_mmap(mol, ftmp.name, auxmol=auxmol,
+                                     dtype=numpy.float32, max_memory=.05)
+        with df.addons.load(ftmp.name, 'j3c') as feri:
+            self.assertEqual(feri.dtype, numpy.float32)
+            self.assertAlmostEqual(abs(feri[:] - cderi0).max(), 0, 5)
+
+        df.outcore.cholesky_eri_mmap(mol, ftmp.name, auxmol=auxmol,
+                                     compress='zlib', max_memory=.05)
+        with df.addons.load(ftmp.name, 'j3c') as feri:
+            self.assertEqual(feri.shape, cderi0.shape)
+            self.assertAlmostEqual(abs(feri[5:50] - cderi0[5:50]).max(), 0, 12)
+            # Sequential slices which do not align with the compressed blocks
+            nblk = len(feri.rows) - 1
+            self.assertTrue(nblk > 1)
+            out = numpy.vstack([feri[p0:p1] for p0, p1 in lib.prange(0, len(feri), 7)])
+            self.assertAlmostEqual(abs(out - cderi0).max(), 0, 12)
+            self.assertEqual(feri._cached_block[0], nblk-1)
+
+        df.outcore.cholesky_eri_mmap(mol, ftmp.name, auxmol=auxmol,
+                                     compress=1e-8, max_memory=.05)
+        with df.addons.load(ftmp.name, 'j3c') as feri:
+            self.assertTrue(abs(feri[:] - cderi0).max() < .51e-8)
+
+        dfobj = df.DF(mol)
+        dfobj._cderi = ftmp.name
+        eri0 = ao2mo.restore(8, numpy.dot(cderi0.T, cderi0), mol.nao)
+        self.assertAlmostEqual(abs(dfobj.get_eri() - eri0).max(), 0, 6)
+
+        # The smallest integer type is used for the rounded blocks
+        df.outcore.cholesky_eri_mmap(mol, ftmp.name, auxmol=auxmol,
+                                     compress=1e-3, max_memory=.05)
+        with numpy.load(ftmp.name) as f:
+            self.assertEqual(f['blk0'].dtype, numpy.int16)
+        with df.addons.load(ftmp.name, 'j3c') as feri:
+            self.assertTrue(abs(feri[:] - cderi0).max() < .51e-3)
+        self.assertEqual(df.outcore._int_type(127), numpy.int8)
+        self.assertEqual(df.outcore._int_type(2**31), numpy.int64)
+
+        dfobj = df.DF(mol, 'weigend')
+        dfobj.max_memory = .01
+        dfobj.cderi_format = 'mmap'
+        dfobj.cderi_dtype = numpy.float32
+        dfobj.build()
+        self.assertAlmostEqual(abs(dfobj.get_eri() - eri0).max(), 0, 5)
+
     def test_lindep(self):
         ftmp = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
         df.outcore.cholesky_eri(mol, ftmp.name, auxmol=auxmol, verbose=7)
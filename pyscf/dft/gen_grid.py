@@ -25,11 +25,13 @@ Reference for Lebedev-Laikov grid:
 '''
 
 
+import math
 import ctypes
 import numpy
 from pyscf import lib
 from pyscf.lib import logger
 from pyscf import gto
+from pyscf.data import elements
 from pyscf.dft import radi
 from pyscf import __config__
 
@@ -232,70 +234,308 @@ def gen_atomic_grids(mol, atom_grid={}, radi_method=radi.gauss_chebyshev,
         symb = mol.atom_symbol(ia)
 
         if symb not in atom_grids_tab:
-            chg = gto.charge(symb)
-            if symb in atom_grid:
-                n_rad, n_ang = atom_grid[symb]
-                if n_ang not in LEBEDEV_NGRID:
-                    if n_ang in LEBEDEV_ORDER:
-                        logger.warn(mol, 'n_ang %d for atom %d %s is not '
-                                    'the supported Lebedev angular grids. '
-                                    'Set n_ang to %d', n_ang, ia, symb,
-                                    LEBEDEV_ORDER[n_ang])
-                        n_ang = LEBEDEV_ORDER[n_ang]
-                    else:
-                        raise ValueError('Unsupported angular grids %d' % n_ang)
+            rad, rad_weight, angs = _atom_radial_angular(
+                mol, ia, atom_grid, radi_method, level, prune, **kwargs)
+            logger.debug(mol, 'atom %s rad-grids = %d, ang-grids = %s',
+                         symb, len(rad), angs)
+            atom_grids_tab[symb] = _make_atom_grids(rad, rad_weight, angs)
+    return atom_grids_tab
+
+def _atom_radial_angular(mol, ia, atom_grid, radi_method, level, prune,
+                         **kwargs):
+    '''Radial grids, radial weights and the number of angular grids of each
+    radial grid for atom ia'''
+    symb = mol.atom_symbol(ia)
+    chg = gto.charge(symb)
+    if symb in atom_grid:
+        n_rad, n_ang = atom_grid[symb]
+        if n_ang not in LEBEDEV_NGRID:
+            if n_ang in LEBEDEV_ORDER:
+                logger.warn(mol, 'n_ang %d for atom %d %s is not '
+                            'the supported Lebedev angular grids. '
+                            'Set n_ang to %d', n_ang, ia, symb,
+                            LEBEDEV_ORDER[n_ang])
+                n_ang = LEBEDEV_ORDER[n_ang]
             else:
-                n_rad = _default_rad(chg, level)
-                n_ang = _default_ang(chg, level)
-            rad, dr = radi_method(n_rad, chg, ia, **kwargs)
+                raise ValueError('Unsupported angular grids %d' % n_ang)
+    else:
+        n_rad = _default_rad(chg, level)
+        n_ang = _default_ang(chg, level)
+    rad, dr = radi_method(n_rad, chg, ia, **kwargs)
 
-            rad_weight = 4*numpy.pi * rad**2 * dr
+    rad_weight = 4*numpy.pi * rad**2 * dr
 
-            if callable(prune):
-                angs = prune(chg, rad, n_ang)
+    if callable(prune):
+        angs = prune(chg, rad, n_ang)
+    else:
+        angs = [n_ang] * n_rad
+    return rad, rad_weight, numpy.array(angs)
+
+def _angular_grid(n):
+    '''Lebedev grids (x, y, z, weight) of n points'''
+    grid = numpy.empty((n,4))
+    libdft.MakeAngularGrid(grid.ctypes.data_as(ctypes.c_void_p),
+                           ctypes.c_int(n))
+    return grid
+
+def _make_atom_grids(rad, rad_weight, angs):
+    '''Meshgrid coordinates (wrt the atom center) and volume of an atom'''
+    coords = []
+    vol = []
+    for n in sorted(set(angs)):
+        grid = _angular_grid(n)
+        idx = numpy.where(angs==n)[0]
+        for i0, i1 in prange(0, len(idx), 12):  # 12 radi-grids as a group
+            coords.append(numpy.einsum('i,jk->jik',rad[idx[i0:i1]],
+                                       grid[:,:3]).reshape(-1,3))
+            vol.append(numpy.einsum('i,j->ji', rad_weight[idx[i0:i1]],
+                                    grid[:,3]).ravel())
+    return numpy.vstack(coords), numpy.hstack(vol)
+
+def slater_atom_density(chg):
+    '''Parameters of the spherical density of a neutral atom built from
+    Slater-type orbitals with exponents given by Slater's rules.
+
+    Returns:
+        A list of (nelec, n_eff, zeta) for each Slater group of orbitals.
+        The density of the atom is
+        sum nelec (2 zeta)^(2n_eff+1)/Gamma(2n_eff+1) r^(2n_eff-2) exp(-2 zeta r) / 4pi
+    '''
+    conf = elements.CONFIGURATION[chg]
+    # (n, l) subshells filled in the order of increasing n for each l
+    groups = {}
+    for l, (nelec, cap) in enumerate(zip(conf, (2, 6, 10, 14))):
+        n = l + 1
+        while nelec > 0:
+            # s and p electrons of the same shell are one Slater group
+            key = (n, max(l-1, 0))
+            groups[key] = groups.get(key, 0) + min(nelec, cap)
+            nelec -= cap
+            n += 1
+    keys = sorted(groups)
+    n_eff_tab = {1: 1., 2: 2., 3: 3., 4: 3.7, 5: 4., 6: 4.2, 7: 4.2}
+
+    params = []
+    for k, (n, kind) in enumerate(keys):
+        nelec = groups[(n, kind)]
+        screen = (nelec - 1) * (.30 if n == 1 else .35)
+        for n1, kind1 in keys[:k]:
+            if kind == 0 and n1 == n - 1:
+                screen += .85 * groups[(n1, kind1)]
             else:
-                angs = [n_ang] * n_rad
-            logger.debug(mol, 'atom %s rad-grids = %d, ang-grids = %s',
-                         symb, n_rad, angs)
-
-            angs = numpy.array(angs)
-            coords = []
-            vol = []
-            for n in sorted(set(angs)):
-                grid = numpy.empty((n,4))
-                libdft.MakeAngularGrid(grid.ctypes.data_as(ctypes.c_void_p),
-                                       ctypes.c_int(n))
-                idx = numpy.where(angs==n)[0]
-                for i0, i1 in prange(0, len(idx), 12):  # 12 radi-grids as a group
-                    coords.append(numpy.einsum('i,jk->jik',rad[idx[i0:i1]],
-                                               grid[:,:3]).reshape(-1,3))
-                    vol.append(numpy.einsum('i,j->ji', rad_weight[idx[i0:i1]],
-                                            grid[:,3]).ravel())
-            atom_grids_tab[symb] = (numpy.vstack(coords), numpy.hstack(vol))
+                screen += groups[(n1, kind1)]
+        zeta = (chg - screen) / n_eff_tab[n]
+        params.append((nelec, n_eff_tab[n], zeta))
+    return params
+
+def _eval_slater_density(params, r, deriv=0):
+    '''Density of the Slater atom at distance r. If deriv=1, the radial
+    derivative of the density is returned as well.'''
+    rho = drho = 0
+    for nelec, n_eff, zeta in params:
+        fac = nelec * (2*zeta)**(2*n_eff+1) / math.gamma(2*n_eff+1) / (4*numpy.pi)
+        rho1 = fac * r**(2*n_eff-2) * numpy.exp(-2*zeta*r)
+        rho = rho + rho1
+        if deriv > 0:
+            # Avoid 0/0 at the nuclei. The derivatives are finite there.
+            drho = drho + rho1 * ((2*n_eff-2) / numpy.maximum(r, 1e-10) - 2*zeta)
+    if deriv > 0:
+        return rho, drho
+    return rho
+
+def _slater_density_radius(params, thresh):
+    '''Distance beyond which the atomic density is smaller than thresh'''
+    rmax = 40.
+    while True:
+        r = numpy.arange(1, int(rmax*10)) * .1
+        rho = _eval_slater_density(params, r)
+        idx = numpy.where(rho > thresh)[0]
+        if len(idx) == 0:
+            return r[0]
+        elif idx[-1] + 1 < len(r):
+            return r[idx[-1]+1]
+        # The density of diffuse atoms (e.g. Cs with a tight threshold) does
+        # not decay to thresh within rmax
+        rmax *= 2
+
+# Error tolerance of the adaptive grids for the integral of rho^{4/3} (rho
+# being the promolecular density) on each radial shell
+ADAPTIVE_TOL = getattr(__config__, 'dft_gen_grid_adaptive_tol', 1e-9)
+
+def gen_adaptive_grids(mol, atom_grid={}, radi_method=radi.gauss_chebyshev,
+                       level=3, prune=nwchem_prune, tol=ADAPTIVE_TOL,
+                       radii_adjust=None, atomic_radii=radi.BRAGG_RADII,
+                       becke_scheme=original_becke, **kwargs):
+    '''Generate atom-specific grids adapted to the environment of each atom.
+
+    The grids of gen_atomic_grids are the upper bound. For each atom and each
+    radial grid, the angular grids are reduced to the smallest Lebedev grids
+    which integrate the model energy densities rho^{4/3} and
+    rho^{4/3} s^2/(1+s^2) (rho being the promolecular density of Slater
+    atoms, see :func:`slater_atom_density`, and s its reduced gradient)
+    times the Becke partition within tol of the upper bound grids. The
+    angular grids are not reduced below the order 4*lmax+1, lmax being the
+    highest angular momentum of the basis of the atom. The outermost radial
+    grids which in total contribute less than tol are removed.
+
+    The grids are designed for LDA and GGA functionals. The energy densities
+    of meta-GGA functionals (e.g. M06) depend on tau through high order
+    polynomials. They converge much slower with the angular grids than any
+    model of the density, and the adaptive grids are not accurate enough
+    for them.
+
+    Returns:
+        A dict, with the atom id for the dict key. The dict values are
+        the same as those of :func:`gen_atomic_grids`.
+    '''
+    if isinstance(atom_grid, (list, tuple)):
+        atom_grid = dict([(mol.atom_symbol(ia), atom_grid)
+                          for ia in range(mol.natm)])
+    atm_coords = mol.atom_coords()
+    atm_dist = gto.inter_distance(mol)
+    gen_grid_partition = _gen_partition_fn(mol, radii_adjust, atomic_radii,
+                                           becke_scheme)
+    chgs = [gto.charge(mol.atom_symbol(ia)) for ia in range(mol.natm)]
+    atm_params = dict([(z, slater_atom_density(z)) for z in set(chgs) if z > 0])
+    atm_rcut = dict([(z, _slater_density_radius(p, tol*1e-3))
+                     for z, p in atm_params.items()])
+
+    ang_grids = dict([(n, _angular_grid(n)) for n in LEBEDEV_NGRID[1:]])
+
+    def shell_integrals(ia, rad, shells, angs):
+        '''Integrals of the partitioned rho^{4/3} and rho^{4/3} s^2/(1+s^2)
+        on the spherical shells of atom ia'''
+        grids = [ang_grids[n] for n in angs]
+        sizes = [len(g) for g in grids]
+        label = numpy.repeat(numpy.arange(len(shells)), sizes)
+        r_label = rad[shells][label]
+        grids = numpy.vstack(grids)
+        coords = r_label[:,None] * grids[:,:3] + atm_coords[ia]
+        rho = numpy.zeros(len(coords))
+        grad = numpy.zeros((len(coords),3))
+        for ja, z in enumerate(chgs):
+            if z == 0:
+                continue
+            # |r - R_ja| >= ||r - R_ia| - |R_ia - R_ja||
+            mask = abs(r_label - atm_dist[ia,ja]) < atm_rcut[z]
+            if numpy.any(mask):
+                dr = coords[mask] - atm_coords[ja]
+                r = numpy.linalg.norm(dr, axis=1)
+                rho1, drho1 = _eval_slater_density(atm_params[z], r, 1)
+                rho[mask] += rho1
+                grad[mask] += dr * (drho1 / numpy.maximum(r, 1e-10))[:,None]
+        rho43 = rho**(4./3)
+        # s^2 = |grad rho|^2 / (4 (3pi^2)^{2/3} rho^{8/3})
+        s2 = numpy.einsum('gx,gx->g', grad, grad)
+        s2 /= 4*(3*numpy.pi**2)**(2./3) * numpy.maximum(rho43**2, 1e-300)
+        f = numpy.array((rho43, rho43 * s2 / (1 + s2)))
+        f *= grids[:,3] * gen_grid_partition(coords, ia)
+        return numpy.array([numpy.bincount(label, weights=x, minlength=len(shells))
+                            for x in f])
+
+    atom_grids_tab = {}
+    for ia in range(mol.natm):
+        rad, rad_weight, angs = _atom_radial_angular(
+            mol, ia, atom_grid, radi_method, level, prune, **kwargs)
+        n_rad = len(rad)
+        shells = numpy.arange(n_rad)
+        ref = shell_integrals(ia, rad, shells, angs)
+
+        # The lower bound of the angular grids integrates exactly the product
+        # of a pair of AOs of the atom and the density of these AOs
+        lmax = max([mol.bas_angular(ib) for ib in mol.atom_shell_ids(ia)] + [0])
+        ang_order = min(k for k in LEBEDEV_ORDER if k >= min(4*lmax+1, 131))
+        lo = numpy.searchsorted(LEBEDEV_NGRID, LEBEDEV_ORDER[ang_order]) - 1
+
+        # Bisect the Lebedev grids (between the lower and upper bounds) for
+        # the smallest grids which reproduce the integrals of the upper bound
+        hi = numpy.searchsorted(LEBEDEV_NGRID, angs)
+        lo = numpy.repeat(max(lo, 0), n_rad)
+        active = hi - lo > 1
+        while numpy.any(active):
+            shells = numpy.where(active)[0]
+            mid = (lo[shells] + hi[shells]) // 2
+            val = shell_integrals(ia, rad, shells, LEBEDEV_NGRID[mid])
+            err = rad_weight[shells] * abs(val - ref[:,shells]).max(axis=0)
+            accept = err < tol
+            hi[shells[accept]] = mid[accept]
+            lo[shells[~accept]] = mid[~accept]
+            active = hi - lo > 1
+        angs = numpy.minimum(angs, LEBEDEV_NGRID[hi])
+
+        # Remove the outermost radial grids
+        idx = numpy.argsort(rad)[::-1]
+        tail = numpy.cumsum(abs(rad_weight * ref).max(axis=0)[idx])
+        keep = numpy.sort(idx[tail >= tol])
+        rad, rad_weight, angs = rad[keep], rad_weight[keep], angs[keep]
+        logger.debug(mol, 'atom %d %s rad-grids = %d (of %d), ang-grids = %s',
+                     ia, mol.atom_symbol(ia), len(rad), n_rad, angs)
+        if len(rad) == 0:  # e.g. ghost atoms far from the molecule
+            atom_grids_tab[ia] = (numpy.zeros((0,3)), numpy.zeros(0))
+        else:
+            atom_grids_tab[ia] = _make_atom_grids(rad, rad_weight, angs)
     return atom_grids_tab
 
 
+# Atoms whose Becke cell function (against the nearest atom) is smaller than
+# this value are excluded from the partition of a grid.
+PARTITION_CUTOFF = getattr(__config__, 'dft_gen_grid_partition_cutoff', 1e-15)
+
 def get_partition(mol, atom_grids_tab,
                   radii_adjust=None, atomic_radii=radi.BRAGG_RADII,
-                  becke_scheme=original_becke, concat=True):
+                  becke_scheme=original_becke, concat=True,
+                  cutoff=PARTITION_CUTOFF):
     '''Generate the mesh grid coordinates and weights for DFT numerical integration.
     We can change radii_adjust, becke_scheme functions to generate different meshgrid.
 
+    The partition of original_becke and stratmann schemes (with the default
+    radii_adjust functions) are computed in C with OpenMP. Distant atoms are
+    screened for each grid (see PARTITION_CUTOFF). Other functions are
+    evaluated with numpy.
+
     Kwargs:
         concat: bool
             Whether to concatenate grids and weights in return
+        cutoff: float
+            Screening threshold of the atomic cell functions. 0 disables the
+            screening (except for the exact zeros of the Stratmann scheme).
 
     Returns:
         grid_coord and grid_weight arrays.  grid_coord array has shape (N,3);
         weight 1D array has N elements.
     '''
+    gen_grid_partition = _gen_partition_fn(mol, radii_adjust, atomic_radii,
+                                           becke_scheme, cutoff)
+    atm_coords = numpy.asarray(mol.atom_coords() , order='C')
+    coords_all = []
+    weights_all = []
+    for ia in range(mol.natm):
+        if ia in atom_grids_tab:  # atom-specific grids
+            coords, vol = atom_grids_tab[ia]
+        else:
+            coords, vol = atom_grids_tab[mol.atom_symbol(ia)]
+        coords = coords + atm_coords[ia]
+        weights = vol * gen_grid_partition(coords, ia)
+        coords_all.append(coords)
+        weights_all.append(weights)
+
+    if concat:
+        coords_all = numpy.vstack(coords_all)
+        weights_all = numpy.hstack(weights_all)
+    return coords_all, weights_all
+gen_partition = get_partition
+
+def _gen_partition_fn(mol, radii_adjust=None, atomic_radii=radi.BRAGG_RADII,
+                      becke_scheme=original_becke, cutoff=PARTITION_CUTOFF):
+    '''Function(coords, atom_id) to compute the Becke partition weights of
+    atom_id on the given coordinates'''
     if callable(radii_adjust) and atomic_radii is not None:
         f_radii_adjust = radii_adjust(mol, atomic_radii)
     else:
         f_radii_adjust = None
     atm_coords = numpy.asarray(mol.atom_coords() , order='C')
     atm_dist = gto.inter_distance(mol)
-    if (becke_scheme is original_becke and
+    if ((becke_scheme is original_becke or becke_scheme is stratmann) and
         (radii_adjust is radi.treutler_atomic_radii_adjust or
          radii_adjust is radi.becke_atomic_radii_adjust or
          f_radii_adjust is None)):
@@ -306,24 +546,27 @@ def get_partition(mol, atom_grids_tab,
                                            for i in range(mol.natm)
                                            for j in range(mol.natm)])
             p_radii_table = f_radii_table.ctypes.data_as(ctypes.c_void_p)
+        scheme = 0 if becke_scheme is original_becke else 1
 
-        def gen_grid_partition(coords):
+        def gen_grid_partition(coords, ia):
             coords = numpy.asarray(coords, order='F')
             ngrids = coords.shape[0]
-            pbecke = numpy.empty((mol.natm,ngrids))
-            libdft.VXCgen_grid(pbecke.ctypes.data_as(ctypes.c_void_p),
-                               coords.ctypes.data_as(ctypes.c_void_p),
-                               atm_coords.ctypes.data_as(ctypes.c_void_p),
-                               p_radii_table,
-                               ctypes.c_int(mol.natm), ctypes.c_int(ngrids))
-            return pbecke
+            w = numpy.empty(ngrids)
+            libdft.VXCgen_grid_partition(w.ctypes.data_as(ctypes.c_void_p),
+                                         coords.ctypes.data_as(ctypes.c_void_p),
+                                         atm_coords.ctypes.data_as(ctypes.c_void_p),
+                                         p_radii_table,
+                                         ctypes.c_int(mol.natm), ctypes.c_int(ngrids),
+                                         ctypes.c_int(ia), ctypes.c_int(scheme),
+                                         ctypes.c_double(cutoff))
+            return w
     else:
-        def gen_grid_partition(coords):
+        def gen_grid_partition(coords, ia):
             ngrids = coords.shape[0]
             grid_dist = numpy.empty((mol.natm,ngrids))
-            for ia in range(mol.natm):
-                dc = coords - atm_coords[ia]
-                grid_dist[ia] = numpy.sqrt(numpy.einsum('ij,ij->i',dc,dc))
+            for k in range(mol.natm):
+                dc = coords - atm_coords[k]
+                grid_dist[k] = numpy.sqrt(numpy.einsum('ij,ij->i',dc,dc))
             pbecke = numpy.ones((mol.natm,ngrids))
             for i in range(mol.natm):
                 for j in range(i):
@@ -333,23 +576,34 @@ def get_partition(mol, atom_grids_tab,
                     g = becke_scheme(g)
                     pbecke[i] *= .5 * (1-g)
                     pbecke[j] *= .5 * (1+g)
-            return pbecke
+            return pbecke[ia] * (1./pbecke.sum(axis=0))
 
-    coords_all = []
-    weights_all = []
-    for ia in range(mol.natm):
-        coords, vol = atom_grids_tab[mol.atom_symbol(ia)]
-        coords = coords + atm_coords[ia]
-        pbecke = gen_grid_partition(coords)
-        weights = vol * pbecke[ia] * (1./pbecke.sum(axis=0))
-        coords_all.append(coords)
-        weights_all.append(weights)
+    return gen_grid_partition
 
-    if concat:
-        coords_all = numpy.vstack(coords_all)
-        weights_all = numpy.hstack(weights_all)
-    return coords_all, weights_all
-gen_partition = get_partition
+GROUP_BOX_SIZE = getattr(__config__, 'dft_gen_grid_GROUP_BOX_SIZE', 1.2)
+def arg_group_grids(mol, coords, box_size=GROUP_BOX_SIZE):
+    '''Partition the space into cubic boxes (edge length box_size in Bohr)
+    and group the grids against these boxes. The boxes are ordered along the
+    Morton (Z-order) space filling curve so that neighbouring blocks of grids
+    are spatially close as well.
+
+    Returns:
+        An index array to reorder the grids.
+    '''
+    coords = numpy.asarray(coords)
+    if coords.shape[0] == 0:
+        return numpy.zeros(0, dtype=int)
+    lower = coords.min(axis=0)
+    box_ids = numpy.floor((coords - lower) * (1./box_size)).astype(numpy.int64)
+    nbits = max(int(box_ids.max()).bit_length(), 1)
+    # Interleave the bits of the box indices in x, y, z
+    morton = numpy.zeros(len(coords), dtype=numpy.int64)
+    for b in range(min(nbits, 21)):
+        for k in range(3):
+            morton |= ((box_ids[:,k] >> b) & 1) << (3*b + k)
+    logger.debug1(mol, 'Group grids in boxes of size %g, %d boxes', box_size,
+                  numpy.unique(morton).size)
+    return numpy.argsort(morton, kind='mergesort')
 
 def make_mask(mol, coords, relativity=0, shls_slice=None, verbose=None):
     '''Mask to indicate whether a shell is zero on grid
@@ -441,11 +695,32 @@ class Grids(lib.StreamObject):
         symmetry : bool
             whether to symmetrize mesh grids (TODO)
 
+        weight_threshold : float
+            Grids with the absolute value of weights smaller than this value
+            are removed after the partition. Default is 0 (all grids are kept).
+
+        sort_grids : bool
+            Whether to reorder the grids after the partition so that each
+            block of BLKSIZE grids is a compact box in space (see
+            :func:`arg_group_grids`). This reduces the number of significant
+            shells in non0tab for large molecules. Default is False.
+
         atom_grid : dict
             Set (radial, angular) grids for particular atoms.
             Eg, grids.atom_grid = {'H': (20,110)} will generate 20 radial
             grids and 110 angular grids for H atom.
 
+        adaptive : bool
+            Whether to reduce the grids of each atom according to the
+            integration error of the promolecular density (see
+            :func:`gen_adaptive_grids`). The grids given by level, atom_grid
+            and prune are the upper bound. Default is False.
+
+        adaptive_tol : float
+            Error tolerance of the adaptive grids for the integral of
+            rho^{4/3} (rho being the promolecular density) on each radial
+            shell.
+
         Examples:
 
         >>> mol = gto.M(atom='H 0 0 0; H 0 0 1.1')
@@ -497,11 +772,18 @@ class Grids(lib.StreamObject):
         self.prune = _load_conf(None, 'dft_gen_grid_Grids_prune', nwchem_prune)
 
         self.level = getattr(__config__, 'dft_gen_grid_Grids_level', 3)
+        self.weight_threshold = getattr(__config__, 'dft_gen_grid_Grids_weight_threshold', 0)
+        self.sort_grids = getattr(__config__, 'dft_gen_grid_Grids_sort_grids', False)
+        self.adaptive = getattr(__config__, 'dft_gen_grid_Grids_adaptive', False)
+        self.adaptive_tol = ADAPTIVE_TOL
 
 ##################################################
 # don't modify the following attributes, they are not input options
         self.coords  = None
         self.weights = None
+        # Atomic grids only depend on the element and the grids settings.
+        # They are kept when the geometry changes (see reset()).
+        self._atom_grids_cache = {}
         self._keys = set(self.__dict__.keys())
 
     @property
@@ -510,7 +792,8 @@ class Grids(lib.StreamObject):
 
     def __setattr__(self, key, val):
         if key in ('atom_grid', 'atomic_radii', 'radii_adjust', 'radi_method',
-                   'becke_scheme', 'prune', 'level'):
+                   'becke_scheme', 'prune', 'level', 'weight_threshold',
+                   'sort_grids', 'adaptive', 'adaptive_tol'):
             self.reset()
         super(Grids, self).__setattr__(key, val)
 
@@ -519,7 +802,12 @@ class Grids(lib.StreamObject):
         logger.info(self, 'becke partition: %s', self.becke_scheme.__doc__)
         logger.info(self, 'pruning grids: %s', self.prune)
         logger.info(self, 'grids dens level: %d', self.level)
+        if self.adaptive:
+            logger.info(self, 'adaptive atomic grids, tol = %g', self.adaptive_tol)
         logger.info(self, 'symmetrized grids: %s', self.symmetry)
+        if self.weight_threshold > 0:
+            logger.info(self, 'remove grids of weights < %g', self.weight_threshold)
+        logger.info(self, 'sort grids spatially: %s', self.sort_grids)
         if self.radii_adjust is not None:
             logger.info(self, 'atomic radii adjust function: %s',
                         self.radii_adjust)
@@ -528,17 +816,31 @@ class Grids(lib.StreamObject):
             logger.info(self, 'User specified grid scheme %s', str(self.atom_grid))
         return self
 
+    @logger.profile('grids')
     def build(self, mol=None, with_non0tab=False, **kwargs):
         if mol is None: mol = self.mol
         if self.verbose >= logger.WARN:
             self.check_sanity()
-        atom_grids_tab = self.gen_atomic_grids(mol, self.atom_grid,
-                                               self.radi_method,
-                                               self.level, self.prune, **kwargs)
+        if self.adaptive:
+            atom_grids_tab = self.gen_adaptive_grids(mol, **kwargs)
+        else:
+            atom_grids_tab = self.gen_atomic_grids(mol, self.atom_grid,
+                                                   self.radi_method,
+                                                   self.level, self.prune, **kwargs)
         self.coords, self.weights = \
                 self.get_partition(mol, atom_grids_tab,
                                    self.radii_adjust, self.atomic_radii,
                                    self.becke_scheme)
+        if self.weight_threshold > 0:
+            mask = abs(self.weights) >= self.weight_threshold
+            logger.debug(self, 'Remove %d grids of small weights',
+                         self.weights.size - numpy.count_nonzero(mask))
+            self.coords = self.coords[mask]
+            self.weights = self.weights[mask]
+        if self.sort_grids:
+            idx = arg_group_grids(mol, self.coords)
+            self.coords = self.coords[idx]
+            self.weights = self.weights[idx]
         if with_non0tab:
             self.non0tab = self.make_mask(mol, self.coords)
         else:
@@ -566,16 +868,46 @@ class Grids(lib.StreamObject):
         if radi_method is None: radi_method = self.radi_method
         if level is None: level = self.level
         if prune is None: prune = self.prune
-        return gen_atomic_grids(mol, atom_grid, self.radi_method, level, prune, **kwargs)
+        if kwargs:
+            return gen_atomic_grids(mol, atom_grid, self.radi_method, level,
+                                    prune, **kwargs)
+
+        def cache_key(symb):
+            if isinstance(atom_grid, (list, tuple)):
+                grid_spec = tuple(atom_grid)
+            else:
+                grid_spec = atom_grid.get(symb)
+            return (symb, str(grid_spec), level, self.radi_method, prune)
+
+        cache = self._atom_grids_cache
+        symbs = set(mol.atom_symbol(ia) for ia in range(mol.natm))
+        if any(cache_key(symb) not in cache for symb in symbs):
+            atom_grids_tab = gen_atomic_grids(mol, atom_grid, self.radi_method,
+                                              level, prune)
+            for symb, grids in atom_grids_tab.items():
+                cache[cache_key(symb)] = grids
+        else:
+            logger.debug(self, 'Reuse atomic grids of %s', list(symbs))
+        return dict([(symb, cache[cache_key(symb)]) for symb in symbs])
+
+    @lib.with_doc(gen_adaptive_grids.__doc__)
+    def gen_adaptive_grids(self, mol=None, tol=None, **kwargs):
+        if mol is None: mol = self.mol
+        if tol is None: tol = self.adaptive_tol
+        return gen_adaptive_grids(mol, self.atom_grid, self.radi_method,
+                                  self.level, self.prune, tol,
+                                  self.radii_adjust, self.atomic_radii,
+                                  self.becke_scheme, **kwargs)
 
     @lib.with_doc(get_partition.__doc__)
     def get_partition(self, mol, atom_grids_tab=None,
                       radii_adjust=None, atomic_radii=radi.BRAGG_RADII,
-                      becke_scheme=original_becke, concat=True):
+                      becke_scheme=original_becke, concat=True,
+                      cutoff=PARTITION_CUTOFF):
         if atom_grids_tab is None:
             atom_grids_tab = self.gen_atomic_grids(mol)
         return get_partition(mol, atom_grids_tab, radii_adjust, atomic_radii,
-                             becke_scheme, concat=concat)
+                             becke_scheme, concat=concat, cutoff=cutoff)
 
     gen_partition = get_partition
 
@@ -18,8 +18,12 @@
 
 import warnings
 import ctypes
+import hashlib
+import tempfile
+import collections
 import numpy
 from pyscf import lib
+from pyscf.lib import logger
 from pyscf.dft.sap import sap_effective_charge
 try:
     from pyscf.dft import libxc
@@ -325,7 +329,13 @@ def eval_rho2(mol, ao, mo_coeff, mo_occ, non0tab=None, xctype='LDA',
             rho[5] -= rho5 * .5
     return rho
 
-def _vv10nlc(rho,coords,vvrho,vvweight,vvcoords,nlc_pars):
+def _vv10nlc(rho,coords,vvrho,vvweight,vvcoords,nlc_pars,cutoff=None):
+    '''VV10 nonlocal correlation energy density and potential.
+
+    If cutoff (in Bohr) is given, the kernel is evaluated for the pairs of
+    grids within the cutoff distance only, using a cell list of vvcoords.
+    Otherwise all pairs are summed.
+    '''
     thresh=1e-8
 
     #output
@@ -393,18 +403,22 @@ def _vv10nlc(rho,coords,vvrho,vvweight,vvcoords,nlc_pars):
     #    U=numpy.sum(T)
     #    W=numpy.sum(T*R2)
     #    F*=-1.5
-    libdft.VXC_vv10nlc(F.ctypes.data_as(ctypes.c_void_p),
-                       U.ctypes.data_as(ctypes.c_void_p),
-                       W.ctypes.data_as(ctypes.c_void_p),
-                       vvcoords.ctypes.data_as(ctypes.c_void_p),
-                       coords.ctypes.data_as(ctypes.c_void_p),
-                       W0p.ctypes.data_as(ctypes.c_void_p),
-                       W0.ctypes.data_as(ctypes.c_void_p),
-                       K.ctypes.data_as(ctypes.c_void_p),
-                       Kp.ctypes.data_as(ctypes.c_void_p),
-                       RpW.ctypes.data_as(ctypes.c_void_p),
-                       ctypes.c_int(vvcoords.shape[0]),
-                       ctypes.c_int(coords.shape[0]))
+    args = (F.ctypes.data_as(ctypes.c_void_p),
+            U.ctypes.data_as(ctypes.c_void_p),
+            W.ctypes.data_as(ctypes.c_void_p),
+            vvcoords.ctypes.data_as(ctypes.c_void_p),
+            coords.ctypes.data_as(ctypes.c_void_p),
+            W0p.ctypes.data_as(ctypes.c_void_p),
+            W0.ctypes.data_as(ctypes.c_void_p),
+            K.ctypes.data_as(ctypes.c_void_p),
+            Kp.ctypes.data_as(ctypes.c_void_p),
+            RpW.ctypes.data_as(ctypes.c_void_p),
+            ctypes.c_int(vvcoords.shape[0]),
+            ctypes.c_int(coords.shape[0]))
+    if cutoff is None:
+        libdft.VXC_vv10nlc(*args)
+    else:
+        libdft.VXC_vv10nlc_cutoff(*(args + (ctypes.c_double(cutoff),)))
     #exc is multiplied by Rho later
     exc[threshind] = Beta+0.5*F
     vxc[0,threshind] = Beta+F+1.5*(U*dKdR+W*dW0dR)
@@ -547,14 +561,20 @@ def eval_mat(mol, ao, weight, rho, vxc,
 def _dot_ao_ao(mol, ao1, ao2, non0tab, shls_slice, ao_loc, hermi=0):
     '''return numpy.dot(ao1.T, ao2)'''
     ngrids, nao = ao1.shape
+    if ao1.dtype == numpy.float32:
+        ao2 = numpy.asarray(ao2, dtype=numpy.float32)
     if nao < SWITCH_SIZE:
+        if ao1.dtype == numpy.float32:
+            return numpy.dot(ao1.T, ao2)
         return lib.dot(ao1.T.conj(), ao2)
 
     if not ao1.flags.f_contiguous:
         ao1 = lib.transpose(ao1)
     if not ao2.flags.f_contiguous:
         ao2 = lib.transpose(ao2)
-    if ao1.dtype == ao2.dtype == numpy.double:
+    if ao1.dtype == numpy.float32:
+        fn = libdft.VXCsdot_ao_ao
+    elif ao1.dtype == ao2.dtype == numpy.double:
         fn = libdft.VXCdot_ao_ao
     else:
         fn = libdft.VXCzdot_ao_ao
@@ -580,12 +600,18 @@ def _dot_ao_ao(mol, ao1, ao2, non0tab, shls_slice, ao_loc, hermi=0):
 def _dot_ao_dm(mol, ao, dm, non0tab, shls_slice, ao_loc, out=None):
     '''return numpy.dot(ao, dm)'''
     ngrids, nao = ao.shape
+    if ao.dtype == numpy.float32:
+        dm = numpy.asarray(dm, dtype=numpy.float32)
     if nao < SWITCH_SIZE:
+        if ao.dtype == numpy.float32:
+            return numpy.dot(ao, dm)
         return lib.dot(dm.T, ao.T).T
 
     if not ao.flags.f_contiguous:
         ao = lib.transpose(ao)
-    if ao.dtype == dm.dtype == numpy.double:
+    if ao.dtype == numpy.float32:
+        fn = libdft.VXCsdot_ao_dm
+    elif ao.dtype == dm.dtype == numpy.double:
         fn = libdft.VXCdot_ao_dm
     else:
         fn = libdft.VXCzdot_ao_dm
@@ -622,7 +648,9 @@ def _scale_ao(ao, wv, out=None):
     comp, nao, ngrids = ao.shape
     aow = numpy.ndarray((nao,ngrids), dtype=ao.dtype, buffer=out).T
 
-    if not ao.flags.c_contiguous:
+    if aow.dtype == numpy.float32:
+        aow = numpy.einsum('nip,np->pi', ao, wv.astype(numpy.float32))
+    elif not ao.flags.c_contiguous:
         aow = numpy.einsum('nip,np->pi', ao, wv)
     elif aow.dtype == numpy.double:
         libdft.VXC_dscale_ao(aow.ctypes.data_as(ctypes.c_void_p),
@@ -648,7 +676,10 @@ def _contract_rho(bra, ket):
     nao, ngrids = bra.shape
     rho = numpy.empty(ngrids)
 
-    if not (bra.flags.c_contiguous and ket.flags.c_contiguous):
+    if bra.dtype == numpy.float32 and ket.dtype == numpy.float32:
+        # Contract in float32, return the density in float64 for eval_xc
+        rho[:] = numpy.einsum('ip,ip->p', bra, ket)
+    elif not (bra.flags.c_contiguous and ket.flags.c_contiguous):
         rho  = numpy.einsum('ip,ip->p', bra.real, ket.real)
         rho += numpy.einsum('ip,ip->p', bra.imag, ket.imag)
     elif bra.dtype == numpy.double and ket.dtype == numpy.double:
@@ -893,12 +924,17 @@ def nr_rks(ni, mol, grids, xc_code, dms, relativity=0, hermi=0,
             vvweight=numpy.concatenate((vvweight,weighttmp),axis=1)
             vvcoords=numpy.concatenate((vvcoords,coordstmp),axis=1)
             rhotmp = weighttmp = coordstmp = None
+        vv10_cutoff = getattr(ni, 'vv10_cutoff', None)
+        p1 = 0
         for ao, mask, weight, coords \
                 in ni.block_loop(mol, grids, nao, ao_deriv, max_memory):
             aow = numpy.ndarray(ao[0].shape, order='F', buffer=aow)
+            p0, p1 = p1, p1 + weight.size
             for idm in range(nset):
-                rho = make_rho(idm, ao, mask, 'GGA')
-                exc, vxc = _vv10nlc(rho,coords,vvrho[idm],vvweight[idm],vvcoords[idm],nlc_pars)
+                # The densities were computed in the first loop
+                rho = vvrho[idm][:,p0:p1]
+                exc, vxc = _vv10nlc(rho,coords,vvrho[idm],vvweight[idm],vvcoords[idm],nlc_pars,
+                                    vv10_cutoff)
                 den = rho[0] * weight
                 nelec[idm] += den.sum()
                 excsum[idm] += numpy.dot(den, exc)
@@ -1131,6 +1167,89 @@ def _format_uks_dm(dms):
 nr_rks_vxc = nr_rks
 nr_uks_vxc = nr_uks
 
+def _dms_for_batch(dms, hermi):
+    '''Density matrices as a (nset,nao,nao) real array for the batched
+    contraction in nr_rks_fxc and nr_uks_fxc. None if the batched code does
+    not apply.'''
+    if getattr(dms, 'mo_coeff', None) is not None:
+        return None
+    dms = numpy.asarray(dms)
+    if dms.ndim != 3 or dms.shape[0] < 2 or dms.dtype != numpy.double:
+        return None
+    if not hermi:
+        # For the GGA densities, see eval_rho
+        dms = (dms + dms.transpose(0,2,1)) * .5
+    return dms
+
+def _fxc_batches(ao, mask, ao_loc, dms_lst, max_memory=2000):
+    '''Restrict ao and the density matrices to the AOs which are significant
+    on the block of grids (according to mask), and split the density
+    matrices into batches.
+
+    Yields:
+        idx (None if all AOs are significant), ao, list of the batch of each
+        density matrices in dms_lst, and the range of the batch.
+    '''
+    ngrids = ao.shape[-2]
+    nbas = len(ao_loc) - 1
+    nao = ao_loc[-1]
+    nset = dms_lst[0].shape[0]
+    nblk = (ngrids+BLKSIZE-1) // BLKSIZE
+    shl_mask = numpy.asarray(mask[:nblk,:nbas]).any(axis=0)
+    idx = numpy.repeat(shl_mask, ao_loc[1:] - ao_loc[:-1]).nonzero()[0]
+    if idx.size == nao:
+        idx = None
+    else:
+        ao = ao[...,idx]
+        dms_lst = [dms[:,idx[:,None],idx] for dms in dms_lst]
+        nao = idx.size
+    if nao == 0:
+        return
+
+    # c0 and aow of _rho1_batch and _dot_ao_wv_batch for each density matrix
+    nbatch = int(max_memory*.5e6/8 / (2*ngrids*nao))
+    nbatch = max(1, min(nbatch, nset))
+    for i0, i1 in lib.prange(0, nset, nbatch):
+        yield idx, ao, [dms[i0:i1] for dms in dms_lst], i0, i1
+
+def _rho1_batch(ao, dms, xctype):
+    '''Densities of a batch of (hermitian) density matrices.  For each n, it
+    is the same as eval_rho(mol, ao, dms[n], xctype=xctype, hermi=1).'''
+    nset, nao = dms.shape[:2]
+    if xctype == 'LDA':
+        ao = ao.reshape(1,-1,nao)
+    else:
+        ao = ao[:4]
+    comp, ngrids = ao.shape[:2]
+    c0 = lib.dot(ao[0], dms.transpose(1,0,2).reshape(nao,nset*nao))
+    #:rho1 = numpy.einsum('xpi,pni->nxp', ao, c0.reshape(ngrids,nset,nao))
+    rho1 = numpy.matmul(c0.reshape(ngrids,nset,nao), ao.transpose(1,2,0))
+    rho1 = rho1.transpose(1,2,0)
+    if xctype == 'LDA':
+        return rho1[:,0]
+    rho1[:,1:] *= 2  # *2 for +c.c.
+    return rho1
+
+def _dot_ao_wv_batch(ao, wv, xctype):
+    '''For each n, vmat[n] = _dot_ao_ao(_scale_ao(ao, wv[n]), ao[0])'''
+    if xctype == 'LDA':
+        ao = ao.reshape(1,-1,ao.shape[-1])
+        wv = wv.reshape(wv.shape[0],1,-1)
+    else:
+        ao = ao[:4]
+    comp, ngrids, nao = ao.shape
+    nset = wv.shape[0]
+    #:aow = numpy.einsum('nxp,xpi->pni', wv, ao)
+    aow = numpy.matmul(wv.transpose(2,0,1), ao.transpose(1,0,2))
+    vmat = lib.dot(ao[0].T, aow.reshape(ngrids,nset*nao))
+    return vmat.reshape(nao,nset,nao).transpose(1,2,0)
+
+def _add_vmat_batch(vmat, idx, v):
+    if idx is None:
+        vmat += v
+    else:
+        vmat[:,idx[:,None],idx] += v
+
 def nr_rks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
                rho0=None, vxc=None, fxc=None, max_memory=2000, verbose=None):
     '''Contract RKS XC (singlet hessian) kernel matrix with given density matrices
@@ -1176,6 +1295,8 @@ def nr_rks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
     if ((xctype == 'LDA' and fxc is None) or
         (xctype == 'GGA' and rho0 is None)):
         make_rho0 = ni._gen_rho_evaluator(mol, dm0, 1)[0]
+    # Contract multiple density matrices with stacked GEMMs
+    dms_batch = _dms_for_batch(dms, hermi)
 
     shls_slice = (0, mol.nbas)
     ao_loc = mol.ao_loc_nr()
@@ -1201,6 +1322,15 @@ def nr_rks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
                 frr = fxc[0][ip:ip+ngrid]
                 ip += ngrid
 
+            if dms_batch is not None:
+                for idx, ao_s, (dm_s,), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dms_batch], max_memory):
+                    rho1 = _rho1_batch(ao_s, dm_s, 'LDA')
+                    v = _dot_ao_wv_batch(ao_s, weight*frr*rho1, 'LDA')
+                    _add_vmat_batch(vmat[i0:i1], idx, v)
+                    rho1 = v = None
+                continue
+
             for i in range(nset):
                 rho1 = make_rho(i, ao, mask, 'LDA')
                 #:aow = numpy.einsum('pi,p->pi', ao, weight*frr*rho1, out=aow)
@@ -1228,6 +1358,16 @@ def nr_rks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
                 fxc0 = (fxc[0][ip:ip+ngrid], fxc[1][ip:ip+ngrid], fxc[2][ip:ip+ngrid])
                 ip += ngrid
 
+            if dms_batch is not None:
+                for idx, ao_s, (dm_s,), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dms_batch], max_memory):
+                    rho1 = _rho1_batch(ao_s, dm_s, 'GGA')
+                    wv = [_rks_gga_wv1(rho, r1, vxc0, fxc0, weight) for r1 in rho1]
+                    v = _dot_ao_wv_batch(ao_s, numpy.asarray(wv), 'GGA')
+                    _add_vmat_batch(vmat[i0:i1], idx, v)
+                    rho1 = wv = v = None
+                continue
+
             for i in range(nset):
                 rho1 = make_rho(i, ao, mask, 'GGA')
                 wv = _rks_gga_wv1(rho, rho1, vxc0, fxc0, weight)
@@ -1263,6 +1403,7 @@ def nr_rks_fxc_st(ni, mol, grids, xc_code, dm0, dms_alpha, relativity=0, singlet
     if ((xctype == 'LDA' and fxc is None) or
         (xctype == 'GGA' and rho0 is None)):
         make_rho0 = ni._gen_rho_evaluator(mol, dm0, hermi=1)[0]
+    dms_batch = _dms_for_batch(dms_alpha, 0)
 
     shls_slice = (0, mol.nbas)
     ao_loc = mol.ao_loc_nr()
@@ -1295,6 +1436,15 @@ def nr_rks_fxc_st(ni, mol, grids, xc_code, dm0, dms_alpha, relativity=0, singlet
             else:
                 frho = u_u - u_d
 
+            if dms_batch is not None:
+                for idx, ao_s, (dm_s,), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dms_batch], max_memory):
+                    rho1 = _rho1_batch(ao_s, dm_s, 'LDA')
+                    v = _dot_ao_wv_batch(ao_s, weight*frho*rho1, 'LDA')
+                    _add_vmat_batch(vmat[i0:i1], idx, v)
+                    rho1 = v = None
+                continue
+
             for i in range(nset):
                 rho1 = make_rho(i, ao, mask, 'LDA')
                 #:aow = numpy.einsum('pi,p->pi', ao, weight*frho*rho1, out=aow)
@@ -1341,6 +1491,17 @@ def nr_rks_fxc_st(ni, mol, grids, xc_code, dm0, dms_alpha, relativity=0, singlet
                 fgg = uu_uu - uu_dd
                 frhogamma = u_uu - u_dd
 
+            if dms_batch is not None:
+                for idx, ao_s, (dm_s,), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dms_batch], max_memory):
+                    rho1 = _rho1_batch(ao_s, dm_s, 'GGA')
+                    wv = [_rks_gga_wv1(rho, r1, (None,fgamma), (frho,frhogamma,fgg), weight)
+                          for r1 in rho1]
+                    v = _dot_ao_wv_batch(ao_s, numpy.asarray(wv), 'GGA')
+                    _add_vmat_batch(vmat[i0:i1], idx, v)
+                    rho1 = wv = v = None
+                continue
+
             for i in range(nset):
                 # rho1[0 ] = |b><j| z_{bj}
                 # rho1[1:] = \nabla(|b><j|) z_{bj}
@@ -1460,6 +1621,11 @@ def nr_uks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
     if ((xctype == 'LDA' and fxc is None) or
         (xctype == 'GGA' and rho0 is None)):
         make_rho0 = ni._gen_rho_evaluator(mol, _format_uks_dm(dm0), 1)[0]
+    # Contract multiple density matrices with stacked GEMMs
+    dma_batch = _dms_for_batch(dma, hermi)
+    dmb_batch = _dms_for_batch(dmb, hermi)
+    if dma_batch is None or dmb_batch is None:
+        dma_batch = dmb_batch = None
 
     shls_slice = (0, mol.nbas)
     ao_loc = mol.ao_loc_nr()
@@ -1484,6 +1650,20 @@ def nr_uks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
                 u_u, u_d, d_d = fxc[0][ip:ip+ngrid].T
                 ip += ngrid
 
+            if dma_batch is not None:
+                for idx, ao_s, (dma_s, dmb_s), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dma_batch, dmb_batch], max_memory):
+                    rho1a = _rho1_batch(ao_s, dma_s, xctype)
+                    rho1b = _rho1_batch(ao_s, dmb_s, xctype)
+                    wv = (u_u * rho1a + u_d * rho1b) * weight
+                    _add_vmat_batch(vmat[0,i0:i1], idx,
+                                    _dot_ao_wv_batch(ao_s, wv, xctype))
+                    wv = (u_d * rho1a + d_d * rho1b) * weight
+                    _add_vmat_batch(vmat[1,i0:i1], idx,
+                                    _dot_ao_wv_batch(ao_s, wv, xctype))
+                    rho1a = rho1b = wv = None
+                continue
+
             for i in range(nset):
                 rho1a = make_rhoa(i, ao, mask, xctype)
                 rho1b = make_rhob(i, ao, mask, xctype)
@@ -1520,6 +1700,21 @@ def nr_uks_fxc(ni, mol, grids, xc_code, dm0, dms, relativity=0, hermi=0,
                 fxc0 = (fxc[0][ip:ip+ngrid], fxc[1][ip:ip+ngrid], fxc[2][ip:ip+ngrid])
                 ip += ngrid
 
+            if dma_batch is not None:
+                for idx, ao_s, (dma_s, dmb_s), i0, i1 in _fxc_batches(
+                        ao, mask, ao_loc, [dma_batch, dmb_batch], max_memory):
+                    rho1a = _rho1_batch(ao_s, dma_s, xctype)
+                    rho1b = _rho1_batch(ao_s, dmb_s, xctype)
+                    wv = [_uks_gga_wv1((rho0a,rho0b), r1, vxc0, fxc0, weight)
+                          for r1 in zip(rho1a, rho1b)]
+                    wva, wvb = numpy.asarray(wv).transpose(1,0,2,3)
+                    _add_vmat_batch(vmat[0,i0:i1], idx,
+                                    _dot_ao_wv_batch(ao_s, wva, xctype))
+                    _add_vmat_batch(vmat[1,i0:i1], idx,
+                                    _dot_ao_wv_batch(ao_s, wvb, xctype))
+                    rho1a = rho1b = wv = wva = wvb = None
+                continue
+
             for i in range(nset):
                 rho1a = make_rhoa(i, ao, mask, xctype)
                 rho1b = make_rhob(i, ao, mask, xctype)
@@ -1875,6 +2070,12 @@ def cache_xc_kernel(ni, mol, grids, xc_code, mo_coeff, mo_occ, spin=0,
                     max_memory=2000):
     '''Compute the 0th order density, Vxc and fxc.  They can be used in TDDFT,
     DFT hessian module etc.
+
+    The kernel is evaluated block by block following ni.block_loop. When the
+    kernel does not fit in max_memory (or NumInt.xc_kernel_on_disk is set),
+    rho, vxc and fxc are stored in memory-mapped arrays in lib.param.TMPDIR.
+    nr_rks_fxc and nr_uks_fxc only read the slices of the grids they are
+    processing.
     '''
     xctype = ni._xc_type(xc_code)
     ao_deriv = 0
@@ -1885,24 +2086,83 @@ def cache_xc_kernel(ni, mol, grids, xc_code, mo_coeff, mo_occ, spin=0,
     elif xctype == 'MGGA':
         raise NotImplementedError('meta-GGA')
 
+    if grids.coords is None:
+        grids.build(with_non0tab=True)
+    ngrids = grids.weights.size
     if spin == 0:
         nao = mo_coeff.shape[0]
-        rho = []
-        for ao, mask, weight, coords \
-                in ni.block_loop(mol, grids, nao, ao_deriv, max_memory=max_memory):
-            rho.append(ni.eval_rho2(mol, ao, mo_coeff, mo_occ, mask, xctype))
-        rho = numpy.hstack(rho)
     else:
         nao = mo_coeff[0].shape[0]
-        rhoa = []
-        rhob = []
-        for ao, mask, weight, coords \
-                in ni.block_loop(mol, grids, nao, ao_deriv, max_memory):
-            rhoa.append(ni.eval_rho2(mol, ao, mo_coeff[0], mo_occ[0], mask, xctype))
-            rhob.append(ni.eval_rho2(mol, ao, mo_coeff[1], mo_occ[1], mask, xctype))
-        rho = (numpy.hstack(rhoa), numpy.hstack(rhob))
-    vxc, fxc = ni.eval_xc(xc_code, rho, spin=spin, relativity=0, deriv=2,
-                          verbose=0)[1:3]
+    if ni.single_precision:
+        dtype = numpy.float32
+    else:
+        dtype = numpy.double
+
+    rho = vxc = fxc = None
+    p1 = 0
+    for ao, mask, weight, coords \
+            in ni.block_loop(mol, grids, nao, ao_deriv, max_memory=max_memory):
+        p0, p1 = p1, p1 + weight.size
+        if spin == 0:
+            rho_blk = ni.eval_rho2(mol, ao, mo_coeff, mo_occ, mask, xctype)
+            rho_lst = [rho_blk]
+        else:
+            rho_blk = (ni.eval_rho2(mol, ao, mo_coeff[0], mo_occ[0], mask, xctype),
+                       ni.eval_rho2(mol, ao, mo_coeff[1], mo_occ[1], mask, xctype))
+            rho_lst = list(rho_blk)
+        vxc_blk, fxc_blk = ni.eval_xc(xc_code, rho_blk, spin=spin, relativity=0,
+                                      deriv=2, verbose=0)[1:3]
+        if rho is None:
+            rho, vxc, fxc = _alloc_xc_kernel(ni, mol, ngrids, rho_lst, vxc_blk,
+                                             fxc_blk, max_memory, dtype)
+            rho_out = list(rho) if spin == 1 else [rho]
+
+        # The grids are on the last axis of rho and on the first axis of vxc, fxc
+        for x, x_blk in zip(rho_out, rho_lst):
+            x[...,p0:p1] = x_blk
+        for v, v_blk in zip(list(vxc) + list(fxc), list(vxc_blk) + list(fxc_blk)):
+            if v is not None:
+                v[p0:p1] = v_blk
+        rho_blk = rho_lst = vxc_blk = fxc_blk = None
+    return rho, vxc, fxc
+
+def _alloc_xc_kernel(ni, mol, ngrids, rho_lst, vxc_blk, fxc_blk, max_memory,
+                     dtype):
+    '''Allocate the arrays of cache_xc_kernel for all grids, based on the
+    shapes of the kernel of the first block'''
+    blksize = rho_lst[0].shape[-1]
+    itemsize = numpy.dtype(dtype).itemsize
+    size = sum(x.size for x in list(rho_lst) + list(vxc_blk) + list(fxc_blk)
+               if x is not None) * ngrids // blksize
+    on_disk = ni.xc_kernel_on_disk
+    if on_disk is None:
+        on_disk = size * itemsize > max_memory * 1e6
+
+    if on_disk:
+        logger.debug(mol, 'XC kernel cache (%.1f MB) stored in %s',
+                     size*itemsize*1e-6, lib.param.TMPDIR)
+        # The mapped data remain accessible after the file object is released
+        swapfile = tempfile.TemporaryFile(dir=lib.param.TMPDIR)
+    offset = [0]
+    def alloc(x, grid_axis):
+        if x is None:
+            return None
+        shape = list(x.shape)
+        shape[grid_axis] = ngrids
+        if not on_disk:
+            return numpy.empty(shape, dtype=dtype)
+        out = numpy.memmap(swapfile, dtype=dtype, mode='w+', offset=offset[0],
+                           shape=tuple(shape))
+        offset[0] += out.nbytes
+        return out
+
+    rho = [alloc(x, -1) for x in rho_lst]
+    if len(rho) == 1:
+        rho = rho[0]
+    else:
+        rho = tuple(rho)
+    vxc = tuple(alloc(x, 0) for x in vxc_blk)
+    fxc = tuple(alloc(x, 0) for x in fxc_blk)
     return rho, vxc, fxc
 
 def get_rho(ni, mol, dm, grids, max_memory=2000):
@@ -1919,11 +2179,122 @@ def get_rho(ni, mol, dm, grids, max_memory=2000):
     return rho
 
 
+class _AOCache(object):
+    '''Memory-bounded storage of the AO values generated by block_loop.
+
+    Entries are identified by the fingerprints of the molecule and the grids.
+    Entries of other geometries are dropped when a new geometry is found.
+    When the memory is exhausted, the least recently used entry is evicted.
+    The blocks which do not fit in memory are either re-evaluated by the
+    caller or (spill=True) written to a memory-mapped temporary file.
+    '''
+    def __init__(self, max_memory, spill=False):
+        self.max_memory = max_memory
+        self.spill = spill
+        self.entries = collections.OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def mol_key(mol):
+        return _fingerprint(mol._atm, mol._bas, mol._env, mol.cart)
+
+    def get(self, key, ip0):
+        entry = self.entries.get(key)
+        if entry is not None and ip0 in entry['blocks']:
+            self.hits += 1
+            # Move the entry to the end of the LRU queue
+            self.entries[key] = self.entries.pop(key)
+            blk = entry['blocks'][ip0]
+            if isinstance(blk, tuple):
+                offset, shape, dtype = blk
+                blk = numpy.memmap(entry['swap'].name, dtype=dtype, mode='r',
+                                   offset=offset, shape=shape)
+            return blk
+        self.misses += 1
+        return None
+
+    def put(self, key, ip0, ao):
+        if key[0] != getattr(self, '_mol_key', None):
+            # Geometry (or basis) changed
+            self.clear()
+            self._mol_key = key[0]
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = {'blocks': {}, 'swap': None, 'nbytes': 0}
+
+        nbytes = ao.nbytes
+        limit = self.max_memory * 1e6
+        while self.size + nbytes > limit and len(self.entries) > 1:
+            k0 = next(iter(self.entries))
+            if k0 == key:
+                break
+            self._evict(k0)
+
+        if self.size + nbytes <= limit:
+            blk = numpy.array(ao)
+            blk.flags.writeable = False
+            entry['blocks'][ip0] = blk
+            entry['nbytes'] += nbytes
+            self.size += nbytes
+        elif self.spill:
+            if entry['swap'] is None:
+                entry['swap'] = tempfile.NamedTemporaryFile(dir=lib.param.TMPDIR)
+            swap = entry['swap']
+            swap.seek(0, 2)
+            offset = swap.tell()
+            swap.write(numpy.ascontiguousarray(ao).tobytes())
+            swap.flush()
+            entry['blocks'][ip0] = (offset, ao.shape, ao.dtype)
+
+    def _evict(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry['nbytes']
+        if entry['swap'] is not None:
+            entry['swap'].close()
+
+    def clear(self):
+        for key in list(self.entries.keys()):
+            self._evict(key)
+        self.size = 0
+
+def _fingerprint(*args):
+    h = hashlib.sha1()
+    for x in args:
+        if isinstance(x, numpy.ndarray):
+            h.update(numpy.ascontiguousarray(x).view(numpy.uint8))
+        else:
+            h.update(str(x).encode())
+    return h.hexdigest()
+
 class NumInt(object):
     libxc = libxc
+    # Evaluate the AO values on grids and the AO contractions in float32
+    single_precision = getattr(__config__, 'dft_numint_NumInt_single_precision', False)
+    # Cutoff distance (in Bohr) of the VV10 kernel. Pairs of grids beyond the
+    # cutoff are neglected. None to sum over all pairs of grids.
+    vv10_cutoff = getattr(__config__, 'dft_numint_NumInt_vv10_cutoff', None)
+    # Memory (in MB) to cache the AO values on grids across SCF iterations.
+    # 0 disables the cache.
+    ao_cache_memory = getattr(__config__, 'dft_numint_NumInt_ao_cache_memory', 0)
+    # Whether to store the AO values which do not fit in ao_cache_memory in a
+    # memory-mapped temporary file.
+    ao_cache_spill = getattr(__config__, 'dft_numint_NumInt_ao_cache_spill', False)
+    # Whether to store the XC kernel of cache_xc_kernel in a memory-mapped
+    # file. None: only when the kernel does not fit in max_memory.
+    xc_kernel_on_disk = getattr(__config__, 'dft_numint_NumInt_xc_kernel_on_disk', None)
 
     def __init__(self):
         self.omega = None  # RSH paramter
+        self._ao_cache = None
+
+    def clear_ao_cache(self):
+        '''Release the AO values cached by block_loop'''
+        if getattr(self, '_ao_cache', None) is not None:
+            self._ao_cache.clear()
+        self._ao_cache = None
+        return self
 
     @lib.with_doc(nr_vxc.__doc__)
     def nr_vxc(self, mol, grids, xc_code, dms, spin=0, relativity=0, hermi=0,
@@ -1997,14 +2368,43 @@ class NumInt(object):
                                  dtype=numpy.uint8)
         if buf is None:
             buf = numpy.empty((comp,blksize,nao))
+
+        ao_cache = None
+        if self.ao_cache_memory > 0 or self.ao_cache_spill:
+            ao_cache = getattr(self, '_ao_cache', None)
+            if ao_cache is None:
+                ao_cache = self._ao_cache = _AOCache(self.ao_cache_memory,
+                                                     self.ao_cache_spill)
+            ao_cache.max_memory = self.ao_cache_memory
+            ao_cache.spill = self.ao_cache_spill
+            cache_key = (_AOCache.mol_key(mol),
+                         _fingerprint(grids.coords, non0tab), deriv, blksize)
+            hits0, misses0 = ao_cache.hits, ao_cache.misses
+
         for ip0 in range(0, ngrids, blksize):
             ip1 = min(ngrids, ip0+blksize)
             coords = grids.coords[ip0:ip1]
             weight = grids.weights[ip0:ip1]
             non0 = non0tab[ip0//BLKSIZE:]
-            ao = self.eval_ao(mol, coords, deriv=deriv, non0tab=non0, out=buf)
+            ao = None
+            if ao_cache is not None:
+                ao = ao_cache.get(cache_key, ip0)
+            if ao is None:
+                with logger.profile('block_loop'):
+                    ao = self.eval_ao(mol, coords, deriv=deriv, non0tab=non0, out=buf)
+                if ao_cache is not None:
+                    ao_cache.put(cache_key, ip0, ao)
+            if self.single_precision:
+                ao = numpy.asarray(ao, dtype=numpy.float32)
             yield ao, non0, weight, coords
 
+        if ao_cache is not None:
+            hits = ao_cache.hits - hits0
+            misses = ao_cache.misses - misses0
+            logger.debug1(mol, 'AO cache: %d hits, %d misses (hit rate %.1f%%), '
+                          'cached %.1f MB', hits, misses,
+                          hits * 100. / max(1, hits + misses), ao_cache.size*1e-6)
+
     def _gen_rho_evaluator(self, mol, dms, hermi=0):
         if getattr(dms, 'mo_coeff', None) is not None:
             #TODO: test whether dm.mo_coeff matching dm
@@ -365,6 +365,12 @@ class KohnShamDFT(object):
             logger.info(self, 'NLC functional = %s', self.nlc)
         logger.info(self, 'small_rho_cutoff = %g', self.small_rho_cutoff)
         self.grids.dump_flags(verbose)
+        if (getattr(self.grids, 'adaptive', False) and
+            self._numint._xc_type(self.xc) == 'MGGA'):
+            logger.warn(self, 'Adaptive grids are designed for LDA and GGA '
+                        'functionals. The XC energy of the meta-GGA functional '
+                        '%s can be less accurate than with the regular grids.',
+                        self.xc)
         if self.nlc!='':
             logger.info(self, '** Following is NLC Grids **')
             self.nlcgrids.dump_flags(verbose)
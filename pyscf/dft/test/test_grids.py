@@ -17,6 +17,7 @@ import unittest
 import numpy
 from pyscf import lib
 from pyscf import gto
+from pyscf import scf
 from pyscf import dft
 from pyscf.dft import gen_grid
 from pyscf.dft import radi
@@ -68,6 +69,39 @@ class KnownValues(unittest.TestCase):
         grid.build(with_non0tab=False)
         self.assertAlmostEqual(numpy.linalg.norm(grid.weights), 1712.3069450297105, 8)
 
+    def test_partition_screening(self):
+        mol = gto.M(atom=[['H', (i*1.4, i%3*.3, 0)] for i in range(12)],
+                    basis='sto3g', verbose=0)
+        atom_grids_tab = gen_grid.gen_atomic_grids(mol, (20, 50))
+        for scheme in (gen_grid.original_becke, gen_grid.stratmann):
+            c0, w0 = gen_grid.get_partition(mol, atom_grids_tab,
+                                            radi.treutler_atomic_radii_adjust,
+                                            radi.BRAGG_RADII, scheme, cutoff=0)
+            c1, w1 = gen_grid.get_partition(mol, atom_grids_tab,
+                                            radi.treutler_atomic_radii_adjust,
+                                            radi.BRAGG_RADII, scheme, cutoff=1e-12)
+            self.assertAlmostEqual(abs(w0 - w1).max(), 0, 9)
+
+        # The numpy implementation for custom partition functions
+        c2, w2 = gen_grid.get_partition(mol, atom_grids_tab,
+                                        radi.treutler_atomic_radii_adjust,
+                                        radi.BRAGG_RADII,
+                                        lambda g: gen_grid.stratmann(g))
+        self.assertAlmostEqual(abs(w0 - w2).max() / abs(w0).max(), 0, 12)
+
+        grid0 = gen_grid.Grids(mol)
+        grid0.atom_grid = (20, 50)
+        grid0.becke_scheme = gen_grid.stratmann
+        grid0.weight_threshold = 0
+        grid0.build()
+        grid = gen_grid.Grids(mol)
+        grid.atom_grid = (20, 50)
+        grid.becke_scheme = gen_grid.stratmann
+        grid.weight_threshold = 1e-12
+        grid.build()
+        self.assertTrue(grid.size < grid0.size)
+        self.assertAlmostEqual(grid.weights.sum(), grid0.weights.sum(), 9)
+
     def test_radi(self):
         grid = gen_grid.Grids(h2o)
         grid.prune = None
@@ -125,6 +159,89 @@ class KnownValues(unittest.TestCase):
         self.assertEqual(non0.sum(), 106)
         self.assertAlmostEqual(lib.finger(non0), -0.81399929716237085, 9)
 
+    def test_sort_grids(self):
+        g0 = gen_grid.Grids(h2o).build(with_non0tab=True)
+        g1 = gen_grid.Grids(h2o)
+        g1.sort_grids = True
+        g1.build(with_non0tab=True)
+        self.assertAlmostEqual(abs(numpy.sort(g0.weights) - numpy.sort(g1.weights)).max(), 0, 14)
+        self.assertAlmostEqual(abs(g0.coords.sum(axis=0) - g1.coords.sum(axis=0)).max(), 0, 8)
+        self.assertTrue(g1.non0tab.sum() <= g0.non0tab.sum())
+
+        idx = gen_grid.arg_group_grids(h2o, g0.coords)
+        self.assertEqual(sorted(idx), list(range(g0.size)))
+
+    def test_reuse_atomic_grids(self):
+        g = gen_grid.Grids(h2o).build()
+        self.assertEqual(len(g._atom_grids_cache), 2)
+        mol1 = h2o.set_geom_(h2o.atom_coords()+.1, unit='Bohr', inplace=False)
+        g.reset(mol1).build()
+        self.assertEqual(len(g._atom_grids_cache), 2)
+        ref = gen_grid.Grids(mol1).build()
+        self.assertAlmostEqual(abs(g.coords - ref.coords).max(), 0, 12)
+        self.assertAlmostEqual(abs(g.weights - ref.weights).max(), 0, 12)
+
+        g.atom_grid = {'O': (20, 50)}
+        g.build()
+        self.assertEqual(len(g._atom_grids_cache), 3)
+
+    def test_adaptive_grids(self):
+        g0 = gen_grid.Grids(h2o).build()
+        g1 = gen_grid.Grids(h2o)
+        g1.adaptive = True
+        g1.build()
+        self.assertTrue(g1.weights.size < g0.weights.size * .7)
+
+        dm = scf.hf.get_init_guess(h2o, 'minao')
+        ni = dft.numint.NumInt()
+        n0, e0, v0 = ni.nr_rks(h2o, g0, 'b88,p86', dm)
+        n1, e1, v1 = ni.nr_rks(h2o, g1, 'b88,p86', dm)
+        self.assertAlmostEqual(n1, n0, 4)
+        self.assertAlmostEqual(e1, e0, 4)
+        self.assertAlmostEqual(abs(v1 - v0).max(), 0, 4)
+
+        # The angular grids of an isolated atom are bounded by the basis
+        mol = gto.M(atom='Ne', basis='cc-pvdz', verbose=0)
+        g0 = gen_grid.Grids(mol).build()
+        g1 = gen_grid.Grids(mol)
+        g1.adaptive = True
+        g1.build()
+        dm = scf.hf.get_init_guess(mol, 'minao')
+        v0 = ni.nr_rks(mol, g0, 'b88,p86', dm)[2]
+        v1 = ni.nr_rks(mol, g1, 'b88,p86', dm)[2]
+        self.assertAlmostEqual(abs(v1 - v0).max(), 0, 5)
+
+    def test_adaptive_grids_xc_energy(self):
+        mol = gto.M(atom='''
+            O  -1.551007  -0.114520   0.000000
+            H  -1.934259   0.762503   0.000000
+            H  -0.599677   0.040712   0.000000
+            O   1.350625   0.111469   0.000000
+            H   1.680398  -0.373741  -0.758561
+            H   1.680398  -0.373741   0.758561''', basis='6-31g', verbose=0)
+        dm = scf.hf.get_init_guess(mol, 'minao')
+        ni = dft.numint.NumInt()
+        g_ref = gen_grid.Grids(mol)
+        g_ref.level = 8
+        g_ref.build()
+        g0 = gen_grid.Grids(mol).build()
+        g1 = gen_grid.Grids(mol)
+        g1.adaptive = True
+        g1.build()
+        self.assertTrue(g1.weights.size < g0.weights.size * .8)
+        for xc in ('b3lyp', 'pbe,pbe'):
+            e_ref = ni.nr_rks(mol, g_ref, xc, dm)[1]
+            e0 = ni.nr_rks(mol, g0, xc, dm)[1]
+            e1 = ni.nr_rks(mol, g1, xc, dm)[1]
+            self.assertTrue(abs(e1 - e_ref) < abs(e0 - e_ref) * 1.5 + 1e-6)
+
+    def test_slater_density_radius(self):
+        # The density of Cs does not decay to 1e-15 within 40 bohr
+        params = gen_grid.slater_atom_density(55)
+        r = gen_grid._slater_density_radius(params, 1e-15)
+        self.assertTrue(r > 40)
+        self.assertTrue(gen_grid._eval_slater_density(params, r) < 1e-15)
+
     def test_overwriting_grids_attribute(self):
         g = gen_grid.Grids(h2o).run()
         self.assertEqual(g.weights.size, 34310)
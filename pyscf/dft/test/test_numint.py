@@ -106,6 +106,35 @@ class KnownValues(unittest.TestCase):
         v2 = dft.numint._dot_ao_ao(h4, ao, ao, None, None, None)
         self.assertAlmostEqual(abs(v1-v2).max(), 0, 9)
 
+    def test_dot_ao_ao_sparse(self):
+        ao_loc = h4.ao_loc_nr()
+        non0tab = mf_h4.grids.non0tab
+        ao = mf_h4._numint.eval_ao(h4, mf_h4.grids.coords, non0tab=non0tab)
+        self.assertTrue(non0tab.mean() < .9)
+        numpy.random.seed(2)
+        dm = numpy.random.random((h4.nao, 70))
+        v1 = dft.numint._dot_ao_dm(h4, ao, dm, non0tab, (0,h4.nbas), ao_loc)
+        self.assertAlmostEqual(abs(v1-ao.dot(dm)).max(), 0, 9)
+        v1 = dft.numint._dot_ao_ao(h4, ao, ao, non0tab, (0,h4.nbas), ao_loc, hermi=1)
+        self.assertAlmostEqual(abs(v1-ao.T.dot(ao)).max(), 0, 9)
+        aow = ao * mf_h4.grids.weights[:,None]
+        v1 = dft.numint._dot_ao_ao(h4, ao, aow, non0tab, (0,h4.nbas), ao_loc)
+        self.assertAlmostEqual(abs(v1-ao.T.dot(aow)).max(), 0, 9)
+
+        # float32 kernels of the mixed precision numerical integration
+        ao32 = numpy.asarray(ao, dtype=numpy.float32)
+        ref = ao.dot(dm)
+        v1 = dft.numint._dot_ao_dm(h4, ao32, dm, non0tab, (0,h4.nbas), ao_loc)
+        self.assertEqual(v1.dtype, numpy.float32)
+        self.assertAlmostEqual(abs(v1-ref).max() / abs(ref).max(), 0, 5)
+        ref = ao.T.dot(ao)
+        v1 = dft.numint._dot_ao_ao(h4, ao32, ao32, non0tab, (0,h4.nbas), ao_loc, hermi=1)
+        self.assertEqual(v1.dtype, numpy.float32)
+        self.assertAlmostEqual(abs(v1-ref).max() / abs(ref).max(), 0, 5)
+        ref = ao.T.dot(aow)
+        v1 = dft.numint._dot_ao_ao(h4, ao32, aow, non0tab, (0,h4.nbas), ao_loc)
+        self.assertAlmostEqual(abs(v1-ref).max() / abs(ref).max(), 0, 5)
+
     def test_dot_ao_ao_high_cost(self):
         non0tab = mf.grids.make_mask(mol, mf.grids.coords)
         ao = dft.numint.eval_ao(mol, mf.grids.coords, deriv=1)
@@ -344,6 +373,17 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual(finger(v[0]), 0.15894647203764295, 9)
         self.assertAlmostEqual(finger(v[1]), 0.20500922537924576, 9)
 
+        v1 = dft.numint._vv10nlc(rho, coords, vvrho, vvweight, vvcoords, nlc_pars, cutoff=10.)
+        self.assertAlmostEqual(abs(v1[0] - v[0]).max(), 0, 12)
+        self.assertAlmostEqual(abs(v1[1] - v[1]).max(), 0, 12)
+
+        coords = (numpy.random.random((20,3))-.5)*20
+        vvcoords = (numpy.random.random((60,3))-.5)*20
+        v = dft.numint._vv10nlc(rho, coords, vvrho, vvweight, vvcoords, nlc_pars)
+        v1 = dft.numint._vv10nlc(rho, coords, vvrho, vvweight, vvcoords, nlc_pars, cutoff=8.)
+        self.assertAlmostEqual(abs(v1[0] - v[0]).max(), 0, 3)
+        self.assertAlmostEqual(abs(v1[1] - v[1]).max(), 0, 3)
+
     def test_nr_uks_vxc_vv10(self):
         method = dft.UKS(h2o)
         dm = method.get_init_guess()
@@ -436,6 +476,100 @@ class KnownValues(unittest.TestCase):
         #self.assertAlmostEqual(abs(fxc1[1] - fxc2[1]), 0, 0)
         #self.assertAlmostEqual(abs(fxc1[2] - fxc2[2]), 0, 0)
 
+    def test_cache_xc_kernel_on_disk(self):
+        mf = dft.RKS(h2o)
+        mf.xc = 'b88,p86'
+        mf.grids.atom_grid = {"H": (30, 110), "O": (30, 110),}
+        mf.run()
+        ni = dft.numint.NumInt()
+        rho, vxc, fxc = ni.cache_xc_kernel(mf.mol, mf.grids, mf.xc, mf.mo_coeff,
+                                           mf.mo_occ, max_memory=1)
+        ni.xc_kernel_on_disk = True
+        rho1, vxc1, fxc1 = ni.cache_xc_kernel(mf.mol, mf.grids, mf.xc, mf.mo_coeff,
+                                              mf.mo_occ, max_memory=1)
+        self.assertTrue(isinstance(rho1, numpy.memmap))
+        self.assertAlmostEqual(abs(rho1 - rho).max(), 0, 12)
+        self.assertAlmostEqual(abs(fxc1[2] - fxc[2]).max(), 0, 12)
+
+        ni.xc_kernel_on_disk = False
+        rho2, vxc2, fxc2 = ni.cache_xc_kernel(mf.mol, mf.grids, mf.xc, mf.mo_coeff,
+                                              mf.mo_occ, max_memory=1)
+        self.assertFalse(isinstance(rho2, numpy.memmap))
+        self.assertAlmostEqual(abs(vxc2[1] - vxc[1]).max(), 0, 12)
+
+        numpy.random.seed(1)
+        nao = mf.mol.nao
+        dm1 = numpy.random.random((nao,nao))
+        dm1 = dm1 + dm1.T
+        v1 = ni.nr_rks_fxc(mf.mol, mf.grids, mf.xc, None, dm1, 0, 1,
+                           rho1, vxc1, fxc1, max_memory=1)
+        dm0 = mf.make_rdm1()
+        v0 = ni.nr_rks_fxc(mf.mol, mf.grids, mf.xc, dm0, dm1, 0, 1)
+        self.assertAlmostEqual(abs(v1 - v0).max(), 0, 9)
+
+        mo = (mf.mo_coeff, mf.mo_coeff)
+        occ = (mf.mo_occ*.5, mf.mo_occ*.5)
+        ni.xc_kernel_on_disk = None
+        rho, vxc, fxc = ni.cache_xc_kernel(mf.mol, mf.grids, mf.xc, mo, occ,
+                                           spin=1, max_memory=1e-3)
+        self.assertTrue(isinstance(rho[1], numpy.memmap))
+        dm1 = numpy.array((dm1, dm1*.5))
+        v1 = ni.nr_uks_fxc(mf.mol, mf.grids, mf.xc, None, dm1, 0, 1,
+                           rho, vxc, fxc)
+        v0 = ni.nr_uks_fxc(mf.mol, mf.grids, mf.xc, (dm0*.5,dm0*.5), dm1, 0, 1)
+        self.assertAlmostEqual(abs(v1 - v0).max(), 0, 9)
+
+    def test_fxc_batch(self):
+        numpy.random.seed(2)
+        mol = h2o
+        nao = mol.nao
+        grids = dft.gen_grid.Grids(mol)
+        grids.atom_grid = {"H": (30, 110), "O": (30, 110),}
+        grids.build(with_non0tab=True)
+        ni = dft.numint.NumInt()
+        dm0 = numpy.random.random((nao,nao))
+        dm0 = dm0 + dm0.T
+        dms = numpy.random.random((5,nao,nao))
+        for xc in ('lda,vwn', 'b88,p86'):
+            v = ni.nr_rks_fxc(mol, grids, xc, dm0, dms, hermi=0)
+            ref = [ni.nr_rks_fxc(mol, grids, xc, dm0, dm, hermi=0) for dm in dms]
+            self.assertAlmostEqual(abs(v - numpy.array(ref)).max(), 0, 9)
+
+            v = dft.numint.nr_rks_fxc_st(ni, mol, grids, xc, dm0, dms, singlet=False)
+            ref = [dft.numint.nr_rks_fxc_st(ni, mol, grids, xc, dm0, dm, singlet=False)
+                   for dm in dms]
+            self.assertAlmostEqual(abs(v - numpy.array(ref)).max(), 0, 9)
+
+            dms1 = numpy.array((dms, dms[::-1]*.5))
+            v = ni.nr_uks_fxc(mol, grids, xc, (dm0,dm0*.5), dms1, hermi=0,
+                              max_memory=1)
+            ref = [ni.nr_uks_fxc(mol, grids, xc, (dm0,dm0*.5), dms1[:,i], hermi=0)
+                   for i in range(5)]
+            self.assertAlmostEqual(abs(v - numpy.array(ref).transpose(1,0,2,3)).max(), 0, 9)
+
+    def test_ao_cache(self):
+        numpy.random.seed(10)
+        nao = h2o.nao_nr()
+        dms = numpy.random.random((2,nao,nao))
+        grids = dft.gen_grid.Grids(h2o).build()
+        ni = dft.numint.NumInt()
+        ref = ni.nr_vxc(h2o, grids, 'B88,', dms, spin=1)[2]
+
+        ni.ao_cache_memory = 4
+        ni.ao_cache_spill = True
+        v = ni.nr_vxc(h2o, grids, 'B88,', dms, spin=1)[2]
+        self.assertAlmostEqual(abs(v - ref).max(), 0, 12)
+        self.assertEqual(ni._ao_cache.hits, 0)
+        v = ni.nr_vxc(h2o, grids, 'B88,', dms, spin=1)[2]
+        self.assertAlmostEqual(abs(v - ref).max(), 0, 12)
+        self.assertEqual(ni._ao_cache.hits, ni._ao_cache.misses)
+
+        # Geometry changes invalidate the cache
+        h2o1 = h2o.set_geom_(h2o.atom_coords()+.1, unit='Bohr', inplace=False)
+        ni.nr_vxc(h2o1, dft.gen_grid.Grids(h2o1).build(), 'B88,', dms, spin=1)
+        self.assertEqual(len(ni._ao_cache.entries), 1)
+        ni.clear_ao_cache()
+
 
 if __name__ == "__main__":
     print("Test numint")
@@ -18,7 +18,13 @@
 
 import sys
 import json
+import atexit
+import threading
+import collections
+import numpy
 import h5py
+from pyscf.lib import misc
+from pyscf import __config__
 
 if sys.version_info < (3,):
     RANGE_TYPE = list
@@ -70,6 +76,7 @@ def load(chkfile, key):
         else:
             return val[()]
 
+    flush(chkfile)
     with h5py.File(chkfile, 'r') as fh5:
         return load_as_dic(key, fh5)
 load_chkfile_key = load
@@ -126,6 +133,7 @@ def dump(chkfile, key, value):
                 for k, v in enumerate(value):
                     save_as_group('%06d'%k, v, root1)
 
+    flush(chkfile)
     if h5py.is_hdf5(chkfile):
         with h5py.File(chkfile, 'r+') as fh5:
             if key in fh5:
@@ -160,6 +168,7 @@ def load_mol(chkfile):
     '''
     from numpy import array  # noqa
     from pyscf import gto
+    flush(chkfile)
     try:
         with h5py.File(chkfile, 'r') as fh5:
             mol = gto.loads(fh5['mol'][()])
@@ -190,3 +199,103 @@ def save_mol(mol, chkfile):
     dump(chkfile, 'mol', mol.dumps())
 dump_mol = save_mol
 
+
+
+ASYNC_DUMP = getattr(__config__, 'lib_chkfile_async_dump', misc.ASYNC_IO)
+
+class _BackgroundWriter(object):
+    '''A single thread which executes the chkfile write requests in
+    background. Requests are identified by (chkfile, key). A request which is
+    not started yet is replaced by the newer request of the same identifier,
+    so that only the latest data are written to disk.
+    '''
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = collections.OrderedDict()
+        self._running = None
+        self._thread = None
+        self._error = None
+
+    def submit(self, chkfile, key, fn, *args):
+        with self._cond:
+            self._raise_error()
+            self._pending[(chkfile, key)] = (fn, args)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = misc.ThreadWithTraceBack(target=self._loop)
+                self._thread.daemon = True
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                if not self._pending:
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+                ident, (fn, args) = self._pending.popitem(last=False)
+                self._running = ident
+            try:
+                fn(*args)
+            except BaseException as e:
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                with self._cond:
+                    self._running = None
+                    self._cond.notify_all()
+
+    def _busy(self, chkfile):
+        if chkfile is None:
+            return self._running is not None or bool(self._pending)
+        return ((self._running is not None and self._running[0] == chkfile) or
+                any(k[0] == chkfile for k in self._pending))
+
+    def flush(self, chkfile=None):
+        '''Wait until the pending writes of chkfile (or all chkfiles if
+        chkfile is None) are finished.'''
+        if threading.current_thread() is self._thread:
+            # The requests executed by the writer call dump/save themselves
+            return
+        with self._cond:
+            while self._busy(chkfile):
+                self._cond.wait()
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            e, self._error = self._error, None
+            raise misc.ThreadRuntimeError('Error in background chkfile writer:\n%s' % e)
+
+_writer = _BackgroundWriter()
+
+def dump_async(chkfile, key, fn, *args):
+    '''Execute fn(*args) in the background chkfile writer. fn should write
+    the data associated to key in chkfile. The pending request of the same
+    (chkfile, key) is discarded. Numpy arrays in args are copied because
+    callers may update them in place.
+
+    When ASYNC_DUMP is disabled, fn is executed immediately.
+    '''
+    if not ASYNC_DUMP:
+        flush(chkfile)
+        return fn(*args)
+    _writer.submit(chkfile, key, fn, *[_copy_arrays(x) for x in args])
+
+def flush(chkfile=None):
+    '''Wait for the background writes of chkfile. All chkfiles are flushed if
+    chkfile is not specified.'''
+    _writer.flush(chkfile)
+
+def _copy_arrays(value):
+    if isinstance(value, numpy.ndarray):
+        return value.copy()
+    elif isinstance(value, dict):
+        return dict([(k, _copy_arrays(v)) for k, v in value.items()])
+    elif isinstance(value, (tuple, list)):
+        return type(value)([_copy_arrays(v) for v in value])
+    else:
+        return value
+
+atexit.register(flush)
@@ -156,3 +156,130 @@ void VXCgen_grid(double *out, double *coords, double *atm_coords,
         free(atom_dist);
 }
 
+
+#define BECKE_SCHEME            0
+#define STRATMANN_SCHEME        1
+#define STRATMANN_A             .64
+
+/* cell function s(nu) = (1 - f(nu)) / 2 */
+static double _cell_function(double nu, int scheme)
+{
+        double f;
+        if (scheme == STRATMANN_SCHEME) {
+                if (nu <= -STRATMANN_A) {
+                        return 1;
+                } else if (nu >= STRATMANN_A) {
+                        return 0;
+                }
+                double ma = nu * (1./STRATMANN_A);
+                double ma2 = ma * ma;
+                f = (1./16) * (ma*(35 + ma2*(-35 + ma2*(21 - 5*ma2))));
+        } else {
+                f = nu;
+                f = (3 - f*f) * f * .5;
+                f = (3 - f*f) * f * .5;
+                f = (3 - f*f) * f * .5;
+        }
+        return .5 * (1 - f);
+}
+
+/*
+ * Becke partition weights of the grids of atom ia.
+ * out[n] = P_ia(r_n) / sum_k P_k(r_n)
+ *
+ * For each grid, the cell function of atom k against the nearest atom is an
+ * upper bound of P_k.  Atoms for which this bound is not larger than
+ * cutoff are excluded (Stratmann-style screening).  The cell function of
+ * the Stratmann scheme vanishes exactly for distant atoms.
+ */
+void VXCgen_grid_partition(double *out, double *coords, double *atm_coords,
+                           double *radii_table, int natm, int ngrids,
+                           int ia, int scheme, double cutoff)
+{
+        const size_t Ngrids = ngrids;
+        int i, j;
+        double dx, dy, dz;
+        double *atom_dist_inv = malloc(sizeof(double) * natm*natm);
+        for (i = 0; i < natm; i++) {
+                atom_dist_inv[i*natm+i] = 0;
+                for (j = 0; j < i; j++) {
+                        dx = atm_coords[i*3+0] - atm_coords[j*3+0];
+                        dy = atm_coords[i*3+1] - atm_coords[j*3+1];
+                        dz = atm_coords[i*3+2] - atm_coords[j*3+2];
+                        atom_dist_inv[i*natm+j] = 1 / sqrt(dx*dx + dy*dy + dz*dz);
+                        atom_dist_inv[j*natm+i] = atom_dist_inv[i*natm+j];
+                }
+        }
+
+#pragma omp parallel private(i, j, dx, dy, dz)
+{
+        double *grid_dist = malloc(sizeof(double) * natm);
+        int *rel = malloc(sizeof(int) * natm);
+        size_t n;
+        int k, nrel, nearest;
+        double mu, nu, p, psum, pia, rmin;
+#pragma omp for schedule(static)
+        for (n = 0; n < Ngrids; n++) {
+                rmin = 1e200;
+                nearest = 0;
+                for (i = 0; i < natm; i++) {
+                        dx = coords[0*Ngrids+n] - atm_coords[i*3+0];
+                        dy = coords[1*Ngrids+n] - atm_coords[i*3+1];
+                        dz = coords[2*Ngrids+n] - atm_coords[i*3+2];
+                        grid_dist[i] = sqrt(dx*dx + dy*dy + dz*dz);
+                        if (grid_dist[i] < rmin) {
+                                rmin = grid_dist[i];
+                                nearest = i;
+                        }
+                }
+
+                nrel = 0;
+                for (k = 0; k < natm; k++) {
+                        if (k == nearest) {
+                                rel[nrel] = k;
+                                nrel++;
+                                continue;
+                        }
+                        mu = (grid_dist[k] - rmin) * atom_dist_inv[k*natm+nearest];
+                        nu = mu;
+                        if (radii_table != NULL) {
+                                nu += radii_table[k*natm+nearest] * (1 - mu*mu);
+                        }
+                        if (_cell_function(nu, scheme) > cutoff) {
+                                rel[nrel] = k;
+                                nrel++;
+                        }
+                }
+
+                psum = 0;
+                pia = 0;
+                for (i = 0; i < nrel; i++) {
+                        k = rel[i];
+                        p = 1;
+                        for (j = 0; j < natm && p > 0; j++) {
+                                if (j == k) {
+                                        continue;
+                                }
+                                mu = (grid_dist[k] - grid_dist[j]) * atom_dist_inv[k*natm+j];
+                                nu = mu;
+                                if (radii_table != NULL) {
+                                        nu += radii_table[k*natm+j] * (1 - mu*mu);
+                                }
+                                p *= _cell_function(nu, scheme);
+                        }
+                        psum += p;
+                        if (k == ia) {
+                                pia = p;
+                        }
+                }
+                if (psum > 0) {
+                        out[n] = pia / psum;
+                } else {
+                        out[n] = 0;
+                }
+        }
+        free(grid_dist);
+        free(rel);
+}
+        free(atom_dist_inv);
+}
@@ -25,6 +25,8 @@
 #include "vhf/fblas.h"
 
 #define BOXSIZE         56
+// The number of rows (or columns) packed in each dgemm of the sparse kernels
+#define PACKSIZE        64
 
 int VXCao_empty_blocks(char *empty, unsigned char *non0table, int *shls_slice,
                        int *ao_loc)
@@ -58,43 +60,88 @@ int VXCao_empty_blocks(char *empty, unsigned char *non0table, int *shls_slice,
         return has0;
 }
 
+/*
+ * Indices of the AOs of the shells which are significant for a block of
+ * grids.  Returns -1 if screening information is not available.
+ */
+int VXCao_nonzero_index(int *idx, unsigned char *non0table, int *shls_slice,
+                        int *ao_loc)
+{
+        if (non0table == NULL || shls_slice == NULL || ao_loc == NULL) {
+                return -1;
+        }
+
+        const int sh0 = shls_slice[0];
+        const int sh1 = shls_slice[1];
+        const int off = ao_loc[sh0];
+        int bas_id, i;
+        int n = 0;
+        for (bas_id = sh0; bas_id < sh1; bas_id++) {
+                if (non0table[bas_id]) {
+                        for (i = ao_loc[bas_id]; i < ao_loc[bas_id+1]; i++) {
+                                idx[n] = i - off;
+                                n++;
+                        }
+                }
+        }
+        return n;
+}
+
+/* gather ao[idx,:bgrids] into a compact buffer */
+static void _pack_ao(double *out, double *ao, int *idx, int nidx,
+                     int ngrids, int bgrids)
+{
+        int k, j;
+        double *pao;
+        for (k = 0; k < nidx; k++) {
+                pao = ao + (size_t)idx[k] * ngrids;
+                for (j = 0; j < bgrids; j++) {
+                        out[k*bgrids+j] = pao[j];
+                }
+        }
+}
+
+/*
+ * The AO functions of the significant shells of the grid block are packed
+ * so that the cost scales with the number of significant AOs rather than
+ * nao.  buf needs nao*(BLKSIZE+PACKSIZE) doubles.
+ */
 static void dot_ao_dm(double *vm, double *ao, double *dm,
                       int nao, int nocc, int ngrids, int bgrids,
-                      unsigned char *non0table, int *shls_slice, int *ao_loc)
+                      unsigned char *non0table, int *shls_slice, int *ao_loc,
+                      int *idx, double *buf)
 {
-        int nbox = (nao+BOXSIZE-1) / BOXSIZE;
-        char empty[nbox];
-        int has0 = VXCao_empty_blocks(empty, non0table, shls_slice, ao_loc);
-
         const char TRANS_T = 'T';
         const char TRANS_N = 'N';
+        const double D0 = 0;
         const double D1 = 1;
-        double beta = 0;
-
-        if (has0) {
-                int box_id, blen, i, j;
-                size_t b0;
-
-                for (box_id = 0; box_id < nbox; box_id++) {
-                        if (!empty[box_id]) {
-                                b0 = box_id * BOXSIZE;
-                                blen = MIN(nao-b0, BOXSIZE);
-                                dgemm_(&TRANS_N, &TRANS_T, &bgrids, &nocc, &blen,
-                                       &D1, ao+b0*ngrids, &ngrids, dm+b0*nocc, &nocc,
-                                       &beta, vm, &ngrids);
-                                beta = 1.0;
+        int nidx = VXCao_nonzero_index(idx, non0table, shls_slice, ao_loc);
+        int i, j, k, i0, di;
+
+        if (nidx < 0 || nidx == nao) {
+                dgemm_(&TRANS_N, &TRANS_T, &bgrids, &nocc, &nao,
+                       &D1, ao, &ngrids, dm, &nocc, &D0, vm, &ngrids);
+        } else if (nidx == 0) {
+                for (i = 0; i < nocc; i++) {
+                        for (j = 0; j < bgrids; j++) {
+                                vm[i*ngrids+j] = 0;
                         }
                 }
-                if (beta == 0) { // all empty
-                        for (i = 0; i < nocc; i++) {
-                                for (j = 0; j < bgrids; j++) {
-                                        vm[i*ngrids+j] = 0;
+        } else {
+                double *ao_pack = buf;
+                double *dm_pack = buf + (size_t)nidx * bgrids;
+                _pack_ao(ao_pack, ao, idx, nidx, ngrids, bgrids);
+                for (i0 = 0; i0 < nocc; i0 += PACKSIZE) {
+                        di = MIN(nocc-i0, PACKSIZE);
+                        for (k = 0; k < nidx; k++) {
+                                for (i = 0; i < di; i++) {
+                                        dm_pack[k*di+i] = dm[(size_t)idx[k]*nocc+i0+i];
                                 }
                         }
+                        dgemm_(&TRANS_N, &TRANS_T, &bgrids, &di, &nidx,
+                               &D1, ao_pack, &bgrids, dm_pack, &di,
+                               &D0, vm+(size_t)i0*ngrids, &ngrids);
                 }
-        } else {
-                dgemm_(&TRANS_N, &TRANS_T, &bgrids, &nocc, &nao,
-                       &D1, ao, &ngrids, dm, &nocc, &beta, vm, &ngrids);
         }
 }
 
@@ -109,54 +156,64 @@ void VXCdot_ao_dm(double *vm, double *ao, double *dm,
 #pragma omp parallel
 {
         int ip, ib;
+        int *idx = malloc(sizeof(int) * (nao+1));
+        double *buf = malloc(sizeof(double) * ((size_t)nao*(BLKSIZE+PACKSIZE)+2));
 #pragma omp for nowait schedule(static)
         for (ib = 0; ib < nblk; ib++) {
                 ip = ib * BLKSIZE;
                 dot_ao_dm(vm+ip, ao+ip, dm,
                           nao, nocc, ngrids, MIN(ngrids-ip, BLKSIZE),
-                          non0table+ib*nbas, shls_slice, ao_loc);
+                          non0table+ib*nbas, shls_slice, ao_loc, idx, buf);
         }
+        free(idx);
+        free(buf);
 }
 }
 
 
 
-/* vv[n,m] = ao1[n,ngrids] * ao2[m,ngrids] */
+/* vv[n,m] = ao1[n,ngrids] * ao2[m,ngrids]
+ * buf needs nao*(2*BLKSIZE+PACKSIZE) doubles */
 static void dot_ao_ao(double *vv, double *ao1, double *ao2,
                       int nao, int ngrids, int bgrids, int hermi,
-                      unsigned char *non0table, int *shls_slice, int *ao_loc)
+                      unsigned char *non0table, int *shls_slice, int *ao_loc,
+                      int *idx, double *buf)
 {
-        int nbox = (nao+BOXSIZE-1) / BOXSIZE;
-        char empty[nbox];
-        int has0 = VXCao_empty_blocks(empty, non0table, shls_slice, ao_loc);
-
         const char TRANS_T = 'T';
         const char TRANS_N = 'N';
+        const double D0 = 0;
         const double D1 = 1;
-        if (has0) {
-                int ib, jb, leni, lenj;
-                int j1 = nbox;
-                size_t b0i, b0j;
-
-                for (ib = 0; ib < nbox; ib++) {
-                if (!empty[ib]) {
-                        b0i = ib * BOXSIZE;
-                        leni = MIN(nao-b0i, BOXSIZE);
-                        if (hermi) {
-                                j1 = ib + 1;
-                        }
-                        for (jb = 0; jb < j1; jb++) {
-                        if (!empty[jb]) {
-                                b0j = jb * BOXSIZE;
-                                lenj = MIN(nao-b0j, BOXSIZE);
-                                dgemm_(&TRANS_T, &TRANS_N, &lenj, &leni, &bgrids, &D1,
-                                       ao2+b0j*ngrids, &ngrids, ao1+b0i*ngrids, &ngrids,
-                                       &D1, vv+b0i*nao+b0j, &nao);
-                        } }
-                } }
-        } else {
+        int nidx = VXCao_nonzero_index(idx, non0table, shls_slice, ao_loc);
+        int i, j, i0, di, j1;
+
+        if (nidx < 0 || nidx == nao) {
                 dgemm_(&TRANS_T, &TRANS_N, &nao, &nao, &bgrids,
                        &D1, ao2, &ngrids, ao1, &ngrids, &D1, vv, &nao);
+        } else if (nidx > 0) {
+                double *ao1_pack = buf;
+                double *ao2_pack = ao1_pack + (size_t)nidx * bgrids;
+                double *vv_pack = ao2_pack + (size_t)nidx * bgrids;
+                double *pvv;
+                _pack_ao(ao1_pack, ao1, idx, nidx, ngrids, bgrids);
+                if (ao2 == ao1) {
+                        ao2_pack = ao1_pack;
+                } else {
+                        _pack_ao(ao2_pack, ao2, idx, nidx, ngrids, bgrids);
+                }
+                for (i0 = 0; i0 < nidx; i0 += PACKSIZE) {
+                        di = MIN(nidx-i0, PACKSIZE);
+                        // Only the lower triangular part is needed if hermi
+                        j1 = hermi ? i0 + di : nidx;
+                        dgemm_(&TRANS_T, &TRANS_N, &j1, &di, &bgrids,
+                               &D1, ao2_pack, &bgrids, ao1_pack+(size_t)i0*bgrids, &bgrids,
+                               &D0, vv_pack, &j1);
+                        for (i = 0; i < di; i++) {
+                                pvv = vv + (size_t)idx[i0+i] * nao;
+                                for (j = 0; j < j1; j++) {
+                                        pvv[idx[j]] += vv_pack[i*j1+j];
+                                }
+                        }
+                }
         }
 }
 
@@ -173,12 +230,14 @@ void VXCdot_ao_ao(double *vv, double *ao1, double *ao2,
 {
         int ip, ib;
         double *v_priv = calloc(nao*nao+2, sizeof(double));
+        int *idx = malloc(sizeof(int) * (nao+1));
+        double *buf = malloc(sizeof(double) * ((size_t)nao*(BLKSIZE*2+PACKSIZE)+2));
 #pragma omp for nowait schedule(static)
         for (ib = 0; ib < nblk; ib++) {
                 ip = ib * BLKSIZE;
                 dot_ao_ao(v_priv, ao1+ip, ao2+ip,
                           nao, ngrids, MIN(ngrids-ip, BLKSIZE), hermi,
-                          non0table+ib*nbas, shls_slice, ao_loc);
+                          non0table+ib*nbas, shls_slice, ao_loc, idx, buf);
         }
 #pragma omp critical
         {
@@ -187,12 +246,178 @@ void VXCdot_ao_ao(double *vv, double *ao1, double *ao2,
                 }
         }
         free(v_priv);
+        free(idx);
+        free(buf);
 }
         if (hermi != 0) {
                 NPdsymm_triu(nao, vv, hermi);
         }
 }
 
+/*
+ * float32 versions of VXCdot_ao_dm and VXCdot_ao_ao for the mixed precision
+ * numerical integration.  The AO functions of the significant shells are
+ * packed in the same way as in the float64 kernels.
+ */
+static void _spack_ao(float *out, float *ao, int *idx, int nidx,
+                      int ngrids, int bgrids)
+{
+        int k, j;
+        float *pao;
+        for (k = 0; k < nidx; k++) {
+                pao = ao + (size_t)idx[k] * ngrids;
+                for (j = 0; j < bgrids; j++) {
+                        out[k*bgrids+j] = pao[j];
+                }
+        }
+}
+
+static void sdot_ao_dm(float *vm, float *ao, float *dm,
+                       int nao, int nocc, int ngrids, int bgrids,
+                       unsigned char *non0table, int *shls_slice, int *ao_loc,
+                       int *idx, float *buf)
+{
+        const char TRANS_T = 'T';
+        const char TRANS_N = 'N';
+        const float D0 = 0;
+        const float D1 = 1;
+        int nidx = VXCao_nonzero_index(idx, non0table, shls_slice, ao_loc);
+        int i, j, k, i0, di;
+
+        if (nidx < 0 || nidx == nao) {
+                sgemm_(&TRANS_N, &TRANS_T, &bgrids, &nocc, &nao,
+                       &D1, ao, &ngrids, dm, &nocc, &D0, vm, &ngrids);
+        } else if (nidx == 0) {
+                for (i = 0; i < nocc; i++) {
+                        for (j = 0; j < bgrids; j++) {
+                                vm[i*ngrids+j] = 0;
+                        }
+                }
+        } else {
+                float *ao_pack = buf;
+                float *dm_pack = buf + (size_t)nidx * bgrids;
+                _spack_ao(ao_pack, ao, idx, nidx, ngrids, bgrids);
+                for (i0 = 0; i0 < nocc; i0 += PACKSIZE) {
+                        di = MIN(nocc-i0, PACKSIZE);
+                        for (k = 0; k < nidx; k++) {
+                                for (i = 0; i < di; i++) {
+                                        dm_pack[k*di+i] = dm[(size_t)idx[k]*nocc+i0+i];
+                                }
+                        }
+                        sgemm_(&TRANS_N, &TRANS_T, &bgrids, &di, &nidx,
+                               &D1, ao_pack, &bgrids, dm_pack, &di,
+                               &D0, vm+(size_t)i0*ngrids, &ngrids);
+                }
+        }
+}
+
+/* vm[nocc,ngrids] = ao[i,ngrids] * dm[i,nocc] */
+void VXCsdot_ao_dm(float *vm, float *ao, float *dm,
+                   int nao, int nocc, int ngrids, int nbas,
+                   unsigned char *non0table, int *shls_slice, int *ao_loc)
+{
+        const int nblk = (ngrids+BLKSIZE-1) / BLKSIZE;
+
+#pragma omp parallel
+{
+        int ip, ib;
+        int *idx = malloc(sizeof(int) * (nao+1));
+        float *buf = malloc(sizeof(float) * ((size_t)nao*(BLKSIZE+PACKSIZE)+2));
+#pragma omp for nowait schedule(static)
+        for (ib = 0; ib < nblk; ib++) {
+                ip = ib * BLKSIZE;
+                sdot_ao_dm(vm+ip, ao+ip, dm,
+                           nao, nocc, ngrids, MIN(ngrids-ip, BLKSIZE),
+                           non0table+ib*nbas, shls_slice, ao_loc, idx, buf);
+        }
+        free(idx);
+        free(buf);
+}
+}
+
+static void sdot_ao_ao(float *vv, float *ao1, float *ao2,
+                       int nao, int ngrids, int bgrids, int hermi,
+                       unsigned char *non0table, int *shls_slice, int *ao_loc,
+                       int *idx, float *buf)
+{
+        const char TRANS_T = 'T';
+        const char TRANS_N = 'N';
+        const float D0 = 0;
+        const float D1 = 1;
+        int nidx = VXCao_nonzero_index(idx, non0table, shls_slice, ao_loc);
+        int i, j, i0, di, j1;
+
+        if (nidx < 0 || nidx == nao) {
+                sgemm_(&TRANS_T, &TRANS_N, &nao, &nao, &bgrids,
+                       &D1, ao2, &ngrids, ao1, &ngrids, &D1, vv, &nao);
+        } else if (nidx > 0) {
+                float *ao1_pack = buf;
+                float *ao2_pack = ao1_pack + (size_t)nidx * bgrids;
+                float *vv_pack = ao2_pack + (size_t)nidx * bgrids;
+                float *pvv;
+                _spack_ao(ao1_pack, ao1, idx, nidx, ngrids, bgrids);
+                if (ao2 == ao1) {
+                        ao2_pack = ao1_pack;
+                } else {
+                        _spack_ao(ao2_pack, ao2, idx, nidx, ngrids, bgrids);
+                }
+                for (i0 = 0; i0 < nidx; i0 += PACKSIZE) {
+                        di = MIN(nidx-i0, PACKSIZE);
+                        // Only the lower triangular part is needed if hermi
+                        j1 = hermi ? i0 + di : nidx;
+                        sgemm_(&TRANS_T, &TRANS_N, &j1, &di, &bgrids,
+                               &D1, ao2_pack, &bgrids, ao1_pack+(size_t)i0*bgrids, &bgrids,
+                               &D0, vv_pack, &j1);
+                        for (i = 0; i < di; i++) {
+                                pvv = vv + (size_t)idx[i0+i] * nao;
+                                for (j = 0; j < j1; j++) {
+                                        pvv[idx[j]] += vv_pack[i*j1+j];
+                                }
+                        }
+                }
+        }
+}
+
+/* vv[nao,nao] = ao1[i,nao] * ao2[i,nao] */
+void VXCsdot_ao_ao(float *vv, float *ao1, float *ao2,
+                   int nao, int ngrids, int nbas, int hermi,
+                   unsigned char *non0table, int *shls_slice, int *ao_loc)
+{
+        const int nblk = (ngrids+BLKSIZE-1) / BLKSIZE;
+        memset(vv, 0, sizeof(float) * nao * nao);
+
+#pragma omp parallel
+{
+        int ip, ib;
+        float *v_priv = calloc(nao*nao+2, sizeof(float));
+        int *idx = malloc(sizeof(int) * (nao+1));
+        float *buf = malloc(sizeof(float) * ((size_t)nao*(BLKSIZE*2+PACKSIZE)+2));
+#pragma omp for nowait schedule(static)
+        for (ib = 0; ib < nblk; ib++) {
+                ip = ib * BLKSIZE;
+                sdot_ao_ao(v_priv, ao1+ip, ao2+ip,
+                           nao, ngrids, MIN(ngrids-ip, BLKSIZE), hermi,
+                           non0table+ib*nbas, shls_slice, ao_loc, idx, buf);
+        }
+#pragma omp critical
+        {
+                for (ip = 0; ip < nao*nao; ip++) {
+                        vv[ip] += v_priv[ip];
+                }
+        }
+        free(v_priv);
+        free(idx);
+        free(buf);
+}
+        if (hermi != 0) {
+                size_t i, j;
+                for (i = 0; i < nao; i++) {
+                for (j = i+1; j < nao; j++) {
+                        vv[i*nao+j] = vv[j*nao+i];
+                } }
+        }
+}
+
 // 'nip,np->ip'
 void VXC_dscale_ao(double *aow, double *ao, double *wv,
                    int comp, int nao, int ngrids)
@@ -277,3 +502,139 @@ void VXC_vv10nlc(double *Fvec, double *Uvec, double *Wvec,
         }
 }
 }
+
+/*
+ * VV10 kernel with a real space cutoff.  The vvcoords are sorted in a cell
+ * list (cell edges >= cutoff) so that only the vv grids in the 27 cells
+ * around each grid are visited.  Pairs with distance > cutoff are
+ * neglected.
+ */
+void VXC_vv10nlc_cutoff(double *Fvec, double *Uvec, double *Wvec,
+                        double *vvcoords, double *coords,
+                        double *W0p, double *W0, double *K, double *Kp, double *RpW,
+                        int vvngrids, int ngrids, double cutoff)
+{
+        if (vvngrids == 0) {
+                int i;
+                for (i = 0; i < ngrids; i++) {
+                        Fvec[i] = 0;
+                        Uvec[i] = 0;
+                        Wvec[i] = 0;
+                }
+                return;
+        }
+
+        double lower[3], upper[3];
+        int i, j, k;
+        for (k = 0; k < 3; k++) {
+                lower[k] = vvcoords[k];
+                upper[k] = vvcoords[k];
+        }
+        for (j = 1; j < vvngrids; j++) {
+                for (k = 0; k < 3; k++) {
+                        lower[k] = MIN(lower[k], vvcoords[j*3+k]);
+                        upper[k] = MAX(upper[k], vvcoords[j*3+k]);
+                }
+        }
+        // Limit the number of cells to ~ the number of vv grids
+        double cell_size = cutoff;
+        int ncell[3];
+        size_t tot_cells;
+        while (1) {
+                tot_cells = 1;
+                for (k = 0; k < 3; k++) {
+                        ncell[k] = (int)((upper[k] - lower[k]) / cell_size) + 1;
+                        tot_cells *= ncell[k];
+                }
+                if (tot_cells <= (size_t)vvngrids + 64) {
+                        break;
+                }
+                cell_size *= 1.26;
+        }
+
+        int *cell_id = malloc(sizeof(int) * vvngrids);
+        int *cell_start = calloc(tot_cells+1, sizeof(int));
+        int *order = malloc(sizeof(int) * vvngrids);
+        int c[3];
+        for (j = 0; j < vvngrids; j++) {
+                for (k = 0; k < 3; k++) {
+                        c[k] = (int)((vvcoords[j*3+k] - lower[k]) / cell_size);
+                        c[k] = MIN(c[k], ncell[k]-1);
+                }
+                cell_id[j] = (c[0] * ncell[1] + c[1]) * ncell[2] + c[2];
+                cell_start[cell_id[j]+1]++;
+        }
+        for (i = 0; i < tot_cells; i++) {
+                cell_start[i+1] += cell_start[i];
+        }
+        int *fill = malloc(sizeof(int) * (tot_cells+1));
+        memcpy(fill, cell_start, sizeof(int) * (tot_cells+1));
+        for (j = 0; j < vvngrids; j++) {
+                order[fill[cell_id[j]]] = j;
+                fill[cell_id[j]]++;
+        }
+        free(fill);
+
+        // Pack the vv grids in the cell order
+        double *vvpack = malloc(sizeof(double) * vvngrids * 6);
+        for (i = 0; i < vvngrids; i++) {
+                j = order[i];
+                vvpack[i*6+0] = vvcoords[j*3+0];
+                vvpack[i*6+1] = vvcoords[j*3+1];
+                vvpack[i*6+2] = vvcoords[j*3+2];
+                vvpack[i*6+3] = W0p[j];
+                vvpack[i*6+4] = Kp[j];
+                vvpack[i*6+5] = RpW[j];
+        }
+        const double cutoff2 = cutoff * cutoff;
+
+#pragma omp parallel private(i, j, k)
+{
+        double DX, DY, DZ, R2;
+        double gp, g, gt, T, F, U, W;
+        int ci[3], c0[3], c1[3];
+        int ix, iy, iz, icell, p;
+        double *pv;
+#pragma omp for schedule(dynamic, 64)
+        for (i = 0; i < ngrids; i++) {
+                F = 0;
+                U = 0;
+                W = 0;
+                for (k = 0; k < 3; k++) {
+                        ci[k] = (int)floor((coords[i*3+k] - lower[k]) / cell_size);
+                        c0[k] = MAX(ci[k] - 1, 0);
+                        c1[k] = MIN(ci[k] + 2, ncell[k]);
+                }
+                for (ix = c0[0]; ix < c1[0]; ix++) {
+                for (iy = c0[1]; iy < c1[1]; iy++) {
+                for (iz = c0[2]; iz < c1[2]; iz++) {
+                        icell = (ix * ncell[1] + iy) * ncell[2] + iz;
+                        for (p = cell_start[icell]; p < cell_start[icell+1]; p++) {
+                                pv = vvpack + p * 6;
+                                DX = pv[0] - coords[i*3+0];
+                                DY = pv[1] - coords[i*3+1];
+                                DZ = pv[2] - coords[i*3+2];
+                                R2 = DX*DX + DY*DY + DZ*DZ;
+                                if (R2 > cutoff2) {
+                                        continue;
+                                }
+                                gp = R2*pv[3] + pv[4];
+                                g  = R2*W0[i] + K[i];
+                                gt = g + gp;
+                                T = pv[5] / (g*gp*gt);
+                                F += T;
+                                T *= 1./g + 1./gt;
+                                U += T;
+                                W += T * R2;
+                        }
+                } } }
+                Fvec[i] = F * -1.5;
+                Uvec[i] = U;
+                Wvec[i] = W;
+        }
+}
+        free(cell_id);
+        free(cell_start);
+        free(order);
+        free(vvpack);
+}
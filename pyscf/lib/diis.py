@@ -21,11 +21,13 @@ DIIS
 """
 
 import sys
+import tempfile
 import numpy
 import scipy.linalg
 from pyscf.lib import logger
 from pyscf.lib import misc
 from pyscf.lib import numpy_helper
+from pyscf.lib import param
 from pyscf import __config__
 
 INCORE_SIZE = getattr(__config__, 'lib_diis_incore_size', 10000000)  # 80 MB
@@ -44,6 +46,14 @@ class DIIS(object):
             DIIS subspace size. The maximum number of the vectors to be stored.
         min_space
             The minimal size of subspace before DIIS extrapolation.
+        memmap : bool
+            For the vectors which do not fit in memory, whether to store them
+            in memory-mapped ring buffers instead of an HDF5 file.  The data
+            are written to the buffers in background threads, and the
+            vectors are read from the buffers without copying.  The vectors
+            given to or returned by :func:`update` should not be modified in
+            place before the next call to :func:`update`.  It is not used if
+            filename is specified (to save the DIIS states for restart).
 
     Functions:
         update(x, xerr=None) :
@@ -97,6 +107,8 @@ class DIIS(object):
     E_5 = -1.100153764878
     E_6 = -1.100153764878
     '''
+    memmap = getattr(__config__, 'lib_diis_DIIS_memmap', False)
+
     def __init__(self, dev=None, filename=None,
                  incore=getattr(__config__, 'lib_diis_DIIS_incore', False)):
         if dev is not None:
@@ -113,6 +125,7 @@ class DIIS(object):
 # don't modify the following private variables, they are not input options
         self.filename = filename
         self._diisfile = None
+        self._mmap = None
         self._buffer = {}
         self._bookkeep = [] # keep the ordering of input vectors
         self._head = 0
@@ -125,6 +138,12 @@ class DIIS(object):
         if incore:
             self._buffer[key] = value
 
+        if self._use_mmap(value.size):
+            if self._mmap is None:
+                self._mmap = _MemmapRingBuffer(self.space, value.size, value.dtype)
+            self._mmap.store(key, value)
+            return
+
         # save the error vector if filename is given, this file can be used to
         # restore the DIIS state
         if (not incore) or isinstance(self.filename, str):
@@ -138,6 +157,18 @@ class DIIS(object):
 # file from a crashed claculation
             self._diisfile.flush()
 
+    def _use_mmap(self, size):
+        return (self.memmap and not (size < INCORE_SIZE or self.incore) and
+                not isinstance(self.filename, str))
+
+    def _load(self, key):
+        if key in self._buffer:
+            return self._buffer[key]
+        elif self._mmap is not None:
+            return self._mmap.load(key)
+        else:
+            return self._diisfile[key]
+
     def push_err_vec(self, xerr):
         self._err_vec_touched = True
         if self._head >= self.space:
@@ -164,7 +195,7 @@ class DIIS(object):
             self._xprev = x
             self._store('xprev', x)
             if 'xprev' not in self._buffer:  # not incore
-                self._xprev = self._diisfile['xprev']
+                self._xprev = self._load('xprev')
 
         else:
             if self._head >= self.space:
@@ -175,6 +206,10 @@ class DIIS(object):
             self._store(xkey, x)
             if x.size < INCORE_SIZE or self.incore:
                 self._store(ekey, x - numpy.asarray(self._xprev))
+            elif self._mmap is not None:
+                edat = self._mmap.row(ekey)
+                for p0, p1 in misc.prange(0, x.size, BLOCK_SIZE):
+                    edat[p0:p1] = x[p0:p1] - self._xprev[p0:p1]
             else:  # not call _store to reduce memory footprint
                 if ekey not in self._diisfile:
                     self._diisfile.create_dataset(ekey, (x.size,), x.dtype)
@@ -187,12 +222,16 @@ class DIIS(object):
     def get_err_vec(self, idx):
         if self._buffer:
             return self._buffer['e%d'%idx]
+        elif self._mmap is not None:
+            return self._mmap.load('e%d'%idx)
         else:
             return self._diisfile['e%d'%idx]
 
     def get_vec(self, idx):
         if self._buffer:
             return self._buffer['x%d'%idx]
+        elif self._mmap is not None:
+            return self._mmap.load('x%d'%idx)
         else:
             return self._diisfile['x%d'%idx]
 
@@ -209,6 +248,13 @@ class DIIS(object):
         the current given vector and the last given vector as the error
         vector to extrapolate the vector.
         '''
+        if self._mmap is not None:
+            # Complete the background writes of the last iteration and
+            # release the in-memory copies of the vectors
+            self._mmap.wait()
+            if self._xprev is not None:
+                self._xprev = self._mmap.load('xprev')
+
         if xerr is not None:
             self.push_err_vec(xerr)
         self.push_vec(x)
@@ -238,7 +284,7 @@ class DIIS(object):
 
             self._store('xprev', xnew)
             if 'xprev' not in self._buffer:  # not incore
-                self._xprev = self._diisfile['xprev']
+                self._xprev = self._load('xprev')
         return xnew.reshape(x.shape)
 
     def extrapolate(self, nd=None):
@@ -339,3 +385,67 @@ def restore(filename):
     '''Restore/construct diis object based on a diis file'''
     return DIIS().restore(filename)
 
+
+def _copy_blocks(dest, src):
+    for p0, p1 in misc.prange(0, src.size, BLOCK_SIZE):
+        dest[p0:p1] = src[p0:p1]
+
+class _MemmapRingBuffer(object):
+    '''Preallocated buffers on a memory-mapped file to hold space vectors,
+    space error vectors and the previous vector of DIIS.  The vectors are
+    written in background threads.  Until a write finishes, load returns the
+    array being written.
+    '''
+    def __init__(self, space, size, dtype):
+        self.space = space
+        self._tmpfile = tempfile.NamedTemporaryFile(dir=param.TMPDIR)
+        self._map = numpy.memmap(self._tmpfile.name, dtype=dtype, mode='w+',
+                                 shape=(space*2+1, size))
+        self._pending = {}
+
+    def _index(self, key):
+        if key == 'xprev':
+            return self.space * 2
+        elif key[0] == 'x':
+            return int(key[1:])
+        else:
+            return self.space + int(key[1:])
+
+    def wait(self, key=None):
+        '''Wait for the background writes to finish'''
+        if key is None:
+            keys = list(self._pending.keys())
+        else:
+            keys = [key]
+        for k in keys:
+            if k in self._pending:
+                thread = self._pending.pop(k)[1]
+                if thread is not None:
+                    thread.join()
+
+    def row(self, key):
+        self.wait(key)
+        return self._map[self._index(key)]
+
+    def store(self, key, value):
+        dest = self.row(key)
+        if misc.ASYNC_IO:
+            thread = misc.ThreadWithTraceBack(target=_copy_blocks,
+                                              args=(dest, value))
+            thread.start()
+            self._pending[key] = (value, thread)
+        else:
+            _copy_blocks(dest, value)
+
+    def load(self, key):
+        if key in self._pending:
+            return self._pending[key][0]
+        else:
+            return self._map[self._index(key)]
+
+    def __del__(self):
+        try:
+            self.wait()
+        except Exception:
+            pass
+
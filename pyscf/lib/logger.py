@@ -75,10 +75,29 @@ control at which level the timing information should be output.  It is 5
 >>> log.timer('test', t0)
     CPU time for test      0.00 sec
 
+
+profiler
+--------
+:attr:`profiler` records the CPU time, wall time, number of calls and the
+change of memory usage for the named stages of a calculation.  Stages are
+labelled with the context manager (or function decorator) :class:`profile`.
+Nested stages are recorded by their paths, e.g. "scf;get_veff;get_jk".
+Profiling is disabled by default.  It can be switched on by
+:attr:`profiler.enabled` or the config option PROFILE.
+
+>>> from pyscf import lib
+>>> lib.logger.profiler.enabled = True
+>>> with lib.logger.profile('test'):
+...     pass
+>>> lib.logger.profiler.dump_json('scf.json')
+>>> lib.logger.profiler.dump_folded('scf.folded')  # input of flamegraph.pl
+
 '''
 
 import sys
 import time
+import json
+import functools
 if sys.version_info >= (3,6):
     time.clock = time.process_time
 
@@ -103,6 +122,7 @@ ALERT  = param.VERBOSE_ALERT
 PANIC  = param.VERBOSE_PANIC
 
 TIMER_LEVEL  = getattr(pyscf.__config__, 'TIMER_LEVEL', DEBUG)
+PROFILE = getattr(pyscf.__config__, 'PROFILE', False)
 
 sys.verbose = NOTE
 
@@ -233,3 +253,119 @@ def new_logger(rec=None, verbose=None):
         log = Logger(rec.stdout, rec.verbose)
     return log
 
+
+
+class Profiler(object):
+    '''Registry of the timing and memory usage of the profiled stages.
+
+    Attributes:
+        enabled : bool
+            Whether to record the stages labelled by :class:`profile`.
+        records : dict
+            Keys are the paths of the nested stages joined by ";".  Each value
+            is a dict of the number of calls, the accumulated CPU time and wall
+            time (in seconds) and the accumulated change of memory (in MB).
+    '''
+    def __init__(self, enabled=PROFILE):
+        self.enabled = enabled
+        self.clear()
+
+    def clear(self):
+        self.records = {}
+        self._stack = []
+        return self
+
+    def enter(self, stage):
+        if not self.enabled:
+            return
+        if self._stack and self._stack[-1][0] == stage:
+            # Recursive calls (e.g. RHF.get_jk -> SCF.get_jk) are merged
+            self._stack.append((stage, None))
+        else:
+            from pyscf.lib.misc import current_memory
+            self._stack.append((stage, (time.clock(), time.time(),
+                                        current_memory()[0])))
+
+    def exit(self):
+        if not self.enabled or not self._stack:
+            return
+        stage, t0 = self._stack.pop()
+        if t0 is None:
+            return
+        from pyscf.lib.misc import current_memory
+        cpu0, wall0, mem0 = t0
+        path = ';'.join([x[0] for x in self._stack if x[1] is not None] + [stage])
+        if path not in self.records:
+            self.records[path] = {'count': 0, 'cpu': 0., 'wall': 0., 'memory': 0.}
+        rec = self.records[path]
+        rec['count'] += 1
+        rec['cpu'] += time.clock() - cpu0
+        rec['wall'] += time.time() - wall0
+        rec['memory'] += current_memory()[0] - mem0
+
+    def dump_json(self, filename=None):
+        '''Export the records in JSON format.  If filename is not given, the
+        JSON string is returned.'''
+        if filename is None:
+            return json.dumps(self.records, sort_keys=True)
+        with open(filename, 'w') as f:
+            json.dump(self.records, f, sort_keys=True, indent=1)
+
+    def dump_folded(self, filename=None):
+        '''Export the wall time of each stage (excluding the time of the
+        nested stages) in the folded stack format which is read by the flame
+        graph tools (e.g. flamegraph.pl).  The unit of the time is
+        microsecond.  If filename is not given, the text is returned.
+        '''
+        self_time = dict((path, rec['wall'])
+                         for path, rec in self.records.items())
+        for path, rec in self.records.items():
+            parent = path.rsplit(';', 1)[0]
+            if parent != path and parent in self_time:
+                self_time[parent] -= rec['wall']
+        lines = ['%s %d' % (path, max(0, t*1e6))
+                 for path, t in sorted(self_time.items())]
+        text = '\n'.join(lines)
+        if filename is None:
+            return text
+        with open(filename, 'w') as f:
+            f.write(text + '\n')
+
+    def report(self, rec, verbose=INFO):
+        '''Print the summary of the records to the output of rec'''
+        log = new_logger(rec, verbose)
+        log.info('%-50s %8s %10s %10s %10s', 'stage', 'calls',
+                 'CPU (s)', 'wall (s)', 'mem (MB)')
+        for path, r in sorted(self.records.items()):
+            log.info('%-50s %8d %10.2f %10.2f %10.2f', path, r['count'],
+                     r['cpu'], r['wall'], r['memory'])
+
+profiler = Profiler()
+
+class profile(object):
+    '''Context manager (or function decorator) to record a stage in
+    :attr:`profiler`
+
+    Examples:
+
+    >>> with lib.logger.profile('get_jk'):
+    ...     vj, vk = mf.get_jk()
+    >>> @lib.logger.profile('eig')
+    ... def eig(h, s): ...
+    '''
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        profiler.enter(self.stage)
+        return self
+
+    def __exit__(self, type, value, traceback):
+        profiler.exit()
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def profiled_fn(*args, **kwargs):
+            with self:
+                return fn(*args, **kwargs)
+        return profiled_fn
@@ -60,6 +60,23 @@ class KnownValues(unittest.TestCase):
         self.assertTrue(numpy.all(a['x'][1] == dat['x'][1]))
         self.assertTrue(numpy.all(a['y'][0] == dat['y'][0]))
 
+    def test_dump_async(self):
+        fchk = tempfile.NamedTemporaryFile()
+        a = numpy.zeros(4)
+        for i in range(5):
+            a[:] = i
+            lib.chkfile.dump_async(fchk.name, 'a', lib.chkfile.save,
+                                   fchk.name, 'a', {'x': a})
+        a[:] = -1
+        dat = lib.chkfile.load(fchk.name, 'a/x')
+        self.assertTrue(numpy.all(dat == 4))
+
+        def fail():
+            raise RuntimeError
+        lib.chkfile.dump_async(fchk.name, 'b', fail)
+        self.assertRaises(RuntimeError, lib.chkfile.flush, fchk.name)
+        lib.chkfile.flush()
+
 
 if __name__ == "__main__":
     print("Full Tests for lib.chkfile")
@@ -75,6 +75,30 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual(abs(a.dot(x) - b).max(), 0, 6)
         self.assertAlmostEqual(abs(x - numpy.linalg.solve(a,b)).max(), 0, 6)
 
+    def test_memmap(self):
+        a, b, adiag, arest, x0 = make_ab(16)
+        lib.diis.INCORE_SIZE, bak = 4, lib.diis.INCORE_SIZE
+        try:
+            for with_errvec in (False, True):
+                xs = []
+                for memmap in (False, True):
+                    ad = lib.diis.DIIS()
+                    ad.memmap = memmap
+                    ad.space = 4
+                    x = x0
+                    for i in range(12):
+                        e = b - a.dot(x)
+                        x = (b - arest.dot(x)) / adiag
+                        if with_errvec:
+                            x = ad.update(x, xerr=e)
+                        else:
+                            x = ad.update(x)
+                    xs.append(x)
+                self.assertTrue(ad._mmap is not None)
+                self.assertAlmostEqual(abs(xs[0] - xs[1]).max(), 0, 12)
+        finally:
+            lib.diis.INCORE_SIZE = bak
+
     def test_extrapolate(self):
         a, b, adiag, arest, x = make_ab(16)
         ad = lib.diis.DIIS()
@@ -30,6 +30,29 @@ class KnownValues(unittest.TestCase):
 
         self.assertRaises(lib.ThreadRuntimeError, bg_raise)
 
+    def test_profiler(self):
+        profiler = lib.logger.profiler
+        enabled = profiler.enabled
+        profiler.clear()
+        profiler.enabled = True
+
+        @lib.logger.profile('f1')
+        def f1(n):
+            if n > 0:
+                f1(n-1)
+
+        try:
+            with lib.logger.profile('f0'):
+                for i in range(3):
+                    f1(2)
+        finally:
+            profiler.enabled = enabled
+        self.assertEqual(sorted(profiler.records), ['f0', 'f0;f1'])
+        self.assertEqual(profiler.records['f0;f1']['count'], 3)
+        folded = profiler.dump_folded().splitlines()
+        self.assertEqual([x.split()[0] for x in folded], ['f0', 'f0;f1'])
+        profiler.clear()
+
     def test_index_tril_to_pair(self):
         i_j = (numpy.random.random((2,30)) * 100).astype(int)
         i0 = numpy.max(i_j, axis=0)
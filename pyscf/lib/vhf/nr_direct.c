@@ -33,6 +33,7 @@ int GTOmax_cache_size(int (*intor)(), int *shls_slice, int ncenter,
 #define AO_BLOCK_SIZE   32
 
 #define MIN(I,J)        ((I) < (J) ? (I) : (J))
+#define MAX(I,J)        ((I) > (J) ? (I) : (J))
 
 #define DECLARE_ALL \
         const int *atm = envs->atm; \
@@ -433,3 +434,273 @@ void CVHFnr_direct_drv(int (*intor)(), void (*fdot)(), JKOperator **jkop,
         free(block_iloc);
 }
 
+
+
+/*
+ * LinK (linear exchange) screening for the exchange matrix of hermitian
+ * density matrices, K_il = sum_jk (ij|kl) D_jk.
+ *
+ * For each shell i, the partners j of the significant bra pairs are sorted by
+ * the Schwarz bound q_cond[ij] in descending order.  For each shell j, the
+ * shells k are sorted by dm_cond[jk] in descending order.  The loops over k
+ * and l are terminated as soon as the estimation q_cond[ij]*dm_cond[jk]*
+ * q_cond[kl] drops below direct_scf_cutoff, so that the number of computed
+ * integrals grows linearly with the system size for gapped systems.
+ *
+ * By the 8-fold permutation symmetry, the integral (ij|kl) contributes to
+ * K_il, K_ik, K_jl and K_jk, and the loops visit it once for each of these
+ * elements.  The integral is evaluated only at the visit of the largest
+ * estimation (see _link_owner) and added to all these elements of the lower
+ * triangular part (i >= l) of vk.  vk needs to be initialized to zero.  See
+ * Ochsenfeld, White, Head-Gordon, JCP 109, 1663 (1998).
+ */
+typedef struct {
+        int idx;
+        double val;
+} LinKPair;
+
+static int _linkpair_descending(const void *a, const void *b)
+{
+        double va = ((LinKPair *)a)->val;
+        double vb = ((LinKPair *)b)->val;
+        if (va > vb) {
+                return -1;
+        } else if (va < vb) {
+                return 1;
+        } else {
+                return 0;
+        }
+}
+
+/*
+ * For each row i of cond, sort the elements which are larger than cutoff.
+ * Return the offsets of each row in loc (size n+1).
+ */
+static LinKPair *_link_sorted_lists(int *loc, double *cond, int n, double cutoff)
+{
+        size_t count = 0;
+        int i, j;
+        for (i = 0; i < n*n; i++) {
+                if (cond[i] > cutoff) {
+                        count++;
+                }
+        }
+        LinKPair *lst = malloc(sizeof(LinKPair) * (count+1));
+        count = 0;
+        for (i = 0; i < n; i++) {
+                loc[i] = count;
+                for (j = 0; j < n; j++) {
+                        if (cond[i*n+j] > cutoff) {
+                                lst[count].idx = j;
+                                lst[count].val = cond[i*n+j];
+                                count++;
+                        }
+                }
+                qsort(lst+loc[i], count-loc[i], sizeof(LinKPair),
+                      _linkpair_descending);
+        }
+        loc[n] = count;
+        return lst;
+}
+
+/*
+ * The permutations (a,b,c,d) of the shell quartet (ij|kl) which give the
+ * same integral (ab|cd).  The integral contributes D_bc to K_ad.
+ */
+static const int _link_perms[8][4] = {
+        {0, 1, 2, 3}, {1, 0, 2, 3}, {0, 1, 3, 2}, {1, 0, 3, 2},
+        {2, 3, 0, 1}, {3, 2, 0, 1}, {2, 3, 1, 0}, {3, 2, 1, 0},
+};
+
+/*
+ * Collect the distinct permutations of the shell quartet shls which
+ * contribute to the lower triangular part (a >= d) of K.  Return the number
+ * of these permutations, which are saved in perms.  Return 0 if another
+ * permutation has a larger estimation q_cond[ab]*dm_cond[bc]*q_cond[cd] than
+ * shls.  The integrals are then evaluated when the loops visit that
+ * permutation.
+ */
+static int _link_owner(int (*perms)[4], int *shls, double *q_cond,
+                       double *dm_cond, int nbas)
+{
+        int n = 0;
+        int owner = 0;
+        double est_max = 0;
+        int p, m, a, b, c, d;
+        int quartets[8][4];
+        double est;
+        for (p = 0; p < 8; p++) {
+                a = shls[_link_perms[p][0]];
+                b = shls[_link_perms[p][1]];
+                c = shls[_link_perms[p][2]];
+                d = shls[_link_perms[p][3]];
+                if (a < d) {
+                        continue;
+                }
+                for (m = 0; m < n; m++) {
+                        if (quartets[m][0] == a && quartets[m][1] == b &&
+                            quartets[m][2] == c && quartets[m][3] == d) {
+                                break;
+                        }
+                }
+                if (m < n) {
+                        continue;
+                }
+                quartets[n][0] = a;
+                quartets[n][1] = b;
+                quartets[n][2] = c;
+                quartets[n][3] = d;
+                memcpy(perms[n], _link_perms[p], sizeof(int) * 4);
+                // The same order of the multiplications as in the loops of
+                // CVHFnr_direct_link_drv.  Ties are resolved by the order of
+                // the shell indices.
+                est = q_cond[a*nbas+b] * dm_cond[b*nbas+c];
+                est = est * q_cond[c*nbas+d];
+                if (n == 0 || est > est_max ||
+                    (est == est_max &&
+                     memcmp(quartets[n], quartets[owner], sizeof(int)*4) > 0)) {
+                        est_max = est;
+                        owner = n;
+                }
+                n++;
+        }
+        // perms[0] is the identity permutation (ish >= lsh in the loops)
+        if (owner != 0) {
+                return 0;
+        }
+        return n;
+}
+
+/* eri in Fortran order; dm, vk in C order */
+static void _link_dot(double *eri, double **dms, double **vks, int n_dm,
+                      size_t nao, int *shls, int *ao_loc,
+                      int (*perms)[4], int nperm)
+{
+        int i0 = ao_loc[shls[0]];
+        int i1 = ao_loc[shls[0]+1];
+        int j0 = ao_loc[shls[1]];
+        int j1 = ao_loc[shls[1]+1];
+        int k0 = ao_loc[shls[2]];
+        int k1 = ao_loc[shls[2]+1];
+        int l0 = ao_loc[shls[3]];
+        int l1 = ao_loc[shls[3]+1];
+        int idx[4];
+        int i, j, k, l, n, p, idm;
+        double *vk, *dm;
+        for (idm = 0; idm < n_dm; idm++) {
+                vk = vks[idm];
+                dm = dms[idm];
+                n = 0;
+                for (l = l0; l < l1; l++) {
+                for (k = k0; k < k1; k++) {
+                for (j = j0; j < j1; j++) {
+                for (i = i0; i < i1; i++, n++) {
+                        idx[0] = i;
+                        idx[1] = j;
+                        idx[2] = k;
+                        idx[3] = l;
+                        for (p = 0; p < nperm; p++) {
+                                vk[idx[perms[p][0]]*nao+idx[perms[p][3]]] +=
+                                        eri[n] * dm[idx[perms[p][1]]*nao+idx[perms[p][2]]];
+                        }
+                } } } }
+        }
+}
+
+void CVHFnr_direct_link_drv(int (*intor)(), double **dms, double **vks, int n_dm,
+                            int *ao_loc, CINTOpt *cintopt, CVHFOpt *vhfopt,
+                            int *atm, int natm, int *bas, int nbas, double *env)
+{
+        assert(vhfopt->q_cond);
+        assert(vhfopt->dm_cond);
+        const size_t nao = ao_loc[nbas];
+        const double cutoff = vhfopt->direct_scf_cutoff;
+        double *q_cond = vhfopt->q_cond;
+        double *dm_cond = vhfopt->dm_cond;
+        double qmax = 0;
+        double dmax = 0;
+        int i;
+        for (i = 0; i < nbas*nbas; i++) {
+                qmax = MAX(qmax, q_cond[i]);
+                dmax = MAX(dmax, dm_cond[i]);
+        }
+
+        int *pair_loc = malloc(sizeof(int) * (nbas+1) * 2);
+        int *dm_loc = pair_loc + nbas + 1;
+        LinKPair *pairs = _link_sorted_lists(pair_loc, q_cond, nbas,
+                                             cutoff/(qmax*dmax+1e-300));
+        LinKPair *dm_pairs = _link_sorted_lists(dm_loc, dm_cond, nbas,
+                                                cutoff/(qmax*qmax+1e-300));
+
+        int shls_slice[] = {0, nbas, 0, nbas, 0, nbas, 0, nbas};
+        const int di = GTOmax_shell_dim(ao_loc, shls_slice, 4);
+        const int cache_size = GTOmax_cache_size(intor, shls_slice, 4,
+                                                 atm, natm, bas, nbas, env);
+
+#pragma omp parallel
+{
+        int ish, jsh, ksh, lsh, jp, kp, lp, idm, nperm;
+        int shls[4];
+        int perms[8][4];
+        double qij, qijdjk;
+        size_t n;
+        double *vk_priv[n_dm];
+        for (idm = 0; idm < n_dm; idm++) {
+                vk_priv[idm] = calloc(nao*nao, sizeof(double));
+        }
+        double *buf = malloc(sizeof(double) * (di*di*di*di + cache_size));
+        double *cache = buf + di*di*di*di;
+#pragma omp for nowait schedule(dynamic, 1)
+        for (ish = 0; ish < nbas; ish++) {
+                for (jp = pair_loc[ish]; jp < pair_loc[ish+1]; jp++) {
+                        jsh = pairs[jp].idx;
+                        qij = pairs[jp].val;
+                        if (qij * dmax * qmax < cutoff) {
+                                break;
+                        }
+                        for (kp = dm_loc[jsh]; kp < dm_loc[jsh+1]; kp++) {
+                                ksh = dm_pairs[kp].idx;
+                                qijdjk = qij * dm_pairs[kp].val;
+                                if (qijdjk * qmax < cutoff) {
+                                        break;
+                                }
+                                for (lp = pair_loc[ksh]; lp < pair_loc[ksh+1]; lp++) {
+                                        if (qijdjk * pairs[lp].val < cutoff) {
+                                                break;
+                                        }
+                                        lsh = pairs[lp].idx;
+                                        if (lsh > ish) {
+                                                continue;
+                                        }
+                                        shls[0] = ish;
+                                        shls[1] = jsh;
+                                        shls[2] = ksh;
+                                        shls[3] = lsh;
+                                        nperm = _link_owner(perms, shls, q_cond,
+                                                            dm_cond, nbas);
+                                        if (nperm == 0 ||
+                                            !(*intor)(buf, NULL, shls, atm, natm,
+                                                      bas, nbas, env, cintopt, cache)) {
+                                                continue;
+                                        }
+                                        _link_dot(buf, dms, vk_priv, n_dm, nao,
+                                                  shls, ao_loc, perms, nperm);
+                                }
+                        }
+                }
+        }
+        free(buf);
+// The integrals are scattered to the rows of the other shells.  Each thread
+// accumulates vk in its private buffer.
+#pragma omp critical
+        for (idm = 0; idm < n_dm; idm++) {
+                for (n = 0; n < nao*nao; n++) {
+                        vks[idm][n] += vk_priv[idm][n];
+                }
+                free(vk_priv[idm]);
+        }
+}
+        free(pairs);
+        free(dm_pairs);
+        free(pair_loc);
+}
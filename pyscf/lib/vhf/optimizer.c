@@ -17,6 +17,7 @@
  */
 
 #include <stdlib.h>
+#include <stdint.h>
 #include <string.h>
 #include <math.h>
 #include <assert.h>
@@ -29,6 +30,9 @@
 int int2e_sph();
 int GTOmax_cache_size(int (*intor)(), int *shls_slice, int ncenter,
                       int *atm, int natm, int *bas, int nbas, double *env);
+static void _set_int2e_q_cond(int (*intor)(), CINTOpt *cintopt, double *q_cond,
+                              int8_t *pair_mask, int *ao_loc, int *atm, int natm,
+                              int *bas, int nbas, double *env);
 
 void CVHFinit_optimizer(CVHFOpt **opt, int *atm, int natm,
                         int *bas, int nbas, double *env)
@@ -40,6 +44,9 @@ void CVHFinit_optimizer(CVHFOpt **opt, int *atm, int natm,
         opt0->dm_cond = NULL;
         opt0->fprescreen = &CVHFnoscreen;
         opt0->r_vkscreen = &CVHFr_vknoscreen;
+        opt0->nbox = 0;
+        opt0->box_of_pair = NULL;
+        opt0->box_near = NULL;
         *opt = opt0;
 }
 
@@ -56,6 +63,12 @@ void CVHFdel_optimizer(CVHFOpt **opt)
         if (!opt0->dm_cond) {
                 free(opt0->dm_cond);
         }
+        if (opt0->box_of_pair) {
+                free(opt0->box_of_pair);
+        }
+        if (opt0->box_near) {
+                free(opt0->box_near);
+        }
 
         free(opt0);
         *opt = NULL;
@@ -141,6 +154,27 @@ int CVHFnrs8_vj_prescreen(int *shls, CVHFOpt *opt,
             || (4*qijkl*opt->dm_cond[l*n+k] > direct_scf_cutoff));
 }
 
+/*
+ * Near field of CFMM.  The shell quartets are dropped unless the leaf boxes
+ * of the two shell pairs form a near-field box pair.  opt->box_of_pair holds
+ * the leaf box of each shell pair (-1 for the negligible shell pairs) and
+ * opt->box_near the mask of the near-field box pairs (see CVHFset_cfmm_boxes)
+ */
+int CVHFnrs8_cfmm_vj_prescreen(int *shls, CVHFOpt *opt,
+                               int *atm, int *bas, double *env)
+{
+        if (!opt) {
+                return 1; // no screen
+        }
+        int n = opt->nbas;
+        int bij = opt->box_of_pair[shls[0]*n+shls[1]];
+        int bkl = opt->box_of_pair[shls[2]*n+shls[3]];
+        if (bij < 0 || bkl < 0 || !opt->box_near[bij*opt->nbox+bkl]) {
+                return 0;
+        }
+        return CVHFnrs8_vj_prescreen(shls, opt, atm, bas, env);
+}
+
 int CVHFnrs8_vk_prescreen(int *shls, CVHFOpt *opt,
                           int *atm, int *bas, double *env)
 {
@@ -277,12 +311,38 @@ void CVHFsetnr_direct_scf(CVHFOpt *opt, int (*intor)(), CINTOpt *cintopt,
                              atm, natm, bas, nbas, env);
 }
 
+/*
+ * Recompute q_cond only for the shell pairs (ish,jsh) with pair_mask[ish,jsh] != 0.
+ * It is used to update the screening conditions when a few atoms are displaced.
+ */
+void CVHFupdate_nr_direct_scf(CVHFOpt *opt, int (*intor)(), CINTOpt *cintopt,
+                              int8_t *pair_mask, int *ao_loc, int *atm, int natm,
+                              int *bas, int nbas, double *env)
+{
+        if (!opt->q_cond) {
+                CVHFsetnr_direct_scf(opt, intor, cintopt, ao_loc,
+                                     atm, natm, bas, nbas, env);
+                return;
+        }
+        nbas = opt->nbas;
+        _set_int2e_q_cond(intor, cintopt, opt->q_cond, pair_mask, ao_loc,
+                          atm, natm, bas, nbas, env);
+}
+
 /*
  * Non-relativistic 2-electron integrals
  */
 void CVHFset_int2e_q_cond(int (*intor)(), CINTOpt *cintopt, double *q_cond,
                           int *ao_loc, int *atm, int natm,
                           int *bas, int nbas, double *env)
+{
+        _set_int2e_q_cond(intor, cintopt, q_cond, NULL, ao_loc,
+                          atm, natm, bas, nbas, env);
+}
+
+static void _set_int2e_q_cond(int (*intor)(), CINTOpt *cintopt, double *q_cond,
+                              int8_t *pair_mask, int *ao_loc, int *atm, int natm,
+                              int *bas, int nbas, double *env)
 {
         int shls_slice[] = {0, nbas};
         const int cache_size = GTOmax_cache_size(intor, shls_slice, 1,
@@ -303,6 +363,9 @@ void CVHFset_int2e_q_cond(int (*intor)(), CINTOpt *cintopt, double *q_cond,
         for (ij = 0; ij < nbas*(nbas+1)/2; ij++) {
                 ish = (int)(sqrt(2*ij+.25) - .5 + 1e-7);
                 jsh = ij - ish*(ish+1)/2;
+                if (pair_mask != NULL && !pair_mask[ish*nbas+jsh]) {
+                        continue;
+                }
                 di = ao_loc[ish+1] - ao_loc[ish];
                 dj = ao_loc[jsh+1] - ao_loc[jsh];
                 shls[0] = ish;
@@ -336,6 +399,27 @@ void CVHFset_q_cond(CVHFOpt *opt, double *q_cond, int len)
         memcpy(opt->q_cond, q_cond, sizeof(double) * len);
 }
 
+/*
+ * box_of_pair[nbas,nbas]: the leaf box of each shell pair
+ * box_near[nbox,nbox]: the mask of the near-field box pairs
+ */
+void CVHFset_cfmm_boxes(CVHFOpt *opt, int *box_of_pair, int nbox,
+                        int8_t *box_near)
+{
+        int nbas = opt->nbas;
+        if (opt->box_of_pair) {
+                free(opt->box_of_pair);
+        }
+        if (opt->box_near) {
+                free(opt->box_near);
+        }
+        opt->nbox = nbox;
+        opt->box_of_pair = (int *)malloc(sizeof(int) * nbas*nbas);
+        opt->box_near = (int8_t *)malloc(sizeof(int8_t) * nbox*nbox);
+        memcpy(opt->box_of_pair, box_of_pair, sizeof(int) * nbas*nbas);
+        memcpy(opt->box_near, box_near, sizeof(int8_t) * nbox*nbox);
+}
+
 void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset, int *ao_loc,
                              int *atm, int natm, int *bas, int nbas, double *env)
 {
@@ -18,6 +18,7 @@
 
 #if !defined(HAVE_DEFINED_CVHFOPT_H)
 #define HAVE_DEFINED_CVHFOPT_H
+#include <stdint.h>
 typedef struct CVHFOpt_struct {
     int nbas;
     int _padding;
@@ -29,6 +30,11 @@ typedef struct CVHFOpt_struct {
     int (*r_vkscreen)(int *shls, struct CVHFOpt_struct *opt,
                       double **dms_cond, int n_dm, double *dm_atleast,
                       int *atm, int *bas, double *env);
+    // The boxes of CFMM, see CVHFnrs8_cfmm_vj_prescreen
+    int nbox;
+    int _padding1;
+    int *box_of_pair;
+    int8_t *box_near;
 } CVHFOpt;
 #endif
 
@@ -43,6 +49,10 @@ int CVHFnr_schwarz_cond(int *shls, CVHFOpt *opt,
                         int *atm, int *bas, double *env);
 int CVHFnrs8_prescreen(int *shls, CVHFOpt *opt,
                        int *atm, int *bas, double *env);
+int CVHFnrs8_cfmm_vj_prescreen(int *shls, CVHFOpt *opt,
+                               int *atm, int *bas, double *env);
+void CVHFset_cfmm_boxes(CVHFOpt *opt, int *box_of_pair, int nbox,
+                        int8_t *box_near);
 
 int CVHFr_vknoscreen(int *shls, CVHFOpt *opt,
                      double **dms_cond, int n_dm, double *dm_atleast,
@@ -53,6 +63,9 @@ void CVHFsetnr_direct_scf(CVHFOpt *opt, int (*intor)(), CINTOpt *cintopt,
                           int *bas, int nbas, double *env);
 void CVHFsetnr_direct_scf_dm(CVHFOpt *opt, double *dm, int nset, int *ao_loc,
                              int *atm, int natm, int *bas, int nbas, double *env);
+void CVHFupdate_nr_direct_scf(CVHFOpt *opt, int (*intor)(), CINTOpt *cintopt,
+                              int8_t *pair_mask, int *ao_loc, int *atm, int natm,
+                              int *bas, int nbas, double *env);
 
 void CVHFnr_optimizer(CVHFOpt **vhfopt, int (*intor)(), CINTOpt *cintopt,
                       int *ao_loc, int *atm, int natm,
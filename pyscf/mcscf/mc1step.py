@@ -806,6 +806,8 @@ To enable the solvent model for CASSCF, the following code needs to be called
                 _kern(self, mo_coeff,
                       tol=self.conv_tol, conv_tol_grad=self.conv_tol_grad,
                       ci0=ci0, callback=callback, verbose=self.verbose)
+        if self.chkfile:
+            lib.chkfile.flush(self.chkfile)
         logger.note(self, 'CASSCF energy = %.15g', self.e_tot)
         self._finalize()
         return self.e_tot, self.e_cas, self.ci, self.mo_coeff, self.mo_energy
@@ -1167,10 +1169,11 @@ To enable the solvent model for CASSCF, the following code needs to be called
             mo_energy = envs['mo_energy']
         else:
             mo_energy = 'None'
-        chkfile.dump_mcscf(self, self.chkfile, 'mcscf', envs['e_tot'],
-                           mo_coeff, ncore, self.ncas, mo_occ,
-                           mo_energy, envs['e_cas'], civec, envs['casdm1'],
-                           overwrite_mol=False)
+        lib.chkfile.dump_async(self.chkfile, 'mcscf', chkfile.dump_mcscf,
+                               self, self.chkfile, 'mcscf', envs['e_tot'],
+                               mo_coeff, ncore, self.ncas, mo_occ,
+                               mo_energy, envs['e_cas'], civec, envs['casdm1'],
+                               False)
         return self
 
     def update_from_chk(self, chkfile=None):
@@ -114,7 +114,7 @@ from pyscf.scf import dhf
 from pyscf.scf import chkfile
 from pyscf.scf import addons
 from pyscf.scf import diis
-from pyscf.scf.diis import DIIS, CDIIS, EDIIS, ADIIS
+from pyscf.scf.diis import DIIS, CDIIS, EDIIS, ADIIS, ADIIS_CDIIS
 from pyscf.scf.uhf import spin_square
 from pyscf.scf.hf import get_init_guess
 from pyscf.scf.addons import *
@@ -58,19 +58,20 @@ def _gen_rhf_response(mf, mo_coeff=None, mo_occ=None,
             dm0 = mf.make_rdm1(mo_coeff, mo_occ)
             return multigrid._gen_rhf_response(mf, dm0, singlet, hermi)
 
+        if max_memory is None:
+            mem_now = lib.current_memory()[0]
+            max_memory = max(2000, mf.max_memory*.8-mem_now)
+
         if singlet is None:
             # for ground state orbital hessian
             rho0, vxc, fxc = ni.cache_xc_kernel(mol, mf.grids, mf.xc,
-                                                mo_coeff, mo_occ, 0)
+                                                mo_coeff, mo_occ, 0, max_memory)
         else:
             rho0, vxc, fxc = ni.cache_xc_kernel(mol, mf.grids, mf.xc,
-                                                [mo_coeff]*2, [mo_occ*.5]*2, spin=1)
+                                                [mo_coeff]*2, [mo_occ*.5]*2,
+                                                spin=1, max_memory=max_memory)
         dm0 = None  #mf.make_rdm1(mo_coeff, mo_occ)
 
-        if max_memory is None:
-            mem_now = lib.current_memory()[0]
-            max_memory = max(2000, mf.max_memory*.8-mem_now)
-
         if singlet is None:
             # Without specify singlet, used in ground state orbital hessian
             def vind(dm1):
@@ -170,16 +171,16 @@ def _gen_uhf_response(mf, mo_coeff=None, mo_occ=None,
             dm0 = mf.make_rdm1(mo_coeff, mo_occ)
             return multigrid._gen_uhf_response(mf, dm0, with_j, hermi)
 
+        if max_memory is None:
+            mem_now = lib.current_memory()[0]
+            max_memory = max(2000, mf.max_memory*.8-mem_now)
+
         rho0, vxc, fxc = ni.cache_xc_kernel(mol, mf.grids, mf.xc,
-                                            mo_coeff, mo_occ, 1)
+                                            mo_coeff, mo_occ, 1, max_memory)
         #dm0 =(numpy.dot(mo_coeff[0]*mo_occ[0], mo_coeff[0].T.conj()),
         #      numpy.dot(mo_coeff[1]*mo_occ[1], mo_coeff[1].T.conj()))
         dm0 = None
 
-        if max_memory is None:
-            mem_now = lib.current_memory()[0]
-            max_memory = max(2000, mf.max_memory*.8-mem_now)
-
         def vind(dm1):
             if hermi == 2:
                 v1 = numpy.zeros_like(dm1)
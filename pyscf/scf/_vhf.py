@@ -37,6 +37,7 @@ class VHFOpt(object):
         self._intor = intor
         self._cintopt = make_cintopt(mol._atm, mol._bas, mol._env, intor)
         self._dmcondname = dmcondname
+        self._qcondname = None
         natm = ctypes.c_int(mol.natm)
         nbas = ctypes.c_int(mol.nbas)
         libcvhf.CVHFinit_optimizer(ctypes.byref(self._this),
@@ -62,6 +63,42 @@ class VHFOpt(object):
                   mol._atm.ctypes.data_as(ctypes.c_void_p), natm,
                   mol._bas.ctypes.data_as(ctypes.c_void_p), nbas,
                   mol._env.ctypes.data_as(ctypes.c_void_p))
+        if intor == self._intor:
+            self._qcondname = qcondname
+
+    def update_cvhf_direct(self, mol, mol_last):
+        '''Update the optimizer for the new geometry of mol.  q_cond is only
+        recomputed for the shell pairs whose atoms are displaced relative to
+        each other.  Returns False if the optimizer cannot be updated, e.g.
+        when the basis sets of mol and mol_last are different.
+        '''
+        if (self._qcondname != 'CVHFsetnr_direct_scf' or
+            self._intor != mol._add_suffix('int2e') or
+            not _same_basis(mol, mol_last)):
+            return False
+
+        # cintopt only depends on the basis.  It is rebuilt for safety since
+        # it is cheap compared to q_cond.
+        self._cintopt = make_cintopt(mol._atm, mol._bas, mol._env, self._intor)
+
+        coords = mol.atom_coords()
+        coords_last = mol_last.atom_coords()
+        rij = coords[:,None] - coords
+        rij_last = coords_last[:,None] - coords_last
+        moved = abs(rij - rij_last).max(axis=2) > 1e-12
+        atm_of_bas = mol._bas[:,gto.ATOM_OF]
+        pair_mask = numpy.asarray(moved[atm_of_bas[:,None],atm_of_bas],
+                                  dtype=numpy.int8)
+        if pair_mask.any():
+            ao_loc = make_loc(mol._bas, self._intor)
+            libcvhf.CVHFupdate_nr_direct_scf(
+                self._this, getattr(libcvhf, self._intor), self._cintopt,
+                pair_mask.ctypes.data_as(ctypes.c_void_p),
+                ao_loc.ctypes.data_as(ctypes.c_void_p),
+                mol._atm.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(mol.natm),
+                mol._bas.ctypes.data_as(ctypes.c_void_p), ctypes.c_int(mol.nbas),
+                mol._env.ctypes.data_as(ctypes.c_void_p))
+        return True
 
     @property
     def direct_scf_tol(self):
@@ -107,6 +144,20 @@ class VHFOpt(object):
         except AttributeError:
             pass
 
+def _same_basis(mol, mol_last):
+    '''Whether mol and mol_last differ in the atomic coordinates only'''
+    if (mol.cart != mol_last.cart or
+        mol._atm.shape != mol_last._atm.shape or
+        mol._bas.shape != mol_last._bas.shape or
+        mol._env.shape != mol_last._env.shape or
+        not numpy.array_equal(mol._atm, mol_last._atm) or
+        not numpy.array_equal(mol._bas, mol_last._bas)):
+        return False
+    env_mask = numpy.ones(mol._env.size, dtype=bool)
+    ptr_coord = mol._atm[:,gto.PTR_COORD]
+    env_mask[ptr_coord[:,None] + numpy.arange(3)] = False
+    return numpy.array_equal(mol._env[env_mask], mol_last._env[env_mask])
+
 class _CVHFOpt(ctypes.Structure):
     _fields_ = [('nbas', ctypes.c_int),
                 ('_padding', ctypes.c_int),
@@ -114,7 +165,11 @@ class _CVHFOpt(ctypes.Structure):
                 ('q_cond', ctypes.c_void_p),
                 ('dm_cond', ctypes.c_void_p),
                 ('fprescreen', ctypes.c_void_p),
-                ('r_vkscreen', ctypes.c_void_p)]
+                ('r_vkscreen', ctypes.c_void_p),
+                ('nbox', ctypes.c_int),
+                ('_padding1', ctypes.c_int),
+                ('box_of_pair', ctypes.c_void_p),
+                ('box_near', ctypes.c_void_p)]
 
 ################################################
 # for general DM
@@ -288,6 +343,56 @@ def direct(dms, atm, bas, env, vhfopt=None, hermi=0, cart=False,
         vk = vk.reshape(dms_shape)
     return vj, vk
 
+def direct_link(mol, dms, vhfopt=None):
+    '''Exchange matrices of hermitian density matrices with LinK screening.
+
+    The shell pairs are pre-sorted by the Schwarz bounds and the density
+    matrix elements, so that the integral loops terminate early.  The
+    computational cost grows linearly with the system size for the systems
+    which have sparse density matrices.  vhfopt needs to hold the Schwarz
+    conditions (q_cond) and a dm_cond function, e.g. the one created by
+    :func:`SCF.init_direct_scf`.
+
+    Note the Coulomb matrix needs to be computed separately.  For the systems
+    of a few hundred basis functions, the LinK exchange matrix and the
+    separate Coulomb matrix cost more than the J and K matrices of
+    :func:`direct`, which share the integrals.
+    '''
+    atm, bas, env = mol._atm, mol._bas, mol._env
+    c_atm = numpy.asarray(atm, dtype=numpy.int32, order='C')
+    c_bas = numpy.asarray(bas, dtype=numpy.int32, order='C')
+    c_env = numpy.asarray(env, dtype=numpy.double, order='C')
+    natm = ctypes.c_int(c_atm.shape[0])
+    nbas = ctypes.c_int(c_bas.shape[0])
+
+    dms = numpy.asarray(dms, order='C')
+    dms_shape = dms.shape
+    nao = dms_shape[-1]
+    dms = dms.reshape(-1,nao,nao)
+    n_dm = dms.shape[0]
+
+    if vhfopt is None:
+        vhfopt = VHFOpt(mol, 'int2e', 'CVHFnrs8_prescreen',
+                        'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+    vhfopt.set_dm(dms, atm, bas, env)
+    cintor = _fpointer(vhfopt._intor)
+
+    vk = numpy.zeros((n_dm,nao,nao))
+    dmsptr = (ctypes.c_void_p*n_dm)(*[dm.ctypes.data_as(ctypes.c_void_p) for dm in dms])
+    vkptr = (ctypes.c_void_p*n_dm)(*[v.ctypes.data_as(ctypes.c_void_p) for v in vk])
+    ao_loc = make_loc(bas, vhfopt._intor)
+    libcvhf.CVHFnr_direct_link_drv(
+        cintor, dmsptr, vkptr, ctypes.c_int(n_dm),
+        ao_loc.ctypes.data_as(ctypes.c_void_p), vhfopt._cintopt, vhfopt._this,
+        c_atm.ctypes.data_as(ctypes.c_void_p), natm,
+        c_bas.ctypes.data_as(ctypes.c_void_p), nbas,
+        c_env.ctypes.data_as(ctypes.c_void_p))
+
+    # Only the lower triangular part was computed
+    for i in range(n_dm):
+        lib.hermi_triu(vk[i], 1, inplace=True)
+    return vk.reshape(dms_shape)
+
 # call all fjk for each dm, the return array has len(dms)*len(jkdescript)*ncomp components
 # jkdescript: 'ij->s1kl', 'kl->s2ij', ...
 def direct_mapdm(intor, aosym, jkdescript,
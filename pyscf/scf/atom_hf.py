@@ -16,12 +16,26 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import os
+import json
+import hashlib
+import tempfile
 import numpy
+from pyscf import lib
 from pyscf import gto
 from pyscf.lib import logger
 from pyscf.lib import param
 from pyscf.data import elements
 from pyscf.scf import hf
+from pyscf import __config__
+
+# Directory of the persistent cache of atomic calculations (used by the
+# "atom" and "minao" initial guess). The cache entries are identified by the
+# hash of element, basis, ECP and the atomic method, so that the directory
+# can be shared by many processes. The disk cache is disabled if not
+# specified. Results are always cached in memory within the process.
+ATOM_CACHE_DIR = getattr(__config__, 'scf_atom_hf_cache_dir', None)
+_atom_cache = {}
 
 
 def get_atm_nrhf(mol, atomic_configuration=elements.NRSRHF_CONFIGURATION):
@@ -46,13 +60,20 @@ def get_atm_nrhf(mol, atomic_configuration=elements.NRSRHF_CONFIGURATION):
             mo_coeff = numpy.zeros((nao,nao))
             atm_scf_result[a] = (0, mo_energy, mo_coeff, mo_occ)
         else:
-            atm_hf = AtomSphericAverageRHF(atm)
-            atm_hf.atomic_configuration = atomic_configuration
-            atm_hf.verbose = 0
-            atm_hf.run()
-            atm_scf_result[a] = (atm_hf.e_tot, atm_hf.mo_energy,
-                                 atm_hf.mo_coeff, atm_hf.mo_occ)
-            atm_hf._eri = None
+            key = _cache_key('nrhf', atm.nelectron, b, atm._ecp.get(a),
+                             atomic_configuration[atm.nelectron])
+            res = _cache_load(key)
+            if res is None:
+                atm_hf = AtomSphericAverageRHF(atm)
+                atm_hf.atomic_configuration = atomic_configuration
+                atm_hf.verbose = 0
+                atm_hf.run()
+                res = {'e_tot': atm_hf.e_tot, 'mo_energy': atm_hf.mo_energy,
+                       'mo_coeff': atm_hf.mo_coeff, 'mo_occ': atm_hf.mo_occ}
+                _cache_dump(key, res)
+                atm_hf._eri = None
+            atm_scf_result[a] = (res['e_tot'], res['mo_energy'],
+                                 res['mo_coeff'], res['mo_occ'])
     mol.stdout.flush()
     return atm_scf_result
 
@@ -152,6 +173,49 @@ def frac_occ(symb, l, atomic_configuration=elements.NRSRHF_CONFIGURATION):
         ndocc = frac = 0
     return ndocc, frac
 
+def _cache_key(*args):
+    '''Content hash of the atomic calculation parameters'''
+    return hashlib.sha1(json.dumps(args, default=_to_list).encode()).hexdigest()
+
+def _to_list(x):
+    return x.tolist()
+
+def _cache_load(key):
+    '''Load the cached atomic result (a dict). None is returned if not found.'''
+    if key in _atom_cache:
+        return _atom_cache[key]
+    if ATOM_CACHE_DIR:
+        path = os.path.join(ATOM_CACHE_DIR, key + '.h5')
+        if os.path.isfile(path):
+            try:
+                res = lib.chkfile.load(path, 'atom')
+            except (IOError, OSError, KeyError):
+                return None
+            if res is not None:
+                _atom_cache[key] = res
+            return res
+    return None
+
+def _cache_dump(key, res):
+    _atom_cache[key] = res
+    if ATOM_CACHE_DIR:
+        path = os.path.join(ATOM_CACHE_DIR, key + '.h5')
+        tmpname = None
+        try:
+            if not os.path.isdir(ATOM_CACHE_DIR):
+                os.makedirs(ATOM_CACHE_DIR)
+            # Write to a temporary file then rename, so that concurrent
+            # readers never see a partially written file.
+            fd, tmpname = tempfile.mkstemp(suffix='.tmp', dir=ATOM_CACHE_DIR)
+            os.close(fd)
+            lib.chkfile.dump(tmpname, 'atom', res)
+            os.rename(tmpname, path)
+        except (IOError, OSError):
+            # The cache is optional. Failing to write it (read-only or full
+            # filesystem, a race with other processes) is not an error.
+            if tmpname is not None and os.path.isfile(tmpname):
+                os.remove(tmpname)
+
 def _angular_momentum_for_each_ao(mol):
     ao_ang = numpy.zeros(mol.nao, dtype=numpy.int)
     ao_loc = mol.ao_loc_nr()
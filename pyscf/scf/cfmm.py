@@ -0,0 +1,602 @@
+#!/usr/bin/env python
+# Copyright 2014-2020 The PySCF Developers. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+
+'''
+Continuous fast multipole method (CFMM) for Coulomb matrix
+
+The AO-pair charge distributions are grouped by atom pairs.  Each charge
+distribution has a center and an extent, beyond which the Gaussian product is
+negligible.  Distributions are assigned to cubic boxes, which are organized in an octree.
+Two boxes are well separated if the spheres which enclose their distributions
+do not overlap.  The multipoles of the boxes are translated to the parent
+boxes (M2M).  Two boxes interact through Cartesian multipole expansions (M2L)
+at the coarsest level of the tree where they are well separated, and the
+local expansions are translated to the child boxes (L2L) (far field).  The
+remaining interactions of the leaf boxes (near field) are computed with exact
+4-center integrals by the direct SCF driver of libcvhf, with a prescreen which
+drops the shell quartets of the far-field box pairs.  The numbers of M2L
+pairs and near-field box pairs grow linearly with the size of the system.
+
+Ref:
+    C. A. White, B. G. Johnson, P. M. W. Gill, M. Head-Gordon,
+    Chem. Phys. Lett. 230, 8 (1994)
+
+Simple usage::
+
+    >>> mf = scf.RKS(mol).set(xc='pbe', cfmm=True)
+    >>> mf.kernel()
+'''
+
+import time
+import ctypes
+import numpy
+from pyscf import lib
+from pyscf import gto
+from pyscf.lib import logger
+from pyscf.scf import _vhf
+from pyscf import __config__
+
+CFMM_LMAX = getattr(__config__, 'scf_cfmm_lmax', 4)
+CFMM_BOX_SIZE = getattr(__config__, 'scf_cfmm_box_size', 4.)
+CFMM_WS = getattr(__config__, 'scf_cfmm_ws', 2.)
+CFMM_EXTENT_THRESH = getattr(__config__, 'scf_cfmm_extent_thresh', 1e-10)
+CFMM_FAR_FIELD_TOL = getattr(__config__, 'scf_cfmm_far_field_tol', 1e-7)
+
+# Integrals of the Cartesian moments up to 4th order are provided by libcint
+_MOMENT_INTOR = ('int1e_ovlp', 'int1e_r', 'int1e_rr', 'int1e_rrr', 'int1e_rrrr')
+
+
+def cart_powers(lmax):
+    '''Exponents (tx,ty,tz) of all Cartesian monomials x^tx y^ty z^tz with
+    tx+ty+tz <= lmax'''
+    return numpy.array([(tx, l-tx-tz, tz)
+                        for l in range(lmax+1)
+                        for tx in reversed(range(l+1))
+                        for tz in range(l-tx+1)], dtype=int)
+
+def coulomb_derivatives(rvec, lmax):
+    r'''Cartesian derivatives of the Coulomb kernel
+
+    .. math::
+
+        T_{tuv}(R) = \frac{\partial^{t+u+v}}{\partial X^t \partial Y^u \partial Z^v}
+                     \frac{1}{|R|}
+
+    evaluated with the McMurchie-Davidson recursion.
+
+    Args:
+        rvec : (n,3) ndarray
+
+    Returns:
+        An array T[t,u,v,n] for all t+u+v <= lmax
+    '''
+    rvec = numpy.asarray(rvec).reshape(-1,3)
+    x, y, z = rvec.T
+    r2 = numpy.einsum('nx,nx->n', rvec, rvec)
+    ngrid = r2.size
+    # rn[n] = (-1)^n (2n-1)!! / r^(2n+1)
+    rn = numpy.empty((lmax+1,ngrid))
+    rn[0] = 1. / numpy.sqrt(r2)
+    for n in range(1, lmax+1):
+        rn[n] = -(2*n-1) * rn[n-1] / r2
+
+    # buf[n][t,u,v] holds the auxiliary integrals R^{(n)}_{tuv}
+    buf = [numpy.zeros((lmax+1-n,)*3 + (ngrid,)) for n in range(lmax+1)]
+    for n in range(lmax+1):
+        buf[n][0,0,0] = rn[n]
+    for l in range(1, lmax+1):
+        for n in range(lmax-l+1):
+            rn0 = buf[n]
+            rn1 = buf[n+1]
+            for t in range(l+1):
+                for u in range(l-t+1):
+                    v = l - t - u
+                    if t > 0:
+                        val = x * rn1[t-1,u,v]
+                        if t > 1:
+                            val += (t-1) * rn1[t-2,u,v]
+                    elif u > 0:
+                        val = y * rn1[t,u-1,v]
+                        if u > 1:
+                            val += (u-1) * rn1[t,u-2,v]
+                    else:
+                        val = z * rn1[t,u,v-1]
+                        if v > 1:
+                            val += (v-1) * rn1[t,u,v-2]
+                    rn0[t,u,v] = val
+    return buf[0]
+
+def m2l_tensor(rvec, lmax):
+    '''Interaction tensors between the Cartesian moments (up to order lmax)
+    of two boxes separated by rvec (center of the local expansion minus the
+    center of the multipoles)
+
+    Returns:
+        An array T[s,t,n].  The local expansion L_s = sum_t T[s,t] M_t
+    '''
+    powers = cart_powers(lmax)
+    tderiv = coulomb_derivatives(rvec, lmax*2)
+    tsum = powers[:,None] + powers
+    coef = 1. / (_factorial(powers).prod(axis=1)[:,None] *
+                 _factorial(powers).prod(axis=1))
+    coef *= (-1) ** powers.sum(axis=1)
+    return tderiv[tsum[:,:,0],tsum[:,:,1],tsum[:,:,2]] * coef[:,:,None]
+
+def translation_matrices(dvec, lmax):
+    '''Matrices S[t,s] = binom(t,s) d^(t-s) for the translation of the
+    Cartesian moments and the local expansions between a box and its parent
+    box, d = (child center) - (parent center).
+
+    The moments about the parent center are M'_t = sum_s S[t,s] M_s.  The
+    local expansion about the child center is L'_s = sum_t S[t,s] L_t.
+
+    Returns:
+        An array S[n,t,s] for each vector in dvec
+    '''
+    powers = cart_powers(lmax)
+    dvec = numpy.asarray(dvec).reshape(-1,3)
+    ncomp = len(powers)
+    diff = powers[:,None] - powers
+    ti, si = numpy.where((diff >= 0).all(axis=2))
+    e = diff[ti,si]
+    binom = (_factorial(powers[ti]) /
+             (_factorial(powers[si]) * _factorial(e))).prod(axis=1)
+    smat = numpy.zeros((len(dvec),ncomp,ncomp))
+    smat[:,ti,si] = binom * (dvec[:,None,:] ** e).prod(axis=2)
+    return smat
+
+def _factorial(n):
+    return numpy.array([numpy.prod(numpy.arange(1, k+1)) for k in n.ravel()],
+                       dtype=float).reshape(n.shape)
+
+def _moment_component_index(powers):
+    '''For each monomial, the component index in the output of the integrals
+    int1e_r, int1e_rr, ... which hold the tensor products r_i r_j ...'''
+    idx = []
+    for tx, ty, tz in powers:
+        seq = [0] * tx + [1] * ty + [2] * tz
+        idx.append(sum(c * 3**(len(seq)-k-1) for k, c in enumerate(seq)))
+    return idx
+
+def charge_distributions(mol, thresh=CFMM_EXTENT_THRESH):
+    '''Significant atom-pair charge distributions.
+
+    The extent of the primitive Gaussian product with exponent p = a + b and
+    prefactor K = exp(-ab/p |A-B|^2) is the radius where K exp(-p r^2) drops
+    below thresh.  The atom-pair distribution is centered on its most diffuse
+    shell pair.
+
+    Returns:
+        pairs : (n,2) int array of atom indices (ia, ja) with ia >= ja
+        centers : (n,3) array
+        extents : (n,) array
+    '''
+    atom_coords = mol.atom_coords()
+    bas_atom = mol._bas[:,gto.ATOM_OF]
+    bas_coords = atom_coords[bas_atom]
+    bas_amin = numpy.array([mol.bas_exp(ib).min() for ib in range(mol.nbas)])
+    log_thresh = numpy.log(thresh)
+
+    pairs = []
+    centers = []
+    extents = []
+    for ish in range(mol.nbas):
+        jsh = numpy.arange(ish+1)
+        ai = bas_amin[ish]
+        aj = bas_amin[jsh]
+        p = ai + aj
+        rij = bas_coords[ish] - bas_coords[jsh]
+        log_k = -ai * aj / p * numpy.einsum('jx,jx->j', rij, rij)
+        mask = log_k > log_thresh
+        if not numpy.any(mask):
+            continue
+        jsh = jsh[mask]
+        p = p[mask]
+        pc = (ai * bas_coords[ish] + aj[mask,None] * bas_coords[jsh]) / p[:,None]
+        pairs.append(numpy.array((bas_atom[ish].repeat(jsh.size), bas_atom[jsh])).T)
+        centers.append(pc)
+        extents.append(numpy.sqrt((log_k[mask] - log_thresh) / p))
+    pairs = numpy.vstack(pairs)
+    centers = numpy.vstack(centers)
+    extents = numpy.hstack(extents)
+    pairs = numpy.sort(pairs, axis=1)[:,::-1]
+
+    # Merge shell pairs into atom pairs
+    pair_id = pairs[:,0] * mol.natm + pairs[:,1]
+    uniq_id, inverse = numpy.unique(pair_id, return_inverse=True)
+    inverse = inverse.ravel()
+    npair = uniq_id.size
+    # The most diffuse shell pair defines the center of atom-pair distribution
+    order = numpy.lexsort((-extents, inverse))
+    first = order[numpy.searchsorted(inverse[order], numpy.arange(npair))]
+    dist_centers = centers[first]
+    r = numpy.linalg.norm(centers - dist_centers[inverse], axis=1) + extents
+    dist_extents = numpy.zeros(npair)
+    numpy.maximum.at(dist_extents, inverse, r)
+    dist_pairs = numpy.array((uniq_id // mol.natm, uniq_id % mol.natm)).T
+    return dist_pairs, dist_centers, dist_extents
+
+
+class CFMM(lib.StreamObject):
+    '''CFMM Coulomb builder
+
+    Attributes:
+        lmax : int
+            The highest order (<= 4) of the multipole moments of each box.
+        box_size : float
+            Edge length (in Bohr) of the leaf boxes.
+        ws : float
+            Well-separatedness ratio.  Two boxes are treated with multipole
+            expansion if their distance is larger than ws times the sum of
+            their radii.  ws must not be smaller than 1.
+        extent_thresh : float
+            Threshold to determine the extent of charge distributions.
+        far_field_tol : float
+            A warning is issued when the estimated error of the far field
+            (far_field_error) exceeds this value.
+        direct_scf_tol : float
+            Schwarz screening threshold for near-field integrals.
+
+    Saved results:
+
+        far_field_error : float
+            Estimated error (the largest element) of the far-field Coulomb
+            matrix of the last call of get_j.  It is extrapolated from the
+            contributions of the multipoles of the orders lmax and lmax-1.
+            The truncation error of the expansion decreases with lmax and ws.
+    '''
+    lmax = CFMM_LMAX
+    box_size = CFMM_BOX_SIZE
+    ws = CFMM_WS
+    extent_thresh = CFMM_EXTENT_THRESH
+    far_field_tol = CFMM_FAR_FIELD_TOL
+
+    def __init__(self, mol, direct_scf_tol=1e-13):
+        self.mol = mol
+        self.stdout = mol.stdout
+        self.verbose = mol.verbose
+        self.max_memory = mol.max_memory
+        self.direct_scf_tol = direct_scf_tol
+
+##################################################
+# don't modify the following attributes, they are not input options
+        self.dist_pairs = None
+        self.dist_centers = None
+        self.dist_extents = None
+        # box_centers[l], box_radii[l] for the boxes of level l of the octree.
+        # Level 0 are the leaf boxes.  box_parents[l] are the indices of the
+        # parent boxes (level l+1) of the boxes of level l.
+        self.box_centers = None
+        self.box_radii = None
+        self.box_parents = None
+        self.box_of_dist = None
+        # m2l_pairs[l] are the (ordered) pairs of boxes of level l which
+        # interact through the multipole expansion
+        self.m2l_pairs = None
+        # The (ordered) pairs of leaf boxes of the near field
+        self.near_pairs = None
+        # VHFOpt of the near field
+        self.opt = None
+        self.far_field_error = None
+        self._moments = None
+        self._keys = set(self.__dict__.keys())
+
+    def dump_flags(self, verbose=None):
+        log = logger.new_logger(self, verbose)
+        log.info('******** %s ********', self.__class__)
+        log.info('lmax = %d', self.lmax)
+        log.info('box_size = %g', self.box_size)
+        log.info('ws = %g', self.ws)
+        log.info('extent_thresh = %g', self.extent_thresh)
+        log.info('far_field_tol = %g', self.far_field_tol)
+        return self
+
+    def build(self):
+        if self.lmax >= len(_MOMENT_INTOR):
+            raise NotImplementedError('CFMM with lmax > %d' % (len(_MOMENT_INTOR)-1))
+        if self.ws < 1:
+            raise ValueError('CFMM.ws must be >= 1')
+        if self.verbose >= logger.WARN:
+            self.check_sanity()
+        if self.verbose >= logger.INFO:
+            self.dump_flags()
+
+        t0 = (time.clock(), time.time())
+        mol = self.mol
+        pairs, centers, extents = charge_distributions(mol, self.extent_thresh)
+        self.dist_pairs = pairs
+        self.dist_centers = centers
+        self.dist_extents = extents
+
+        # The boxes of level l have the edge length box_size*2^l.  The tree
+        # is built up to the level of a single box.
+        cmin = centers.min(axis=0)
+        keys = numpy.floor((centers - cmin) / self.box_size).astype(int)
+        self.box_centers = []
+        self.box_radii = []
+        self.box_parents = []
+        box_of_dist = last_inverse = None
+        level = 0
+        while True:
+            box_keys, inverse = numpy.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.ravel()
+            nbox = len(box_keys)
+            box_centers = cmin + (box_keys + .5) * (self.box_size * 2**level)
+            r = numpy.linalg.norm(centers - box_centers[inverse], axis=1) + extents
+            box_radii = numpy.zeros(nbox)
+            numpy.maximum.at(box_radii, inverse, r)
+            if box_of_dist is None:
+                box_of_dist = inverse
+            else:
+                parents = numpy.empty(len(self.box_centers[-1]), dtype=int)
+                parents[last_inverse] = inverse
+                self.box_parents.append(parents)
+            self.box_centers.append(box_centers)
+            self.box_radii.append(box_radii)
+            if nbox == 1:
+                break
+            last_inverse = inverse
+            keys = keys // 2
+            level += 1
+        self.box_of_dist = box_of_dist
+
+        # Dual tree traversal from the root box.  The children of a box pair
+        # which is not well separated are examined at the next level.
+        nlevel = len(self.box_centers)
+        self.m2l_pairs = [numpy.zeros((0,2), dtype=int)] * nlevel
+        near = numpy.zeros((1,2), dtype=int)
+        for l in range(nlevel-1, 0, -1):
+            parents = self.box_parents[l-1]
+            children = [numpy.where(parents == i)[0]
+                        for i in range(len(self.box_centers[l]))]
+            pairs = [(a, b) for ia, ib in near
+                     for a in children[ia] for b in children[ib]]
+            pairs = numpy.array(pairs, dtype=int).reshape(-1,2)
+            far = self._well_separated(l-1, pairs)
+            self.m2l_pairs[l-1] = pairs[far]
+            near = pairs[~far]
+        self.near_pairs = near
+
+        self._moments = self._multipoles()
+        self.opt = self.init_direct_scf(mol)
+
+        logger.info(self, 'CFMM: %d charge distributions in %d boxes, '
+                    '%d levels, %d M2L box pairs, %d near-field box pairs',
+                    len(self.dist_pairs), len(self.box_centers[0]), nlevel,
+                    sum(len(x) for x in self.m2l_pairs), len(near))
+        logger.timer(self, 'CFMM build', *t0)
+        return self
+
+    def _well_separated(self, level, pairs):
+        centers = self.box_centers[level]
+        radii = self.box_radii[level]
+        a, b = pairs.T
+        dist = numpy.linalg.norm(centers[a] - centers[b], axis=1)
+        return dist > self.ws * (radii[a] + radii[b])
+
+    def init_direct_scf(self, mol=None):
+        '''VHFOpt of the near field.  The prescreen function
+        CVHFnrs8_cfmm_vj_prescreen reads the leaf box of each shell pair and
+        the near-field box pairs, which are assigned to the VHFOpt by
+        CVHFset_cfmm_boxes.
+        '''
+        if mol is None: mol = self.mol
+        opt = _vhf.VHFOpt(mol, 'int2e', 'CVHFnrs8_cfmm_vj_prescreen',
+                          'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        opt.direct_scf_tol = self.direct_scf_tol
+
+        # The leaf box of each shell pair. -1 for negligible shell pairs
+        pairs = self.dist_pairs
+        dist_id = numpy.empty((mol.natm,mol.natm), dtype=int)
+        dist_id[:] = -1
+        dist_id[pairs[:,0],pairs[:,1]] = numpy.arange(len(pairs))
+        dist_id[pairs[:,1],pairs[:,0]] = numpy.arange(len(pairs))
+        atm_of_bas = mol._bas[:,gto.ATOM_OF]
+        dist_id = dist_id[atm_of_bas[:,None],atm_of_bas]
+        box_of_pair = numpy.where(dist_id >= 0, self.box_of_dist[dist_id], -1)
+        box_of_pair = numpy.asarray(box_of_pair, dtype=numpy.int32, order='C')
+
+        nbox = len(self.box_centers[0])
+        near_mask = numpy.zeros((nbox,nbox), dtype=numpy.int8)
+        near_mask[self.near_pairs[:,0],self.near_pairs[:,1]] = 1
+        _vhf.libcvhf.CVHFset_cfmm_boxes(
+            opt._this, box_of_pair.ctypes.data_as(ctypes.c_void_p),
+            ctypes.c_int(nbox), near_mask.ctypes.data_as(ctypes.c_void_p))
+        return opt
+
+    def _multipoles(self):
+        '''Cartesian moments of the AO pairs of the charge distributions with
+        respect to the centers of their leaf boxes.
+
+        Returns:
+            moments : (ncomp,npack) array for the AO pairs of all
+                distributions.  The distributions are sorted by boxes.
+            ao_idx : (npack,) array of the AO pair indices i*nao+j
+            box_loc : the offsets of the leaf boxes in the packed AO pairs
+            fac : (npack,) array.  2 for the AO pairs of the off-diagonal
+                atom pairs (ia > ja), which represent both ij and ji.
+        '''
+        mol = self.mol
+        nao = mol.nao_nr()
+        powers = cart_powers(self.lmax)
+        aoslices = mol.aoslice_by_atom()
+        box_centers = self.box_centers[0]
+        order = numpy.argsort(self.box_of_dist, kind='mergesort')
+        moments = []
+        ao_idx = []
+        for n in order:
+            ia, ja = self.dist_pairs[n]
+            shls_slice = (aoslices[ia,0], aoslices[ia,1],
+                          aoslices[ja,0], aoslices[ja,1])
+            i0, i1 = aoslices[ia,2:]
+            j0, j1 = aoslices[ja,2:]
+            ni = i1 - i0
+            nj = j1 - j0
+            q = numpy.empty((len(powers),ni,nj))
+            with mol.with_common_origin(box_centers[self.box_of_dist[n]]):
+                for l in range(self.lmax+1):
+                    mask = powers.sum(axis=1) == l
+                    comp = 3**l
+                    ints = mol.intor(_MOMENT_INTOR[l], comp=comp,
+                                     shls_slice=shls_slice).reshape(comp,ni,nj)
+                    q[mask] = ints[_moment_component_index(powers[mask])]
+            moments.append(q.reshape(len(powers),-1))
+            ao_idx.append((numpy.arange(i0,i1)[:,None]*nao +
+                           numpy.arange(j0,j1)).ravel())
+        moments = numpy.hstack(moments)
+        npack = numpy.array([x.size for x in ao_idx])
+        ao_idx = numpy.hstack(ao_idx)
+        nbox = len(box_centers)
+        dist_loc = numpy.append(0, numpy.cumsum(npack))
+        box_loc = dist_loc[numpy.searchsorted(self.box_of_dist[order],
+                                              numpy.arange(nbox+1))]
+        # Off-diagonal atom pairs (ia > ja) represent both the ij and ji blocks
+        fac = numpy.where(self.dist_pairs[order,0] == self.dist_pairs[order,1], 1., 2.)
+        fac = numpy.repeat(fac, npack)
+        return moments, ao_idx, box_loc, fac
+
+    def get_j(self, dm, hermi=1):
+        '''Coulomb matrix J_{ij} = (ij|kl) D_{lk}'''
+        if self.dist_pairs is None:
+            self.build()
+        cpu0 = (time.clock(), time.time())
+        mol = self.mol
+        dm = numpy.asarray(dm)
+        dm_shape = dm.shape
+        nao = dm_shape[-1]
+        dms = dm.reshape(-1,nao,nao)
+        # J depends on the symmetric part of the density matrix only
+        dms = (dms + dms.transpose(0,2,1)) * .5
+        n_dm = dms.shape[0]
+
+        # Far field
+        moments, ao_idx, box_loc, fac = self._moments
+        ncomp = moments.shape[0]
+        nlevel = len(self.box_centers)
+        dm_pack = dms.reshape(n_dm,-1)[:,ao_idx] * fac
+        nbox = len(self.box_centers[0])
+        mpoles = [numpy.empty((nbox,ncomp,n_dm))]
+        for ib in range(nbox):
+            p0, p1 = box_loc[ib:ib+2]
+            mpoles[0][ib] = lib.dot(moments[:,p0:p1], dm_pack[:,p0:p1].T)
+        # M2M
+        shifts = []
+        for l in range(1, nlevel):
+            parents = self.box_parents[l-1]
+            dvec = self.box_centers[l-1] - self.box_centers[l][parents]
+            shifts.append(translation_matrices(dvec, self.lmax))
+            m = numpy.einsum('bts,bsx->btx', shifts[-1], mpoles[-1])
+            mpole = numpy.zeros((len(self.box_centers[l]),ncomp,n_dm))
+            numpy.add.at(mpole, parents, m)
+            mpoles.append(mpole)
+        # M2L and L2L.  The expansions truncated at the orders lmax-1 and
+        # lmax-2 are evaluated as well to estimate the error of the far
+        # field.  M2M does not mix the higher orders into the lower ones,
+        # thus the truncated moments are the leading components of mpoles.
+        tensors = []
+        for l in range(nlevel):
+            a, b = self.m2l_pairs[l].T
+            rvec = self.box_centers[l][a] - self.box_centers[l][b]
+            tensors.append(m2l_tensor(rvec, self.lmax))
+        vj_packs = []
+        for order in (self.lmax, self.lmax-1, self.lmax-2):
+            n = len(cart_powers(order))
+            vj_pack = numpy.zeros((n_dm,ao_idx.size))
+            vj_packs.append(vj_pack)
+            if n == 0:
+                continue
+            locs = [numpy.zeros_like(x[:,:n]) for x in mpoles]
+            for l in range(nlevel):
+                if len(self.m2l_pairs[l]) == 0:
+                    continue
+                a, b = self.m2l_pairs[l].T
+                v = numpy.einsum('stp,ptx->psx', tensors[l][:n,:n],
+                                 mpoles[l][b][:,:n])
+                numpy.add.at(locs[l], a, v)
+            for l in range(nlevel-1, 0, -1):
+                parents = self.box_parents[l-1]
+                locs[l-1] += numpy.einsum('bts,btx->bsx', shifts[l-1][:,:n,:n],
+                                          locs[l][parents])
+            for ib in range(nbox):
+                p0, p1 = box_loc[ib:ib+2]
+                vj_pack[:,p0:p1] = lib.dot(locs[0][ib].T, moments[:n,p0:p1])
+        mpoles = tensors = locs = None
+        vj_pack = vj_packs[0]
+        self._check_far_field_error(*vj_packs)
+        vj = numpy.zeros((n_dm,nao*nao))
+        vj[:,ao_idx] = vj_pack
+        vj = vj.reshape(n_dm,nao,nao)
+        # Only the blocks of ia >= ja were computed
+        vj = vj + vj.transpose(0,2,1)
+        aoslices = mol.aoslice_by_atom()
+        for ia in range(mol.natm):
+            i0, i1 = aoslices[ia,2:]
+            vj[:,i0:i1,i0:i1] *= .5
+        cpu1 = logger.timer_debug1(self, 'CFMM far field', *cpu0)
+
+        # Near field
+        self.opt.direct_scf_tol = self.direct_scf_tol
+        vj += _vhf.direct(dms, mol._atm, mol._bas, mol._env, self.opt,
+                          hermi=1, cart=mol.cart, with_k=False)[0]
+        logger.timer_debug1(self, 'CFMM near field', *cpu1)
+        logger.timer(self, 'CFMM vj', *cpu0)
+        return vj.reshape(dm_shape)
+
+    def _check_far_field_error(self, vj, vj1, vj2):
+        '''Estimate the error of the far field from the far-field Coulomb
+        matrices vj, vj1 and vj2 of the expansions truncated at the orders
+        lmax, lmax-1 and lmax-2.  The error of the expansion decreases
+        geometrically with the order, the ratio d1/d2 of the last two
+        increments d1 = max|vj-vj1| and d2 = max|vj1-vj2| is used to
+        extrapolate the remaining error d1*d1/d2.  A warning is issued when
+        the estimation exceeds far_field_tol (once until it drops below
+        far_field_tol).
+        '''
+        d1 = d2 = 0
+        if vj.size > 0:
+            d1 = abs(vj - vj1).max()
+            d2 = abs(vj1 - vj2).max()
+        if d1 < d2:
+            err = d1 * d1 / d2
+        else:
+            err = d1
+        last_err = self.far_field_error
+        self.far_field_error = err
+        logger.debug(self, 'CFMM far-field error estimate %.3g', err)
+        if err > self.far_field_tol and (last_err is None or
+                                         last_err <= self.far_field_tol):
+            logger.warn(self, 'CFMM far-field error estimate %.3g exceeds '
+                        'far_field_tol %g. Increase ws or lmax to improve '
+                        'the accuracy of the Coulomb matrix.',
+                        err, self.far_field_tol)
+
+    def reset(self, mol=None):
+        '''Reset mol and the geometry dependent intermediates'''
+        if mol is not None:
+            self.mol = mol
+        self.dist_pairs = None
+        self.dist_centers = None
+        self.dist_extents = None
+        self.box_centers = None
+        self.box_radii = None
+        self.box_parents = None
+        self.box_of_dist = None
+        self.m2l_pairs = None
+        self.near_pairs = None
+        self.opt = None
+        self.far_field_error = None
+        self._moments = None
+        return self
@@ -165,6 +165,38 @@ class ADIIS(lib.diis.DIIS):
         self._head += 1
         return fock
 
+class ADIIS_CDIIS(CDIIS):
+    '''Mixed ADIIS and CDIIS.  ADIIS is used when the error vector is large
+    and CDIIS is used when the error vector is small.  In between, the Fock
+    matrices extrapolated by the two methods are linearly combined
+    (F = w F_ADIIS + (1-w) F_CDIIS,
+    w = (max|err| - cdiis_thresh) / (adiis_thresh - cdiis_thresh)).
+
+    Ref: JCP 132, 054109 (2010); DOI:10.1063/1.3304922
+    '''
+    def __init__(self, mf=None, filename=None):
+        CDIIS.__init__(self, mf, filename)
+        self.adiis_thresh = 1e-1
+        self.cdiis_thresh = 1e-4
+        self._adiis = ADIIS(mf)
+
+    def update(self, s, d, f, mf, h1e, vhf):
+        errvec = get_err_vec(s, d, f)
+        err = abs(errvec).max()
+        f_cdiis = CDIIS.update(self, s, d, f)
+        if err < self.cdiis_thresh:
+            return f_cdiis
+
+        self._adiis.space = self.space
+        f_adiis = self._adiis.update(s, d, f, mf, h1e, vhf)
+        if err > self.adiis_thresh:
+            logger.debug1(self, 'max|err| = %g  ADIIS', err)
+            return f_adiis
+        else:
+            w = (err - self.cdiis_thresh) / (self.adiis_thresh - self.cdiis_thresh)
+            logger.debug1(self, 'max|err| = %g  ADIIS weight %g', err, w)
+            return w * f_adiis + (1 - w) * f_cdiis
+
 def adiis_minimize(ds, fs, idnewest):
     nx = ds.shape[0]
     nao = ds.shape[-1]
@@ -21,6 +21,7 @@ Hartree-Fock
 '''
 
 import sys
+import json
 import tempfile
 import time
 from functools import reduce
@@ -41,11 +42,15 @@ PRE_ORTH_METHOD = getattr(__config__, 'scf_analyze_pre_orth_method', 'ANO')
 MO_BASE = getattr(__config__, 'MO_BASE', 1)
 TIGHT_GRAD_CONV_TOL = getattr(__config__, 'scf_hf_kernel_tight_grad_conv_tol', True)
 MUTE_CHKFILE = getattr(__config__, 'scf_hf_SCF_mute_chkfile', False)
+# Max number of restarts of the second order SCF (when the SCF is switched to
+# the second order solver) along the internal instabilities of the solutions
+ESCALATION_STABILITY_CYCLES = getattr(__config__, 'scf_hf_escalation_stability_cycles', 3)
 
 # For code compatibility in python-2 and python-3
 if sys.version_info >= (3,):
     unicode = str
 
+@logger.profile('scf')
 def kernel(mf, conv_tol=1e-10, conv_tol_grad=None,
            dump_chk=True, dm0=None, callback=None, conv_check=True, **kwargs):
     '''kernel: the SCF driver.
@@ -123,126 +128,305 @@ Keyword argument "init_dm" is replaced by "dm0"''')
     else:
         dm = dm0
 
-    h1e = mf.get_hcore(mol)
-    vhf = mf.get_veff(mol, dm)
-    e_tot = mf.energy_tot(dm, h1e, vhf)
-    logger.info(mf, 'init E= %.15g', e_tot)
-
-    scf_conv = False
-    mo_energy = mo_coeff = mo_occ = None
-
-    s1e = mf.get_ovlp(mol)
-    cond = lib.cond(s1e)
-    logger.debug(mf, 'cond(S) = %s', cond)
-    if numpy.max(cond)*1e-17 > conv_tol:
-        logger.warn(mf, 'Singularity detected in overlap matrix (condition number = %4.3g). '
-                    'SCF may be inaccurate and hard to converge.', numpy.max(cond))
-
-    # Skip SCF iterations. Compute only the total energy of the initial density
-    if mf.max_cycle <= 0:
-        fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf, no DIIS
-        mo_energy, mo_coeff = mf.eig(fock, s1e)
-        mo_occ = mf.get_occ(mo_energy, mo_coeff)
-        return scf_conv, e_tot, mo_energy, mo_coeff, mo_occ
-
-    if isinstance(mf.diis, lib.diis.DIIS):
-        mf_diis = mf.diis
-    elif mf.diis:
-        assert issubclass(mf.DIIS, lib.diis.DIIS)
-        mf_diis = mf.DIIS(mf, mf.diis_file)
-        mf_diis.space = mf.diis_space
-        mf_diis.rollback = mf.diis_space_rollback
-    else:
-        mf_diis = None
-
-    if dump_chk and mf.chkfile:
-        # Explicit overwrite the mol object in chkfile
-        # Note in pbc.scf, mf.mol == mf.cell, cell is saved under key "mol"
-        chkfile.save_mol(mol, mf.chkfile)
-
-    # A preprocessing hook before the SCF iteration
-    mf.pre_kernel(locals())
-
-    cput1 = logger.timer(mf, 'initialize scf', *cput0)
-    for cycle in range(mf.max_cycle):
-        dm_last = dm
-        last_hf_e = e_tot
-
-        fock = mf.get_fock(h1e, s1e, vhf, dm, cycle, mf_diis)
-        mo_energy, mo_coeff = mf.eig(fock, s1e)
-        mo_occ = mf.get_occ(mo_energy, mo_coeff)
-        dm = mf.make_rdm1(mo_coeff, mo_occ)
-        dm = lib.tag_array(dm, mo_coeff=mo_coeff, mo_occ=mo_occ)
-        vhf = mf.get_veff(mol, dm, dm_last, vhf)
+    # Integral screening threshold for the incremental Fock builds
+    scf_tol = mf.direct_scf_tol
+    if mf.progressive_screening:
+        scf_tol = max(mf.progressive_screening_tol, mf.direct_scf_tol)
+        _set_direct_scf_tol(mf, scf_tol)
+
+    # J/K and XC builds in float32 until the orbital gradients are small
+    single_prec = mf.mixed_precision
+    if single_prec:
+        _set_single_precision(mf, True)
+
+    try:
+        h1e = mf.get_hcore(mol)
+        with logger.profile('get_veff'):
+            vhf = mf.get_veff(mol, dm)
         e_tot = mf.energy_tot(dm, h1e, vhf)
+        logger.info(mf, 'init E= %.15g', e_tot)
+
+        scf_conv = False
+        mo_energy = mo_coeff = mo_occ = None
+
+        s1e = mf.get_ovlp(mol)
+        cond = lib.cond(s1e)
+        logger.debug(mf, 'cond(S) = %s', cond)
+        if numpy.max(cond)*1e-17 > conv_tol:
+            logger.warn(mf, 'Singularity detected in overlap matrix (condition number = %4.3g). '
+                        'SCF may be inaccurate and hard to converge.', numpy.max(cond))
+
+        # Skip SCF iterations. Compute only the total energy of the initial density
+        if mf.max_cycle <= 0:
+            fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf, no DIIS
+            mo_energy, mo_coeff = mf.eig(fock, s1e)
+            mo_occ = mf.get_occ(mo_energy, mo_coeff)
+            return scf_conv, e_tot, mo_energy, mo_coeff, mo_occ
+
+        if isinstance(mf.diis, lib.diis.DIIS):
+            mf_diis = mf.diis
+        elif mf.diis:
+            assert issubclass(mf.DIIS, lib.diis.DIIS)
+            mf_diis = mf.DIIS(mf, mf.diis_file)
+            mf_diis.space = mf.diis_space
+            mf_diis.rollback = mf.diis_space_rollback
+        else:
+            mf_diis = None
+
+        if dump_chk and mf.chkfile:
+            # Explicit overwrite the mol object in chkfile
+            # Note in pbc.scf, mf.mol == mf.cell, cell is saved under key "mol"
+            chkfile.save_mol(mol, mf.chkfile)
+
+        # A preprocessing hook before the SCF iteration
+        mf.pre_kernel(locals())
+
+        cput1 = logger.timer(mf, 'initialize scf', *cput0)
+        norm_gorb = None
+        e_hist = []
+        gorb_hist = []
+        escalated = False
+        e_best = None
+        for cycle in range(mf.max_cycle):
+            dm_last = dm
+            last_hf_e = e_tot
+
+            fock = mf.get_fock(h1e, s1e, vhf, dm, cycle, mf_diis)
+            with logger.profile('eig'):
+                mo_energy, mo_coeff = mf.eig(fock, s1e)
+            mo_occ = mf.get_occ(mo_energy, mo_coeff)
+            dm = mf.make_rdm1(mo_coeff, mo_occ)
+            dm = lib.tag_array(dm, mo_coeff=mo_coeff, mo_occ=mo_occ)
+
+            scf_tol, full_build = _fock_build_schedule(mf, cycle, norm_gorb, scf_tol)
+            if (single_prec and norm_gorb is not None and
+                norm_gorb < mf.mixed_precision_tol):
+                logger.debug(mf, 'Switch to double precision in cycle %d', cycle+1)
+                single_prec = False
+                _set_single_precision(mf, False)
+                full_build = True
+            with logger.profile('get_veff'):
+                if full_build:
+                    vhf = mf.get_veff(mol, dm)
+                else:
+                    vhf = mf.get_veff(mol, dm, dm_last, vhf)
+            e_tot = mf.energy_tot(dm, h1e, vhf)
+
+            #:PRG:
+            mf.mo_energy=mo_energy
+            mf.mo_occ=mo_occ
+            mf.mo_coeff=mo_coeff
+
+
+            # attach mo_coeff and mo_occ to dm to improve DFT get_veff efficiency
+
+            # Here Fock matrix is h1e + vhf, without DIIS.  Calling get_fock
+            # instead of the statement "fock = h1e + vhf" because Fock matrix may
+            # be modified in some methods.
+            fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf, no DIIS
+            norm_gorb = numpy.linalg.norm(mf.get_grad(mo_coeff, mo_occ, fock))
+            if not TIGHT_GRAD_CONV_TOL:
+                norm_gorb = norm_gorb / numpy.sqrt(norm_gorb.size)
+            norm_ddm = numpy.linalg.norm(dm-dm_last)
+            logger.info(mf, 'cycle= %d E= %.15g  delta_E= %4.3g  |g|= %4.3g  |ddm|= %4.3g',
+                        cycle+1, e_tot, e_tot-last_hf_e, norm_gorb, norm_ddm)
+            e_hist.append(e_tot)
+            gorb_hist.append(norm_gorb)
+            if e_best is None or e_tot < e_best:
+                e_best = e_tot
+                mo_best = mo_coeff, mo_occ
+
+            if callable(mf.check_convergence):
+                scf_conv = mf.check_convergence(locals())
+            elif abs(e_tot-last_hf_e) < conv_tol and norm_gorb < conv_tol_grad:
+                scf_conv = True
+
+            if scf_conv and scf_tol > mf.direct_scf_tol:
+                # Converged with loose integral screening. Continue the SCF
+                # iterations with the final threshold.
+                logger.debug(mf, 'Tighten direct_scf_tol from %g to %g',
+                             scf_tol, mf.direct_scf_tol)
+                scf_conv = False
+                norm_gorb = 0
+
+            if scf_conv and single_prec:
+                # Converged with single precision J/K builds.  Continue the SCF
+                # iterations in double precision.
+                scf_conv = False
+                norm_gorb = 0
+
+            if dump_chk:
+                mf.dump_chk(locals())
+
+            if callable(callback):
+                callback(locals())
+
+            cput1 = logger.timer(mf, 'cycle= %d'%(cycle+1), *cput1)
+
+            if scf_conv:
+                break
+
+            if (mf.newton_escalation and cycle+1 < mf.max_cycle and
+                _scf_stagnated(e_hist, gorb_hist, mf.stagnation_cycles)):
+                logger.info(mf, 'SCF stagnates or oscillates. Switch to second '
+                            'order SCF after cycle %d', cycle+1)
+                escalated = True
+                break
+
+        if escalated:
+            if scf_tol != mf.direct_scf_tol:
+                scf_tol = mf.direct_scf_tol
+                _set_direct_scf_tol(mf, scf_tol)
+            if single_prec:
+                single_prec = False
+                _set_single_precision(mf, False)
+            from pyscf.soscf import newton_ah
+            # The orbitals of the last cycle can be far from the solution when the
+            # iterations diverge.  Start from the iterate of the lowest energy.
+            logger.info(mf, 'Second order SCF starts from E= %.15g', e_best)
+            mo_coeff, mo_occ = mo_best
+            mf_soscf = mf.newton()
+            for i in range(ESCALATION_STABILITY_CYCLES):
+                scf_conv, e_tot, mo_energy, mo_coeff, mo_occ = \
+                        newton_ah.kernel(mf_soscf, mo_coeff, mo_occ,
+                                         conv_tol=conv_tol, conv_tol_grad=conv_tol_grad,
+                                         max_cycle=mf.max_cycle-cycle-1,
+                                         dump_chk=dump_chk, callback=callback,
+                                         verbose=mf.verbose)
+                if not scf_conv:
+                    break
+                # The second order solver may converge to a saddle point.  Restart
+                # from the orbitals along the internal instability.
+                mo_i = _internal_instability(mf, mo_energy, mo_coeff, mo_occ)
+                if mo_i is None:
+                    break
+                logger.note(mf, 'Second order SCF converged to an unstable solution '
+                            'E= %.15g. Restart along the internal instability', e_tot)
+                mo_coeff = mo_i
+                scf_conv = False
+
+        elif scf_conv and conv_check:
+            # An extra diagonalization, to remove level shift
+            #fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf
+            mo_energy, mo_coeff = mf.eig(fock, s1e)
+            mo_occ = mf.get_occ(mo_energy, mo_coeff)
+            dm, dm_last = mf.make_rdm1(mo_coeff, mo_occ), dm
+            dm = lib.tag_array(dm, mo_coeff=mo_coeff, mo_occ=mo_occ)
+            vhf = mf.get_veff(mol, dm, dm_last, vhf)
+            e_tot, last_hf_e = mf.energy_tot(dm, h1e, vhf), e_tot
+
+            fock = mf.get_fock(h1e, s1e, vhf, dm)
+            norm_gorb = numpy.linalg.norm(mf.get_grad(mo_coeff, mo_occ, fock))
+            if not TIGHT_GRAD_CONV_TOL:
+                norm_gorb = norm_gorb / numpy.sqrt(norm_gorb.size)
+            norm_ddm = numpy.linalg.norm(dm-dm_last)
+
+            conv_tol = conv_tol * 10
+            conv_tol_grad = conv_tol_grad * 3
+            if callable(mf.check_convergence):
+                scf_conv = mf.check_convergence(locals())
+            elif abs(e_tot-last_hf_e) < conv_tol or norm_gorb < conv_tol_grad:
+                scf_conv = True
+            logger.info(mf, 'Extra cycle  E= %.15g  delta_E= %4.3g  |g|= %4.3g  |ddm|= %4.3g',
+                        e_tot, e_tot-last_hf_e, norm_gorb, norm_ddm)
+            if dump_chk:
+                mf.dump_chk(locals())
+    finally:
+        # Restore the integral screening threshold and the double precision
+        # J/K builds, also when the SCF iterations are interrupted
+        if scf_tol != mf.direct_scf_tol:
+            _set_direct_scf_tol(mf, mf.direct_scf_tol)
+        if single_prec:
+            _set_single_precision(mf, False)
 
-        #:PRG:
-        mf.mo_energy=mo_energy
-        mf.mo_occ=mo_occ
-        mf.mo_coeff=mo_coeff
-
-
-        # attach mo_coeff and mo_occ to dm to improve DFT get_veff efficiency
-
-        # Here Fock matrix is h1e + vhf, without DIIS.  Calling get_fock
-        # instead of the statement "fock = h1e + vhf" because Fock matrix may
-        # be modified in some methods.
-        fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf, no DIIS
-        norm_gorb = numpy.linalg.norm(mf.get_grad(mo_coeff, mo_occ, fock))
-        if not TIGHT_GRAD_CONV_TOL:
-            norm_gorb = norm_gorb / numpy.sqrt(norm_gorb.size)
-        norm_ddm = numpy.linalg.norm(dm-dm_last)
-        logger.info(mf, 'cycle= %d E= %.15g  delta_E= %4.3g  |g|= %4.3g  |ddm|= %4.3g',
-                    cycle+1, e_tot, e_tot-last_hf_e, norm_gorb, norm_ddm)
-
-        if callable(mf.check_convergence):
-            scf_conv = mf.check_convergence(locals())
-        elif abs(e_tot-last_hf_e) < conv_tol and norm_gorb < conv_tol_grad:
-            scf_conv = True
-
-        if dump_chk:
-            mf.dump_chk(locals())
-
-        if callable(callback):
-            callback(locals())
-
-        cput1 = logger.timer(mf, 'cycle= %d'%(cycle+1), *cput1)
-
-        if scf_conv:
-            break
-
-    if scf_conv and conv_check:
-        # An extra diagonalization, to remove level shift
-        #fock = mf.get_fock(h1e, s1e, vhf, dm)  # = h1e + vhf
-        mo_energy, mo_coeff = mf.eig(fock, s1e)
-        mo_occ = mf.get_occ(mo_energy, mo_coeff)
-        dm, dm_last = mf.make_rdm1(mo_coeff, mo_occ), dm
-        dm = lib.tag_array(dm, mo_coeff=mo_coeff, mo_occ=mo_occ)
-        vhf = mf.get_veff(mol, dm, dm_last, vhf)
-        e_tot, last_hf_e = mf.energy_tot(dm, h1e, vhf), e_tot
-
-        fock = mf.get_fock(h1e, s1e, vhf, dm)
-        norm_gorb = numpy.linalg.norm(mf.get_grad(mo_coeff, mo_occ, fock))
-        if not TIGHT_GRAD_CONV_TOL:
-            norm_gorb = norm_gorb / numpy.sqrt(norm_gorb.size)
-        norm_ddm = numpy.linalg.norm(dm-dm_last)
-
-        conv_tol = conv_tol * 10
-        conv_tol_grad = conv_tol_grad * 3
-        if callable(mf.check_convergence):
-            scf_conv = mf.check_convergence(locals())
-        elif abs(e_tot-last_hf_e) < conv_tol or norm_gorb < conv_tol_grad:
-            scf_conv = True
-        logger.info(mf, 'Extra cycle  E= %.15g  delta_E= %4.3g  |g|= %4.3g  |ddm|= %4.3g',
-                    e_tot, e_tot-last_hf_e, norm_gorb, norm_ddm)
-        if dump_chk:
-            mf.dump_chk(locals())
-
+    if dump_chk and mf.chkfile:
+        lib.chkfile.flush(mf.chkfile)
     logger.timer(mf, 'scf_cycle', *cput0)
     # A post-processing hook before return
     mf.post_kernel(locals())
     return scf_conv, e_tot, mo_energy, mo_coeff, mo_occ
 
+def _internal_instability(mf, mo_energy, mo_coeff, mo_occ):
+    '''Orbitals rotated along the internal instability of the SCF solution.
+    None is returned if the solution is stable.
+    '''
+    if not callable(getattr(mf, 'stability', None)):
+        return None
+    mf.mo_energy = mo_energy
+    mf.mo_coeff = mo_coeff
+    mf.mo_occ = mo_occ
+    mo_i = mf.stability()
+    if isinstance(mo_i, tuple):  # (internal, external) of RHF, UHF and ROHF
+        mo_i = mo_i[0]
+    if mo_i is None or mo_i is mo_coeff:
+        return None
+    return mo_i
+
+def _scf_stagnated(e_hist, gorb_hist, ncycle):
+    '''Whether the orbital gradients are not reduced, or the energy
+    oscillates without damping, in the last ncycle SCF cycles.
+    '''
+    if ncycle <= 1 or len(gorb_hist) <= ncycle:
+        return False
+    if min(gorb_hist[-ncycle:]) > min(gorb_hist[:-ncycle]) * .9:
+        return True
+    de = numpy.diff(e_hist[-ncycle-1:])
+    return bool(numpy.all(de[1:] * de[:-1] < 0) and
+                abs(de[-1]) > abs(de[0]) * .5)
+
+def _fock_build_schedule(mf, cycle, norm_gorb, scf_tol):
+    '''The integral screening threshold and whether to build the Fock matrix
+    from scratch (rather than incrementally) in the current SCF cycle.
+
+    With mf.progressive_screening, the threshold follows the orbital gradients
+    of the last cycle (scaled by mf.progressive_screening_factor) and it is
+    only tightened during the iterations.  A full Fock build is carried out
+    when the final threshold mf.direct_scf_tol is reached, to remove the
+    errors which were accumulated in the incremental Fock matrix.  An extra
+    full Fock build is triggered every mf.fock_rebuild_cycle cycles.
+    '''
+    full_build = (mf.fock_rebuild_cycle > 0 and cycle > 0 and
+                  cycle % mf.fock_rebuild_cycle == 0)
+
+    if mf.progressive_screening and scf_tol > mf.direct_scf_tol:
+        if norm_gorb is not None:
+            tol = max(norm_gorb * mf.progressive_screening_factor,
+                      mf.direct_scf_tol)
+            if tol < scf_tol:
+                logger.debug1(mf, 'direct_scf_tol = %g', tol)
+                scf_tol = tol
+                _set_direct_scf_tol(mf, scf_tol)
+                if scf_tol == mf.direct_scf_tol:
+                    full_build = True
+
+    if full_build:
+        logger.debug(mf, 'Full Fock build in cycle %d', cycle+1)
+    return scf_tol, full_build
+
+def _set_direct_scf_tol(mf, tol):
+    '''Update the integral screening threshold of the direct SCF optimizer'''
+    if mf.direct_scf and mf.opt is None:
+        mf.opt = mf.init_direct_scf(mf.mol)
+    if isinstance(mf.opt, (tuple, list)):
+        opts = mf.opt
+    else:
+        opts = [mf.opt]
+    for opt in opts:
+        if isinstance(opt, _vhf.VHFOpt):
+            opt.direct_scf_tol = tol
+    if getattr(mf, '_cfmm', None) is not None:
+        mf._cfmm.direct_scf_tol = tol
+
+def _set_single_precision(mf, flag):
+    '''Switch the DF J/K builds and the DFT numerical integration between
+    float32 and float64'''
+    with_df = getattr(mf, 'with_df', None)
+    if with_df is not None:
+        with_df.single_precision = flag
+    ni = getattr(mf, '_numint', None)
+    if ni is not None:
+        ni.single_precision = flag
+
 
 def energy_elec(mf, dm=None, h1e=None, vhf=None):
     r'''Electronic part of Hartree-Fock energy, for given core hamiltonian and
@@ -429,7 +613,22 @@ def init_guess_by_minao(mol):
     basis = {}
     occdic = {}
     for symb, nelec_ecp in nelec_ecp_dic.items():
-        occ_add, basis_add = minao_basis(symb, nelec_ecp)
+        if gto.is_ghost_atom(symb):
+            occ_add, basis_add = minao_basis(symb, nelec_ecp)
+        else:
+            # The ANO basis and occupancies of an element only depend on the
+            # ECP (and the ECP basis). They are cached to avoid parsing the
+            # ANO basis file for every molecule.
+            key = atom_hf._cache_key(
+                'minao', gto.mole._std_symbol(symb), nelec_ecp,
+                mol._basis[symb] if nelec_ecp > 0 else None)
+            res = atom_hf._cache_load(key)
+            if res is None:
+                occ_add, basis_add = minao_basis(symb, nelec_ecp)
+                basis_str = json.dumps(basis_add, default=atom_hf._to_list)
+                atom_hf._cache_dump(key, {'occ': occ_add, 'basis': basis_str})
+            else:
+                occ_add, basis_add = res['occ'], json.loads(res['basis'])
         occdic[symb] = occ_add
         basis[symb] = basis_add
 
@@ -955,7 +1154,8 @@ def get_fock(mf, h1e=None, s1e=None, vhf=None, dm=None, cycle=-1, diis=None,
     if 0 <= cycle < diis_start_cycle-1 and abs(damp_factor) > 1e-4:
         f = damping(s1e, dm*.5, f, damp_factor)
     if diis is not None and cycle >= diis_start_cycle:
-        f = diis.update(s1e, dm, f, mf, h1e, vhf)
+        with logger.profile('DIIS'):
+            f = diis.update(s1e, dm, f, mf, h1e, vhf)
     if abs(level_shift_factor) > 1e-4:
         f = level_shift(s1e, dm*.5, f, level_shift_factor)
     #:PRG:
@@ -1338,6 +1538,7 @@ def as_scanner(mf):
     class SCF_Scanner(mf.__class__, lib.SinglePointScanner):
         def __init__(self, mf_obj):
             self.__dict__.update(mf_obj.__dict__)
+            self._last_opt = None
 
         def __call__(self, mol_or_geom, **kwargs):
             if isinstance(mol_or_geom, gto.Mole):
@@ -1345,6 +1546,10 @@ def as_scanner(mf):
             else:
                 mol = self.mol.set_geom_(mol_or_geom, inplace=False)
 
+            # Keep the direct SCF optimizer of the last geometry. Its integral
+            # screening conditions are updated in init_direct_scf.
+            if isinstance(self.opt, _vhf.VHFOpt):
+                self._last_opt = (self.mol, self.opt)
             # Cleanup intermediates associated to the pervious mol object
             self.reset(mol)
 
@@ -1375,8 +1580,21 @@ def as_scanner(mf):
                     dm0 = None
             self.mo_coeff = None  # To avoid last mo_coeff being used by SOSCF
             e_tot = self.kernel(dm0=dm0, **kwargs)
+            self._last_opt = None
             return e_tot
 
+        def init_direct_scf(self, mol=None):
+            if mol is None: mol = self.mol
+            if self._last_opt is not None:
+                mol_last, opt = self._last_opt
+                self._last_opt = None
+                t0 = (time.clock(), time.time())
+                if opt.update_cvhf_direct(mol, mol_last):
+                    opt.direct_scf_tol = self.direct_scf_tol
+                    logger.timer(self, 'update direct SCF optimizer', *t0)
+                    return opt
+            return mf.__class__.init_direct_scf(self, mol)
+
     return SCF_Scanner(mf)
 
 ############
@@ -1407,7 +1625,7 @@ class SCF(lib.StreamObject):
             Default is 'minao'
         DIIS : DIIS class
             The class to generate diis object.  It can be one of
-            diis.SCF_DIIS, diis.ADIIS, diis.EDIIS.
+            diis.SCF_DIIS, diis.ADIIS, diis.EDIIS, diis.ADIIS_CDIIS.
         diis : boolean or object of DIIS class defined in :mod:`scf.diis`.
             Default is the object associated to the attribute :attr:`self.DIIS`.
             Set it to None/False to turn off DIIS.
@@ -1428,6 +1646,39 @@ class SCF(lib.StreamObject):
             Direct SCF is used by default.
         direct_scf_tol : float
             Direct SCF cutoff threshold.  Default is 1e-13.
+        cfmm : bool
+            Whether to compute Coulomb matrix (the J-only calls of
+            :func:`get_jk` and :func:`get_j`) with the continuous fast
+            multipole method.  See :mod:`pyscf.scf.cfmm`.  Default is False.
+        progressive_screening : bool
+            Whether to use loose integral screening thresholds in the early
+            SCF cycles.  The threshold starts from progressive_screening_tol
+            and is tightened to direct_scf_tol as the orbital gradients
+            decrease.  It is useful for the incremental Fock builds of direct
+            SCF.  Default is False.
+        fock_rebuild_cycle : int
+            If > 0, the Fock matrix is built from scratch every
+            fock_rebuild_cycle cycles rather than incrementally.  Default is 0.
+        mixed_precision : bool
+            Whether to compute the DF J/K matrices and the XC potential in
+            float32 in the early SCF cycles.  The calculation is switched to
+            double precision when the orbital gradients are smaller than
+            mixed_precision_tol.  Only the density fitting J/K builds and the
+            numerical integration of DFT are affected.  Default is False.
+        mixed_precision_tol : float
+            Default is 1e-3.
+        newton_escalation : bool
+            Whether to switch to the second order SCF solver (see
+            :func:`newton`) when the DIIS iterations stagnate or oscillate.
+            The second order SCF starts from the iterate of the lowest energy.
+            Its solution is checked by the internal stability analysis and
+            the optimization is restarted if the solution is unstable.
+            Combined with DIIS = diis.ADIIS_CDIIS, it provides an automatic
+            convergence controller for difficult systems.  Default is False.
+        stagnation_cycles : int
+            SCF iterations are considered stagnant if the orbital gradients
+            are not reduced by 10%, or the energy changes oscillate without
+            damping, in stagnation_cycles cycles.  Default is 6.
         callback : function(envs_dict) => None
             callback function takes one dict as the argument which is
             generated by the builtin function :func:`locals`, so that the
@@ -1482,6 +1733,15 @@ class SCF(lib.StreamObject):
     level_shift = getattr(__config__, 'scf_hf_SCF_level_shift', 0)
     direct_scf = getattr(__config__, 'scf_hf_SCF_direct_scf', True)
     direct_scf_tol = getattr(__config__, 'scf_hf_SCF_direct_scf_tol', 1e-13)
+    cfmm = getattr(__config__, 'scf_hf_SCF_cfmm', False)
+    progressive_screening = getattr(__config__, 'scf_hf_SCF_progressive_screening', False)
+    progressive_screening_tol = getattr(__config__, 'scf_hf_SCF_progressive_screening_tol', 1e-8)
+    progressive_screening_factor = getattr(__config__, 'scf_hf_SCF_progressive_screening_factor', 1e-4)
+    fock_rebuild_cycle = getattr(__config__, 'scf_hf_SCF_fock_rebuild_cycle', 0)
+    mixed_precision = getattr(__config__, 'scf_hf_SCF_mixed_precision', False)
+    mixed_precision_tol = getattr(__config__, 'scf_hf_SCF_mixed_precision_tol', 1e-3)
+    newton_escalation = getattr(__config__, 'scf_hf_SCF_newton_escalation', False)
+    stagnation_cycles = getattr(__config__, 'scf_hf_SCF_stagnation_cycles', 6)
     conv_check = getattr(__config__, 'scf_hf_SCF_conv_check', True)
 
     def __init__(self, mol):
@@ -1516,11 +1776,16 @@ class SCF(lib.StreamObject):
 
         self.opt = None
         self._eri = None # Note: self._eri requires large amount of memory
+        self._cfmm = None
 
         keys = set(('conv_tol', 'conv_tol_grad', 'max_cycle', 'init_guess',
                     'DIIS', 'diis', 'diis_space', 'diis_start_cycle',
                     'diis_file', 'diis_space_rollback', 'damp', 'level_shift',
-                    'direct_scf', 'direct_scf_tol', 'conv_check'))
+                    'direct_scf', 'direct_scf_tol', 'cfmm',
+                    'progressive_screening', 'progressive_screening_tol',
+                    'progressive_screening_factor', 'fock_rebuild_cycle',
+                    'mixed_precision', 'mixed_precision_tol',
+                    'newton_escalation', 'stagnation_cycles', 'conv_check'))
         self._keys = set(self.__dict__.keys()).union(keys)
 
     def build(self, mol=None):
@@ -1529,6 +1794,7 @@ class SCF(lib.StreamObject):
             self.check_sanity()
         # lazily initialize direct SCF
         self.opt = None
+        self._cfmm = None
         return self
 
     def dump_flags(self, verbose=None):
@@ -1558,6 +1824,19 @@ class SCF(lib.StreamObject):
         log.info('direct_scf = %s', self.direct_scf)
         if self.direct_scf:
             log.info('direct_scf_tol = %g', self.direct_scf_tol)
+        if self.cfmm:
+            log.info('Coulomb matrix by CFMM')
+        if self.progressive_screening:
+            log.info('progressive_screening_tol = %g', self.progressive_screening_tol)
+            log.info('progressive_screening_factor = %g',
+                     self.progressive_screening_factor)
+        if self.fock_rebuild_cycle > 0:
+            log.info('fock_rebuild_cycle = %d', self.fock_rebuild_cycle)
+        if self.mixed_precision:
+            log.info('mixed_precision_tol = %g', self.mixed_precision_tol)
+        if self.newton_escalation:
+            log.info('Switch to second order SCF if SCF stagnates in %d cycles',
+                     self.stagnation_cycles)
         if self.chkfile:
             log.info('chkfile to save SCF result = %s', self.chkfile)
         log.info('max_memory %d MB (current use %d MB)',
@@ -1596,10 +1875,12 @@ class SCF(lib.StreamObject):
 
     def dump_chk(self, envs):
         if self.chkfile:
-            chkfile.dump_scf(self.mol, self.chkfile,
-                             envs['e_tot'], envs['mo_energy'],
-                             envs['mo_coeff'], envs['mo_occ'],
-                             overwrite_mol=False)
+            # Written by the background chkfile writer. Pending writes are
+            # flushed when the SCF kernel finishes or the chkfile is loaded.
+            lib.chkfile.dump_async(self.chkfile, 'scf', chkfile.dump_scf,
+                                   self.mol, self.chkfile,
+                                   envs['e_tot'], envs['mo_energy'],
+                                   envs['mo_coeff'], envs['mo_occ'], False)
         return self
 
     @lib.with_doc(init_guess_by_minao.__doc__)
@@ -1765,12 +2046,30 @@ class SCF(lib.StreamObject):
         opt.direct_scf_tol = self.direct_scf_tol
         return opt
 
+    def init_cfmm(self, mol=None):
+        from pyscf.scf import cfmm
+        if mol is None: mol = self.mol
+        return cfmm.CFMM(mol, self.direct_scf_tol)
+
+    def _is_cfmm_applicable(self, dm, with_k, omega):
+        '''CFMM handles the Coulomb matrix of real density matrices only'''
+        return (self.cfmm and not with_k and omega is None and
+                not numpy.iscomplexobj(dm))
+
     @lib.with_doc(get_jk.__doc__)
+    @logger.profile('get_jk')
     def get_jk(self, mol=None, dm=None, hermi=1, with_j=True, with_k=True,
                omega=None):
         if mol is None: mol = self.mol
         if dm is None: dm = self.make_rdm1()
         cpu0 = (time.clock(), time.time())
+        if self._is_cfmm_applicable(dm, with_k, omega):
+            if self._cfmm is None:
+                self._cfmm = self.init_cfmm(mol)
+            vj = self._cfmm.get_j(dm, hermi)
+            logger.timer(self, 'vj', *cpu0)
+            return vj, None
+
         if self.direct_scf and self.opt is None:
             self.opt = self.init_direct_scf(mol)
 
@@ -1887,6 +2186,7 @@ class SCF(lib.StreamObject):
             self.mol = mol
         self.opt = None
         self._eri = None
+        self._cfmm = None
         return self
 
     @property
@@ -2028,12 +2328,13 @@ class RHF(SCF):
         return SCF.check_sanity(self)
 
     @lib.with_doc(get_jk.__doc__)
+    @logger.profile('get_jk')
     def get_jk(self, mol=None, dm=None, hermi=1, with_j=True, with_k=True,
                omega=None):
 # Note the incore version, which initializes an _eri array in memory.
         if mol is None: mol = self.mol
         if dm is None: dm = self.make_rdm1()
-        if (not omega and
+        if (not omega and not self._is_cfmm_applicable(dm, with_k, omega) and
             (self._eri is not None or mol.incore_anyway or self._is_mem_enough())):
             if self._eri is None:
                 self._eri = mol.intor('int2e', aosym='s8')
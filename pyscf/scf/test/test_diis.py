@@ -54,6 +54,53 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual(e, -75.983875341696987, 9)
         mol.stdout.close()
 
+    def test_adiis_cdiis(self):
+        mol = gto.M(
+            verbose = 7,
+            output = '/dev/null',
+            atom = '''
+        O     0    0        0
+        H     0    -1.757   1.587
+        H     0    1.757    1.587''',
+            basis = '631g',
+        )
+        e_ref = scf.RHF(mol).kernel()
+        mf1 = scf.RHF(mol)
+        mf1.DIIS = diis.ADIIS_CDIIS
+        e = mf1.kernel()
+        self.assertTrue(mf1.converged)
+        self.assertAlmostEqual(e, e_ref, 9)
+
+        # The solution of the DIIS SCF is internally unstable.  The stable
+        # solution is found by following the instabilities.
+        mf0 = scf.RHF(mol)
+        mf0.kernel()
+        for i in range(5):
+            mo = mf0.stability()[0]
+            if mo is mf0.mo_coeff:
+                break
+            mf0.kernel(mf0.make_rdm1(mo, mf0.mo_occ))
+        self.assertTrue(mf0.stability()[0] is mf0.mo_coeff)
+        e_stable = mf0.e_tot
+        self.assertTrue(e_stable < e_ref - 1e-3)
+
+        # Roothaan iterations without DIIS.  The second order SCF checks the
+        # stability of the solution.
+        mf1 = scf.RHF(mol).set(newton_escalation=True, stagnation_cycles=3)
+        mf1.diis = False
+        e = mf1.kernel()
+        self.assertTrue(mf1.converged)
+        self.assertAlmostEqual(e, e_stable, 8)
+        self.assertTrue(mf1.stability()[0] is mf1.mo_coeff)
+        mol.stdout.close()
+
+    def test_scf_stagnated(self):
+        from pyscf.scf.hf import _scf_stagnated
+        self.assertFalse(_scf_stagnated([0]*4, [1, .5, .2, .1], 2))
+        self.assertTrue(_scf_stagnated([0]*4, [1, .5, .6, .55], 2))
+        e = [-1., -1.1, -1.0, -1.1, -1.0]
+        self.assertTrue(_scf_stagnated(e, [1, .5, .2, .1, .05], 3))
+
     def test_roll_back(self):
         mol = gto.M(
             verbose = 7,
@@ -16,6 +16,8 @@
 # Author: Qiming Sun <osirpt.sun@gmail.com>
 #
 
+import os
+import shutil
 import unittest
 import numpy
 import scipy.linalg
@@ -231,6 +233,26 @@ class KnownValues(unittest.TestCase):
         dm = scf.hf.init_guess_by_atom(pmol)
         self.assertAlmostEqual(numpy.linalg.norm(dm), 0.86450726178750226, 8)
 
+    def test_init_guess_atom_cache(self):
+        from pyscf.scf import atom_hf
+        cache_dir = tempfile.mkdtemp(dir=lib.param.TMPDIR)
+        atom_hf_cache_dir_bak = atom_hf.ATOM_CACHE_DIR
+        atom_hf.ATOM_CACHE_DIR = cache_dir
+        try:
+            atom_hf._atom_cache.clear()
+            dm_atom = scf.hf.init_guess_by_atom(mol)
+            dm_minao = scf.hf.init_guess_by_minao(mol)
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+            # Reload from the disk cache
+            atom_hf._atom_cache.clear()
+            self.assertAlmostEqual(abs(scf.hf.init_guess_by_atom(mol) - dm_atom).max(), 0, 12)
+            self.assertAlmostEqual(abs(scf.hf.init_guess_by_minao(mol) - dm_minao).max(), 0, 12)
+            self.assertEqual(len(atom_hf._atom_cache), 4)
+        finally:
+            atom_hf.ATOM_CACHE_DIR = atom_hf_cache_dir_bak
+            shutil.rmtree(cache_dir)
+
     def test_init_guess_1e(self):
         dm = scf.hf.init_guess_by_1e(mol)
         s = scf.hf.get_ovlp(mol)
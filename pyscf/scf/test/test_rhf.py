@@ -817,6 +817,71 @@ H     0    0.757    0.587'''
         mf1.opt.prescreen = 'CVHFnoscreen'
         self.assertEqual(mf1.opt.prescreen, scf._vhf._fpointer('CVHFnoscreen').value)
 
+    def test_get_vj_cfmm(self):
+        mol1 = gto.M(atom=[['H', (0, 0, i*1.5)] for i in range(40)],
+                     basis='631g', spin=0, verbose=0)
+        numpy.random.seed(1)
+        nao = mol1.nao
+        dm = numpy.random.random((2,nao,nao))
+        ref = scf.hf.get_jk(mol1, dm, with_k=False)[0]
+
+        mf1 = scf.RHF(mol1).set(cfmm=True)
+        mf1._cfmm = mf1.init_cfmm().set(box_size=1.5)
+        vj, vk = mf1.get_jk(mol1, dm, with_k=False)
+        self.assertTrue(vk is None)
+        # Far field at the leaf level and at the coarser levels of the tree
+        self.assertTrue(len(mf1._cfmm.m2l_pairs[0]) > 0)
+        self.assertTrue(any(len(x) > 0 for x in mf1._cfmm.m2l_pairs[1:]))
+        self.assertAlmostEqual(abs(ref-vj).max(), 0, 5)
+        err = abs(ref-vj).max()
+        self.assertTrue(err*.5 < mf1._cfmm.far_field_error < err*5)
+
+        vj1 = mf1.get_j(mol1, dm[0])
+        self.assertAlmostEqual(abs(vj[0]-vj1).max(), 0, 12)
+
+    def test_cfmm_translation(self):
+        from pyscf.scf import cfmm
+        numpy.random.seed(2)
+        q = numpy.random.random(5)
+        r = numpy.random.random((5,3))
+        powers = cfmm.cart_powers(4)
+        def moments(coords, center):
+            return numpy.einsum('i,it->t', q, ((coords-center)[:,None] ** powers).prod(axis=2))
+        child = numpy.array([.3, .2, .1])
+        parent = numpy.array([-.5, .4, .9])
+        smat = cfmm.translation_matrices(child - parent, 4)[0]
+        # M2M is exact
+        self.assertAlmostEqual(abs(smat.dot(moments(r, child)) -
+                                   moments(r, parent)).max(), 0, 12)
+
+        # L2L: the local expansions of the parent and the child boxes give
+        # the same potential
+        r_far = r + numpy.array([12., 3., -4.])
+        far = r_far.mean(axis=0)
+        l_parent = cfmm.m2l_tensor(parent - far, 4)[:,:,0].dot(moments(r_far, far))
+        l_child = smat.T.dot(l_parent)
+        x = child + numpy.array([.2, -.1, .15])
+        v_parent = l_parent.dot(((x - parent) ** powers).prod(axis=1))
+        v_child = l_child.dot(((x - child) ** powers).prod(axis=1))
+        self.assertAlmostEqual(v_child, v_parent, 12)
+        ref = (q / numpy.linalg.norm(x - r_far, axis=1)).sum()
+        self.assertAlmostEqual(v_child, ref, 5)
+
+    def test_progressive_screening(self):
+        mf1 = scf.RHF(mol).set(max_memory=0, conv_tol=1e-10,
+                               progressive_screening=True, fock_rebuild_cycle=4)
+        e1 = mf1.kernel()
+        self.assertAlmostEqual(e1, mf.e_tot, 9)
+        self.assertAlmostEqual(mf1.opt.direct_scf_tol, mf1.direct_scf_tol, 14)
+
+        # The threshold is restored when the SCF iterations are interrupted
+        def stop(envs):
+            raise KeyboardInterrupt
+        mf1 = scf.RHF(mol).set(max_memory=0, progressive_screening=True,
+                               callback=stop)
+        self.assertRaises(KeyboardInterrupt, mf1.kernel)
+        self.assertAlmostEqual(mf1.opt.direct_scf_tol, mf1.direct_scf_tol, 14)
+
     def test_get_vk_direct_scf(self):
         numpy.random.seed(1)
         nao = mol.nao
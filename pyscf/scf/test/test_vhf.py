@@ -18,6 +18,7 @@
 
 import numpy
 import unittest
+from pyscf import lib
 from pyscf import gto
 from pyscf import scf
 from pyscf import ao2mo
@@ -83,6 +84,37 @@ class KnownValues(unittest.TestCase):
         self.assertTrue(numpy.allclose(vk0, vk[0]))
         self.assertTrue(numpy.allclose(vk0, vk[1]))
 
+    def test_direct_link(self):
+        numpy.random.seed(1)
+        dm = numpy.random.random((2,nao,nao))
+        dm = dm + dm.transpose(0,2,1)
+        vj0, vk0 = _vhf.direct(dm, mol._atm, mol._bas, mol._env, hermi=1)
+        vk1 = _vhf.direct_link(mol, dm)
+        self.assertAlmostEqual(abs(vk0-vk1).max(), 0, 9)
+
+    def test_update_cvhf_direct(self):
+        mol1 = mol.set_geom_('''
+            O     0    0        0.1
+            H     0    -0.757   0.587
+            H     0    0.757    0.587''', inplace=False)
+        opt = _vhf.VHFOpt(mol, 'int2e', 'CVHFnrs8_prescreen',
+                          'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        self.assertTrue(opt.update_cvhf_direct(mol1, mol))
+        ref = _vhf.VHFOpt(mol1, 'int2e', 'CVHFnrs8_prescreen',
+                          'CVHFsetnr_direct_scf', 'CVHFsetnr_direct_scf_dm')
+        nbas = mol.nbas
+        q_cond = lib.frompointer(opt._this.contents.q_cond, nbas**2)
+        q_ref = lib.frompointer(ref._this.contents.q_cond, nbas**2)
+        self.assertAlmostEqual(abs(q_cond-q_ref).max(), 0, 12)
+
+        mol2 = gto.M(atom=mol.atom, basis='sto3g')
+        self.assertFalse(opt.update_cvhf_direct(mol2, mol))
+
+        mf_scanner = scf.RHF(mol).set(max_memory=0).as_scanner()
+        mf_scanner(mol)
+        e1 = mf_scanner(mol1)
+        self.assertAlmostEqual(e1, scf.RHF(mol1).kernel(), 9)
+
     def test_direct_bindm(self):
         numpy.random.seed(1)
         dm = numpy.random.random((nao,nao))
@@ -134,11 +134,38 @@ def sgx_fit(mf, auxbasis=None, with_df=None):
             self._in_scf = False
             self._last_dm = 0
 
+        def _finalize(self):
+            with_df = self.with_df
+            if with_df and self.converged and self.mo_coeff is not None:
+                level = with_df.grids_level_e
+                if level is None and with_df._grids_level != with_df.grids_level_f:
+                    # SCF converged before switching to the final grids
+                    level = with_df.grids_level_f
+                if level is not None and level != with_df._grids_level:
+                    _energy_correction(self, level)
+            return mf_class._finalize(self)
+
         def nuc_grad_method(self):
             raise NotImplementedError
 
     return SGXHF(mf, with_df, auxbasis)
 
+def _energy_correction(mf, level):
+    '''Evaluate the SCF energy of the converged density matrix on the SGX
+    grids of the given level. The grids of mf.with_df are kept at this level
+    afterwards.
+    '''
+    with_df = mf.with_df
+    logger.debug(mf, 'SGX energy correction on grids level %s', level)
+    with_df.build(level=level)
+    dm = mf.make_rdm1()
+    vhf = mf.get_veff(mf.mol, dm)
+    e_tot = mf.energy_tot(dm, vhf=vhf)
+    logger.info(mf, 'SGX grids level %s energy correction = %.15g',
+                level, e_tot - mf.e_tot)
+    mf.e_tot = e_tot
+    return e_tot
+
 # A tag to label the derived SCF class
 class _SGXHF(object):
     def method_not_implemented(self, *args, **kwargs):
@@ -182,7 +209,13 @@ class SGX(lib.StreamObject):
         self.grids_thrd = 1e-10
         self.grids_level_i = 0  # initial grids level
         self.grids_level_f = 1  # final grids level
+        # grids level of a non-self-consistent energy evaluation after SCF.
+        # None to skip unless SCF converged before switching to grids_level_f
+        self.grids_level_e = getattr(__config__, 'sgx_SGX_grids_level_e', None)
         self.grids_switch_thrd = 0.03
+        # Drop the grids on which the weighted density is smaller than this
+        # threshold. None to disable the density screening.
+        self.grids_dens_thrd = getattr(__config__, 'sgx_SGX_grids_dens_thrd', None)
         # compute J matrix using DF and K matrix using SGX. It's identical to
         # the RIJCOSX method in ORCA
         self.dfj = False
@@ -194,6 +227,7 @@ class SGX(lib.StreamObject):
         self.debug = False
 
         self.grids = None
+        self._grids_level = None
         self.blockdim = 1200
         self.auxmol = None
         self._vjopt = None
@@ -217,7 +251,9 @@ class SGX(lib.StreamObject):
         log.info('max_memory = %s', self.max_memory)
         log.info('grids_level_i = %s', self.grids_level_i)
         log.info('grids_level_f = %s', self.grids_level_f)
+        log.info('grids_level_e = %s', self.grids_level_e)
         log.info('grids_thrd = %s', self.grids_thrd)
+        log.info('grids_dens_thrd = %s', self.grids_dens_thrd)
         log.info('grids_switch_thrd = %s', self.grids_switch_thrd)
         log.info('df_j = %s', self.df_j)
         log.info('auxbasis = %s', self.auxbasis)
@@ -233,6 +269,7 @@ class SGX(lib.StreamObject):
         if level is None:
             level = self.grids_level_f
         self.grids = sgx_jk.get_gridss(self.mol, level, self.grids_thrd)
+        self._grids_level = level
         self._opt = _make_opt(self.mol)
 
         # In the RSH-integral temporary treatment, recursively rebuild SGX
@@ -250,6 +287,7 @@ class SGX(lib.StreamObject):
         if mol is not None:
             self.mol = mol
         self.grids = None
+        self._grids_level = None
         self.auxmol = None
         self._vjopt = None
         self._opt = None
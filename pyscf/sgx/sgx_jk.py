@@ -28,12 +28,17 @@ based on grid.(see Friesner, R. A. Chem. Phys. Lett. 1985, 116, 39)
 Minimizing numerical errors using overlap fitting correction.(see 
 Lzsak, R. et. al. J. Chem. Phys. 2011, 135, 144105)
 Grid screening for weighted AO value and DktXkg. 
-Two SCF steps: coarse grid then fine grid. There are 5 parameters can be changed:
+Two SCF steps: coarse grid then fine grid, plus an optional non-self-consistent
+energy correction on a larger grid. There are 7 parameters can be changed:
 # threshold for Xg and Fg screening
 gthrd = 1e-10
+# threshold for screening grids by the weighted density (None to disable)
+dthrd = None
 # initial and final grids level
 grdlvl_i = 0
 grdlvl_f = 1
+# grids level for the final energy correction (None to skip)
+grdlvl_e = None
 # norm_ddm threshold for grids change
 thrd_nddm = 0.03
 # set block size to adapt memory 
@@ -61,6 +66,7 @@ def get_jk_favork(sgx, dm, hermi=1, with_j=True, with_k=True,
     mol = sgx.mol
     grids = sgx.grids
     gthrd = sgx.grids_thrd
+    dthrd = getattr(sgx, 'grids_dens_thrd', None)
 
     dms = numpy.asarray(dm)
     dm_shape = dms.shape
@@ -91,10 +97,14 @@ def get_jk_favork(sgx, dm, hermi=1, with_j=True, with_k=True,
         sn += lib.dot(ao.T, wao)
 
         fg = lib.einsum('gi,xij->xgj', wao, dms)
-        mask = numpy.zeros(i1-i0, dtype=bool)
-        for i in range(nset):
-            mask |= numpy.any(fg[i]>gthrd, axis=1)
-            mask |= numpy.any(fg[i]<-gthrd, axis=1)
+        if with_j:
+            # J at a grid point depends on the global density. Only the
+            # screening of the weighted density matrix is applied.
+            mask = _screen_grids(ao, fg, gthrd, None)
+        else:
+            mask = _screen_grids(ao, fg, gthrd, dthrd)
+        if not numpy.any(mask):
+            continue
         if not numpy.all(mask):
             ao = ao[mask]
             wao = wao[mask]
@@ -150,6 +160,7 @@ def get_jk_favorj(sgx, dm, hermi=1, with_j=True, with_k=True,
     mol = sgx.mol
     grids = sgx.grids
     gthrd = sgx.grids_thrd
+    dthrd = getattr(sgx, 'grids_dens_thrd', None)
 
     dms = numpy.asarray(dm)
     dm_shape = dms.shape
@@ -188,10 +199,9 @@ def get_jk_favorj(sgx, dm, hermi=1, with_j=True, with_k=True,
         wao = ao * grids.weights[i0:i1,None]
 
         fg = lib.einsum('gi,xij->xgj', wao, proj_dm)
-        mask = numpy.zeros(i1-i0, dtype=bool)
-        for i in range(nset):
-            mask |= numpy.any(fg[i]>gthrd, axis=1)
-            mask |= numpy.any(fg[i]<-gthrd, axis=1)
+        mask = _screen_grids(ao, fg, gthrd, dthrd)
+        if not numpy.any(mask):
+            continue
         if not numpy.all(mask):
             ao = ao[mask]
             fg = fg[:,mask]
@@ -236,6 +246,21 @@ def get_jk_favorj(sgx, dm, hermi=1, with_j=True, with_k=True,
     logger.timer(mol, "vj and vk", *t0)
     return vj.reshape(dm_shape), vk.reshape(dm_shape)
 
+def _screen_grids(ao, fg, gthrd, dthrd=None):
+    '''Mask of the grid points which contribute to the sgX J/K matrices.
+
+    A grid point is dropped if all elements of the weighted density matrix
+    fg = w_g ao_g D are smaller than gthrd. If dthrd is given, the point is
+    also dropped if the upper bound of its weighted density
+    max_i|ao_gi| sum_j |fg_gj| is smaller than dthrd.
+    '''
+    fg_abs = abs(fg)
+    mask = (fg_abs.max(axis=2) > gthrd).any(axis=0)
+    if dthrd is not None and dthrd > 0:
+        rho_max = fg_abs.sum(axis=2).max(axis=0) * abs(ao).max(axis=1)
+        mask &= rho_max > dthrd
+    return mask
+
 def _gen_batch_nuc(mol):
     '''Coulomb integrals of the given points and orbital pairs'''
     cintopt = gto.moleintor.make_cintopt(mol._atm, mol._bas, mol._env, 'int3c2e')
@@ -30,6 +30,26 @@ class KnownValues(unittest.TestCase):
         self.assertTrue(mf.mol is mol1)
         self.assertTrue(mf.with_df.mol is mol1)
 
+    def test_energy_correction(self):
+        mol = gto.M(verbose = 0,
+            atom = [["O" , (0. , 0.     , 0.)],
+                    [1   , (0. , -0.757 , 0.587)],
+                    [1   , (0. , 0.757  , 0.587)] ],
+            basis = 'ccpvdz',
+        )
+        mf = scf.RHF(mol).COSX()
+        mf.with_df.grids_level_e = 2
+        e_tot = mf.kernel()
+        self.assertEqual(mf.with_df._grids_level, 2)
+        self.assertAlmostEqual(e_tot, mf.energy_tot(), 9)
+
+        # SCF converged on the initial grids is corrected on the final grids
+        mf = scf.RHF(mol).COSX()
+        mf.with_df.grids_switch_thrd = 0
+        e_tot = mf.kernel()
+        self.assertEqual(mf.with_df._grids_level, mf.with_df.grids_level_f)
+        self.assertAlmostEqual(e_tot, mf.energy_tot(), 9)
+
 
 if __name__ == "__main__":
     print("Full Tests for SGX")
@@ -98,6 +98,25 @@ class KnownValues(unittest.TestCase):
         self.assertAlmostEqual(abs(vj-vj1).max(), 0, 2)
         self.assertAlmostEqual(abs(vk-vk1).max(), 0, 2)
 
+    def test_dens_screening(self):
+        mol = gto.M(verbose = 0,
+            atom = [["O" , (0. , 0.     , 0.)],
+                    [1   , (0. , -0.757 , 0.587)],
+                    [1   , (0. , 0.757  , 0.587)] ],
+            basis = 'ccpvdz',
+        )
+        dm = scf.RHF(mol).run().make_rdm1()
+        sgxobj = sgx.SGX(mol)
+        sgxobj.grids = sgx_jk.get_gridss(mol, 0, 1e-10)
+        vj0, vk0 = sgx_jk.get_jk_favorj(sgxobj, dm)
+        vk2 = sgx_jk.get_jk_favork(sgxobj, dm, with_j=False)[1]
+        with lib.temporary_env(sgxobj, grids_dens_thrd=1e-10):
+            vj1, vk1 = sgx_jk.get_jk_favorj(sgxobj, dm)
+            vk3 = sgx_jk.get_jk_favork(sgxobj, dm, with_j=False)[1]
+        self.assertAlmostEqual(abs(vj1-vj0).max(), 0, 7)
+        self.assertAlmostEqual(abs(vk1-vk0).max(), 0, 7)
+        self.assertAlmostEqual(abs(vk3-vk2).max(), 0, 7)
+
 
 if __name__ == "__main__":
     print("Full Tests for sgx_jk")